@@ -4,420 +4,3920 @@ PC Client for cow714 OSRS Community Controller
 Run this on your gaming PC to receive commands from Heroku
 """
 
-import socketio
-import pyautogui
 import time
-from pynput import keyboard
-from pynput.keyboard import Key
+_STARTED = time.perf_counter()  # For the startup report
+import os
+import json
+import threading
+import queue
+import hashlib
+import random
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import sys
+import atexit
+_NUMPY_STARTED = time.perf_counter()
+import numpy as np  # Module-level tables (journal dtype, motion paths) need it, so it is not deferred
+NUMPY_SECONDS = time.perf_counter() - _NUMPY_STARTED
+IMPORT_SECONDS = time.perf_counter() - _STARTED - NUMPY_SECONDS
 
-# Your Heroku app URL - UPDATE THIS WITH YOUR ACTUAL HEROKU APP NAME!
-SERVER_URL = 'https://www.pumpplaysminecraft.xyz'
+# Settings come from OSRS_<NAME> environment variables, then the JSON config
+# file (osrs_client.json next to this script, or the path in OSRS_CONFIG),
+# then the defaults below - no need to edit this file
+CONFIG_FILE = os.environ.get('OSRS_CONFIG') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'osrs_client.json')
 
-# Game window coordinates - UPDATED WITH YOUR ACTUAL OSRS WINDOW!
-GAME_WINDOW = {
+def load_config(path=CONFIG_FILE):
+    """Read the JSON config file ({} if there is none)"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not read config {path}: {e}")
+        return {}
+
+CONFIG = load_config()
+
+def setting(name, default):
+    """Setting from OSRS_<NAME>, else the config file, else `default`
+    
+    Environment strings are converted to the default's type (JSON for dicts).
+    """
+    raw = os.environ.get('OSRS_' + name.upper())
+    if raw is None:
+        return CONFIG.get(name, default)
+    if isinstance(default, bool):
+        return raw.lower() not in ('0', 'false', 'no', 'off', '')
+    if isinstance(default, (int, float)):
+        return type(default)(raw)
+    if isinstance(default, dict):
+        return json.loads(raw)
+    return raw
+
+def setting_is_set(name):
+    """True if `name` was set explicitly (environment or config file)"""
+    return 'OSRS_' + name.upper() in os.environ or name in CONFIG
+
+# Your server URL (OSRS_SERVER_URL / "server_url", or --server)
+SERVER_URL = setting('server_url', 'https://www.pumpplaysminecraft.xyz')
+
+# Game window coordinates (a saved calibration profile takes precedence)
+GAME_WINDOW = setting('game_window', {
     'x': 0,        # Fullscreen starts at top-left of monitor
     'y': 0,        # No title bar in fullscreen
     'width': 1920, # Full monitor width
     'height': 1080 # Full monitor height
-}
+})
 
 CLICK_OFFSET_X = 0  # No offset needed for fullscreen
 CLICK_OFFSET_Y = 0
 
-# Safety settings
-pyautogui.PAUSE = 0.1  # Pause between actions
-pyautogui.FAILSAFE = True  # Move mouse to top-left corner to stop
+# Calibration profile written by 'calibrate' and loaded at startup
+CALIBRATION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'osrs_calibration.json')
+# Reference points clicked during calibration, (name, relative position);
+# ENTER finishes early once MIN_CALIBRATION_POINTS are in
+CALIBRATION_POINTS = [
+    ("TOP-LEFT corner of game area", (0.0, 0.0)),
+    ("TOP-RIGHT corner of game area", (1.0, 0.0)),
+    ("BOTTOM-LEFT corner of game area", (0.0, 1.0)),
+    ("BOTTOM-RIGHT corner of game area", (1.0, 1.0)),
+    ("CENTER of game area", (0.5, 0.5)),
+    ("TOP edge, middle", (0.5, 0.0)),
+    ("BOTTOM edge, middle", (0.5, 1.0)),
+    ("LEFT edge, middle", (0.0, 0.5)),
+    ("RIGHT edge, middle", (1.0, 0.5)),
+]
+MIN_CALIBRATION_POINTS = 4
+
+# Queue lanes, most urgent first, and which lane each action goes in
+COMMAND_LANES = ('emergency', 'click', 'camera', 'other')
+ACTION_LANES = {
+    'emergency_stop': 'emergency',
+    'camera_stop': 'emergency',  # Releasing held keys must never wait
+    'direct_click': 'click',
+    'stream_click': 'click',
+    'right_click': 'click',
+    'batch_click': 'click',
+    'run_macro': 'click',
+    'action': 'click',
+    'key_press': 'camera',
+    'camera_start': 'camera',
+    'camera_hold': 'camera',
+}
+
+# Seconds after the server queued it that a command is no longer worth running
+ACTION_DEADLINES = {
+    'direct_click': 5.0,
+    'stream_click': 5.0,
+    'right_click': 5.0,
+    'batch_click': 8.0,
+    'run_macro': 10.0,
+    'action': 3.0,
+    'key_press': 2.0,
+    'camera_start': 1.0,
+    'camera_hold': 1.0,
+}
+
+# Camera drag per arrow press (pixels) - vertical is pitch, horizontal is yaw
+CAMERA_STEP_PIXELS = 50
+CAMERA_VECTORS = {
+    'up': (0, -CAMERA_STEP_PIXELS),
+    'down': (0, CAMERA_STEP_PIXELS),
+    'left': (-CAMERA_STEP_PIXELS, 0),
+    'right': (CAMERA_STEP_PIXELS, 0),
+}
+# 'drag' = middle-mouse drags, 'keys' = held arrow keys for key_press too
+CAMERA_MODE = setting('camera_mode', 'drag')
+# In keys mode one arrow press holds the key this long
+CAMERA_KEY_SECONDS_PER_STEP = 0.15
+# A held camera key is released after this long even without camera_stop
+CAMERA_MAX_HOLD = 3.0
+# Camera presses arriving within this window become one drag, capped at this size
+CAMERA_COALESCE_WINDOW = 0.05
+CAMERA_MAX_DRAG = 400
+
+# Simultaneous viewer clicks arriving within this window are clustered on a
+# grid of this cell size (relative units) and only the densest cluster's
+# centroid is clicked
+CLICK_CONSENSUS = setting('click_consensus', True)
+CLICK_CONSENSUS_WINDOW = 0.03
+CLICK_CLUSTER_CELL = 0.03
+CONSENSUS_ACTIONS = ('direct_click', 'stream_click')
+
+# How often to ping the server to track clock offset and round trip; no pong
+# for PONG_TIMEOUT seconds means the link is dead and we reconnect
+CLOCK_SYNC_INTERVAL = 1
+PONG_TIMEOUT = 4
+
+# Connection manager: websocket only (no long-polling handshake), reconnect
+# with jittered exponential backoff between these bounds
+CONNECT_TRANSPORTS = ['websocket']
+CONNECT_TIMEOUT = 5
+CONNECTION_POLL_INTERVAL = 0.05
+RECONNECT_BASE_DELAY = 0.1
+RECONNECT_MAX_DELAY = 10.0
+# Acks kept while disconnected, and completed ids offered on re-register
+ACK_BUFFER_MAX = 2000
+RESUME_COMPLETED_IDS = 200
+# Identifies this process across reconnects, so the server can hand the new
+# socket whatever the old one still had outstanding
+CLIENT_INSTANCE = f"{os.getpid():x}-{int(time.time() * 1000):x}"
+
+# Most points a single batch_click may carry (each is a full glide + click)
+BATCH_CLICK_MAX_POINTS = 16
+
+# Macros: cached step lists run with a single run_macro command
+MACRO_CACHE_SIZE = 32
+MACRO_MAX_STEPS = 64
+MACRO_MAX_WAIT = 5.0  # Seconds, per step and in total
+MACRO_KEY_TAP = 0.05
+MACRO_KEYS = (
+    set(CAMERA_VECTORS) | {'shift', 'ctrl', 'alt', 'space', 'enter', 'escape', 'tab', 'backspace'}
+    | {f'f{n}' for n in range(1, 13)} | set('abcdefghijklmnopqrstuvwxyz0123456789')
+)
+
+# Cursor paths: points per path, hand tremor (px), cache bucket width (px)
+# and how many path variants to keep per bucket
+MOTION_POINTS = 24
+MOTION_JITTER_PX = 1.5
+MOTION_BUCKET_PX = 50
+MOTION_VARIANTS = 8
+
+# Input delays per action, in seconds. 'safe' are the original hand-picked
+# values; profiles in TIMING_FILE (written by 'tune') override and extend these
+TIMING_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'osrs_timing.json')
+TIMING_PROFILE = setting('timing_profile', 'safe')
+TIMING_PROFILES = {
+    'safe': {
+        'focus': {'click': 0.02, 'return': 0.05, 'settle': 0.1},
+        'direct_click': {'travel': 0.1, 'hover': 0.05, 'settle': 0.2},
+        'right_click': {'travel': 0.1, 'hover': 0.05, 'settle': 0.2},
+        'click': {'settle': 0.1},
+        'camera': {'drag': 0.3},
+    },
+    'fast': {
+        'focus': {'click': 0.01, 'return': 0.03, 'settle': 0.05},
+        'direct_click': {'travel': 0.06, 'hover': 0.03, 'settle': 0.12},
+        'right_click': {'travel': 0.06, 'hover': 0.03, 'settle': 0.15},
+        'click': {'settle': 0.05},
+        'camera': {'drag': 0.2},
+    },
+}
+# Click verification: grab a square of CAPTURE_ROI_PX around the target before
+# and VERIFY_DELAY after the click; a click counts as verified if this share
+# of the square turned into a red/yellow click cross (or changed at all, for
+# the menu after a right-click). CAPTURE_SOURCE 'synthetic' is for tests.
+VERIFY_CLICKS = setting('verify_clicks', True)
+CAPTURE_SOURCE = setting('capture_source', 'mss')
+CAPTURE_ROI_PX = 48
+CAPTURE_DIFF_LEVEL = 40
+VERIFY_DELAY = 0.04
+VERIFY_CROSS_FRACTION = 0.01
+VERIFY_MENU_FRACTION = 0.3
+
+# UI anchors (templates recorded by 'anchors') used to re-derive the game
+# window automatically: search downscale factor, minimum NCC score, how often
+# to check, and how far the anchor signature may drift before a re-search
+ANCHOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'osrs_anchors')
+ANCHOR_DOWNSCALE = 4
+ANCHOR_MIN_SCORE = 0.8
+ANCHOR_CHECK_INTERVAL = 5
+ANCHOR_SIGNATURE_TOLERANCE = 12.0
+ANCHOR_MIN_SPAN = 0.02  # Relative distance two anchors need on each axis to fit a scale
+# Relative boxes (x0, y0, x1, y1) of static UI pieces to record as anchors
+DEFAULT_ANCHOR_BOXES = {
+    'minimap': (0.855, 0.0, 0.995, 0.03),
+    'inventory_tabs': (0.8, 0.62, 0.995, 0.655),
+    'chatbox_border': (0.0, 0.955, 0.27, 0.99),
+}
+
+# Share of the probed region that must change for the tuner to count a hover
+TUNE_CHANGE_THRESHOLD = 0.002
+
+# Pipelined clicks: after a click, which next actions may start travelling
+# before its settle delay is over, and how long the cursor must dwell first
+PIPELINE_ENABLED = setting('pipeline', True)
+PIPELINE_OVERLAPS = {
+    'direct_click': {'direct_click', 'stream_click', 'batch_click'},
+}
+PIPELINE_MIN_DWELL = {
+    'direct_click': 0.08,
+}
+
+# Global hotkey (pynput syntax) that stops all input; press again to resume
+EMERGENCY_HOTKEY = setting('stop_hotkey', '<ctrl>+<shift>+q')
+
+# Rolling latency window per action/phase, client_metrics push interval and
+# local Prometheus port (0 disables the endpoint)
+METRICS_WINDOW = 500
+METRICS_INTERVAL = 10
+METRICS_PORT = setting('metrics_port', 9108)
+
+# Batched acks (when the server supports them): flush interval and max batch
+ACK_FLUSH_INTERVAL = 0.05
+ACK_BATCH_MAX = 32
+
+# Event log: verbosity (debug, info, warning, error), comma-separated sinks
+# (console, jsonl, socket), ring buffer size and the rotating JSONL file
+LOG_LEVEL = setting('log_level', 'info')
+LOG_SINK_NAMES = setting('log_sinks', 'console')
+LOG_BUFFER_SIZE = 4096
+LOG_DRAIN_INTERVAL = 0.02
+LOG_FILE = setting('log_file', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'osrs_logs', 'client.jsonl'))
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+LOG_FORWARD_LEVEL = 'warning'  # Lowest level the socket sink sends to the server
+
+# Binary journal of every command (replay with 'replay <log>')
+JOURNAL_ENABLED = setting('journal', True)
+JOURNAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'osrs_journals')
+
+# Window titles that count as "OSRS has focus"
+OSRS_WINDOW_TITLES = ('RuneLite', 'Old School RuneScape')
+# Without a readable foreground window, trust focus this long after the last input
+FOCUS_TRUST_SECONDS = 30
+
+# Commands waiting for the input worker - more than this and new ones are rejected
+COMMAND_QUEUE_SIZE = 32
+
+# Command ids remembered to drop duplicate deliveries (reconnects, retries)
+DEDUP_CACHE_SIZE = setting('dedup_size', 1024)
+DEDUP_WINDOW = setting('dedup_window', 120.0)
+
+# Credit-based flow control: keep about this many seconds of work between the
+# credits the server holds and the commands we are running, sized from an
+# EWMA of measured execution time
+CREDIT_BACKLOG_SECONDS = 1.0
+CREDIT_MIN = 1
+CREDIT_MAX = COMMAND_QUEUE_SIZE // 2
+CREDIT_INITIAL_EXEC_TIME = 0.25
+CREDIT_EWMA_ALPHA = 0.2
+
+# Input backend: pyautogui, pynput, xtest, uinput, null, recording - or 'auto' for the fastest
+INPUT_BACKEND = setting('input_backend', 'pyautogui')
+# Full desktop size for the uinput axis range: [width, height] in the config
+# file or "WIDTHxHEIGHT" in OSRS_SCREEN_SIZE; detected if unset
+SCREEN_SIZE = setting('screen_size', None)
+
+class LazySocketClient:
+    """socketio.Client that is only imported and built on first real use
+    
+    Handlers registered with @sio.on / @sio.event before then are kept and
+    attached when the client is created, so CLI modes that never connect
+    don't pay for importing python-socketio.
+    """
+    
+    def __init__(self, **options):
+        self.options = options
+        self.handlers = []
+        self.client = None
+        self.lock = threading.Lock()
+    
+    def on(self, event, handler=None):
+        def register(handler):
+            with self.lock:
+                self.handlers.append((event, handler))
+                if self.client is not None:
+                    self.client.on(event, handler)
+            return handler
+        return register(handler) if handler else register
+    
+    def event(self, handler):
+        return self.on(handler.__name__, handler)
+    
+    @property
+    def connected(self):
+        return self.client is not None and self.client.connected
+    
+    def _get(self):
+        with self.lock:
+            if self.client is None:
+                import socketio
+                self.client = socketio.Client(**self.options)
+                for event, handler in self.handlers:
+                    self.client.on(event, handler)
+            return self.client
+    
+    def reset(self):
+        """Abandon the current client (its transport may hang) and build a fresh one next time"""
+        with self.lock:
+            old, self.client = self.client, None
+        if old is not None:
+            threading.Thread(target=old.disconnect, name='sio-teardown', daemon=True).start()
+    
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
 
 # Create socket client
-sio = socketio.Client(logger=False, engineio_logger=False)
+sio = LazySocketClient(reconnection=False, logger=False, engineio_logger=False)  # ConnectionManager reconnects
+
+LOG_LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40}
+
+class ConsoleSink:
+    """The familiar emoji lines on stdout"""
+    
+    def write(self, records):
+        sys.stdout.write(''.join(record['msg'] + '\n' for record in records))
+        sys.stdout.flush()
+
+class JsonlSink:
+    """One JSON object per line, rotated at max_bytes keeping `backups` old files"""
+    
+    def __init__(self, path=LOG_FILE, max_bytes=LOG_FILE_MAX_BYTES, backups=LOG_FILE_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'a', encoding='utf-8')
+    
+    def _rotate(self):
+        self.file.close()
+        for n in range(self.backups - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{n}'):
+                os.replace(f'{self.path}.{n}', f'{self.path}.{n + 1}')
+        if self.backups:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self.file = open(self.path, 'a', encoding='utf-8')
+    
+    def write(self, records):
+        self.file.write(''.join(json.dumps(record, default=str) + '\n' for record in records))
+        self.file.flush()
+        if self.file.tell() >= self.max_bytes:
+            self._rotate()
+
+class SocketSink:
+    """Forwards records at or above `level` to the server as 'client_log'"""
+    
+    def __init__(self, level=LOG_FORWARD_LEVEL):
+        self.level = LOG_LEVELS[level]
+    
+    def write(self, records):
+        records = [record for record in records if LOG_LEVELS[record['level']] >= self.level]
+        if records and sio.connected:
+            sio.emit('client_log', {'records': records})
+
+LOG_SINKS = {'console': ConsoleSink, 'jsonl': JsonlSink, 'socket': SocketSink}
+
+class EventLog:
+    """Structured events through a ring buffer, written out by a background thread
+    
+    Logging never blocks the caller: a record is appended to a bounded
+    deque (atomic under the GIL, no lock taken) and a drainer thread hands
+    batches to the sinks. When the sinks fall behind the oldest records
+    are overwritten and counted as dropped.
+    """
+    
+    def __init__(self, level=LOG_LEVEL, size=LOG_BUFFER_SIZE):
+        self.level = LOG_LEVELS[level]
+        self.buffer = deque(maxlen=size)
+        self.sinks = [ConsoleSink()]
+        self.dropped = 0
+        self.reported_dropped = 0
+        self.thread = None
+    
+    def configure(self, names):
+        """Use the comma-separated sinks in `names` (console, jsonl, socket)"""
+        sinks = []
+        for name in (n.strip() for n in names.split(',')):
+            if name:
+                try:
+                    sinks.append(LOG_SINKS[name]())
+                except Exception as e:
+                    print(f"⚠️ Log sink '{name}' unavailable: {e}")
+        self.sinks = sinks or [ConsoleSink()]
+    
+    def set_level(self, level):
+        """Change verbosity at runtime"""
+        self.level = LOG_LEVELS[level]
+    
+    def emit(self, level, event, msg, **fields):
+        if LOG_LEVELS[level] < self.level:
+            return
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append({'ts': time.time(), 'level': level, 'event': event, 'msg': msg, **fields})
+        if self.thread is None:
+            self.start()
+    
+    def debug(self, event, msg, **fields):
+        self.emit('debug', event, msg, **fields)
+    
+    def info(self, event, msg, **fields):
+        self.emit('info', event, msg, **fields)
+    
+    def warning(self, event, msg, **fields):
+        self.emit('warning', event, msg, **fields)
+    
+    def error(self, event, msg, **fields):
+        self.emit('error', event, msg, **fields)
+    
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='log-drainer', daemon=True)
+            self.thread.start()
+    
+    def flush(self):
+        """Write out everything buffered so far (drainer or exit path)"""
+        batch = []
+        while True:
+            try:
+                batch.append(self.buffer.popleft())
+            except IndexError:
+                break
+        if self.dropped != self.reported_dropped:
+            lost, self.reported_dropped = self.dropped - self.reported_dropped, self.dropped
+            batch.append({'ts': time.time(), 'level': 'warning', 'event': 'log_dropped',
+                          'msg': f"⚠️ Log fell behind, dropped {lost} records", 'dropped': lost})
+        if not batch:
+            return
+        for sink in self.sinks:
+            try:
+                sink.write(batch)
+            except Exception:
+                pass  # A broken sink must not take the others down
+    
+    def _run(self):
+        while True:
+            if self.buffer:
+                self.flush()
+            else:
+                time.sleep(LOG_DRAIN_INTERVAL)
+
+log = EventLog()
+atexit.register(log.flush)
+
+
+class CoordinateTransform:
+    """Precomputed 3x3 transform from relative stream coords (0-1) to screen pixels
+    
+    Fitted once by least squares over calibration point pairs, either as an
+    affine map or a full homography, and persisted as a calibration profile.
+    """
+    
+    def __init__(self, matrix, kind='affine', points=None, game_window=None):
+        self.matrix = np.asarray(matrix, dtype=np.float64).reshape(3, 3)
+        self.kind = kind
+        self.points = points or []
+        self.game_window = dict(game_window) if game_window else window_from_matrix(self.matrix)
+        # Plain floats for the single-point path, NumPy is slower than that for one point
+        (self._a, self._b, self._c), (self._d, self._e, self._f), (self._g, self._h, self._i) = self.matrix.tolist()
+    
+    @classmethod
+    def from_game_window(cls, window, offset_x=0, offset_y=0):
+        """Plain scale + offset transform equivalent to the old GAME_WINDOW math"""
+        matrix = [
+            [window['width'], 0, window['x'] + offset_x],
+            [0, window['height'], window['y'] + offset_y],
+            [0, 0, 1],
+        ]
+        return cls(matrix, kind='affine', game_window=window)
+    
+    @classmethod
+    def fit(cls, rel_points, screen_points, kind='auto', names=None):
+        """Least-squares fit over N >= 3 point pairs (N >= 4 for a homography)"""
+        rel = np.asarray(rel_points, dtype=np.float64).reshape(-1, 2)
+        screen = np.asarray(screen_points, dtype=np.float64).reshape(-1, 2)
+        if len(rel) != len(screen):
+            raise ValueError("Need the same number of relative and screen points")
+        if len(rel) < 3:
+            raise ValueError("Need at least 3 calibration points")
+        
+        if kind == 'affine' or (kind == 'auto' and len(rel) < 4):
+            matrix, kind = fit_affine(rel, screen), 'affine'
+        elif kind == 'homography':
+            matrix = fit_homography(rel, screen)
+        else:
+            # Only pay for perspective if it actually explains the points better
+            affine = fit_affine(rel, screen)
+            homography = fit_homography(rel, screen)
+            if rms_error(homography, rel, screen) + 0.5 < rms_error(affine, rel, screen):
+                matrix, kind = homography, 'homography'
+            else:
+                matrix, kind = affine, 'affine'
+        
+        names = names or [None] * len(rel)
+        points = [
+            {'name': name, 'rel': [float(r[0]), float(r[1])], 'screen': [float(s[0]), float(s[1])]}
+            for name, r, s in zip(names, rel, screen)
+        ]
+        return cls(matrix, kind=kind, points=points)
+    
+    def map_point(self, rel_x, rel_y):
+        """Map one relative point to screen pixels"""
+        w = self._g * rel_x + self._h * rel_y + self._i
+        return ((self._a * rel_x + self._b * rel_y + self._c) / w,
+                (self._d * rel_x + self._e * rel_y + self._f) / w)
+    
+    def map_points(self, rel_xy):
+        """Map an (N, 2) array of relative points to an (N, 2) array of screen pixels"""
+        rel = np.asarray(rel_xy, dtype=np.float64).reshape(-1, 2)
+        out = rel @ self.matrix[:2, :2].T + self.matrix[:2, 2]
+        if self.kind != 'affine':
+            w = rel @ self.matrix[2, :2] + self.matrix[2, 2]
+            out /= w[:, None]
+        return out
+    
+    def inverse_points(self, screen_xy):
+        """Map screen pixels back to relative stream coordinates"""
+        screen = np.asarray(screen_xy, dtype=np.float64).reshape(-1, 2)
+        ones = np.ones((len(screen), 1))
+        mapped = np.hstack([screen, ones]) @ np.linalg.inv(self.matrix).T
+        return mapped[:, :2] / mapped[:, 2:3]
+    
+    def residuals(self, rel_points=None, screen_points=None):
+        """Per-point error in pixels (defaults to the stored calibration points)"""
+        if rel_points is None:
+            if not self.points:
+                return np.zeros(0)
+            rel_points = [p['rel'] for p in self.points]
+            screen_points = [p['screen'] for p in self.points]
+        screen = np.asarray(screen_points, dtype=np.float64).reshape(-1, 2)
+        return np.linalg.norm(self.map_points(rel_points) - screen, axis=1)
+    
+    def to_profile(self):
+        return {
+            'version': 1,
+            'kind': self.kind,
+            'matrix': self.matrix.tolist(),
+            'game_window': self.game_window,
+            'points': self.points,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+    
+    def save(self, path=None):
+        """Write the calibration profile as JSON"""
+        path = path or CALIBRATION_FILE
+        with open(path, 'w') as f:
+            json.dump(self.to_profile(), f, indent=2)
+        return path
+    
+    @classmethod
+    def load(cls, path=None):
+        """Read a calibration profile written by save()"""
+        with open(path or CALIBRATION_FILE) as f:
+            profile = json.load(f)
+        return cls(profile['matrix'], kind=profile.get('kind', 'affine'),
+                   points=profile.get('points'), game_window=profile.get('game_window'))
+
+def fit_affine(rel, screen):
+    """Least-squares affine fit, returns a 3x3 matrix"""
+    design = np.hstack([rel, np.ones((len(rel), 1))])
+    solution, *_ = np.linalg.lstsq(design, screen, rcond=None)
+    matrix = np.eye(3)
+    matrix[:2, :] = solution.T
+    return matrix
+
+def fit_homography(rel, screen):
+    """Least-squares homography fit (normalized DLT), returns a 3x3 matrix"""
+    if len(rel) < 4:
+        raise ValueError("Need at least 4 points for a homography")
+    
+    def normalizer(points):
+        center = points.mean(axis=0)
+        spread = np.sqrt(((points - center) ** 2).sum(axis=1)).mean() or 1.0
+        scale = np.sqrt(2) / spread
+        return np.array([[scale, 0, -scale * center[0]],
+                         [0, scale, -scale * center[1]],
+                         [0, 0, 1]])
+    
+    t_rel, t_screen = normalizer(rel), normalizer(screen)
+    ones = np.ones((len(rel), 1))
+    src = (np.hstack([rel, ones]) @ t_rel.T)[:, :2]
+    dst = (np.hstack([screen, ones]) @ t_screen.T)[:, :2]
+    
+    rows = []
+    for (x, y), (u, v) in zip(src, dst):
+        rows.append([-x, -y, -1, 0, 0, 0, u * x, u * y, u])
+        rows.append([0, 0, 0, -x, -y, -1, v * x, v * y, v])
+    _, _, vt = np.linalg.svd(np.asarray(rows))
+    h = vt[-1].reshape(3, 3)
+    
+    matrix = np.linalg.inv(t_screen) @ h @ t_rel
+    return matrix / matrix[2, 2]
+
+def rms_error(matrix, rel, screen):
+    mapped = np.hstack([rel, np.ones((len(rel), 1))]) @ matrix.T
+    mapped = mapped[:, :2] / mapped[:, 2:3]
+    return float(np.sqrt(((mapped - screen) ** 2).sum(axis=1).mean()))
+
+def window_from_matrix(matrix):
+    """Bounding box of the mapped unit square, used for focus clicks and display"""
+    corners = np.array([[0, 0, 1], [1, 0, 1], [0, 1, 1], [1, 1, 1]], dtype=np.float64) @ matrix.T
+    corners = corners[:, :2] / corners[:, 2:3]
+    left, top = corners.min(axis=0)
+    right, bottom = corners.max(axis=0)
+    return {
+        'x': int(round(left)),
+        'y': int(round(top)),
+        'width': int(round(right - left)),
+        'height': int(round(bottom - top))
+    }
+
+def load_calibration(path=None):
+    """Load the saved calibration profile, falling back to GAME_WINDOW"""
+    global transform
+    path = path or CALIBRATION_FILE
+    if os.path.exists(path):
+        try:
+            transform = CoordinateTransform.load(path)
+            GAME_WINDOW.update(transform.game_window)
+            print(f"📐 Loaded {transform.kind} calibration from {path}")
+            return transform
+        except Exception as e:
+            print(f"⚠️ Could not read calibration profile {path}: {e}")
+    transform = CoordinateTransform.from_game_window(GAME_WINDOW, CLICK_OFFSET_X, CLICK_OFFSET_Y)
+    return transform
+
+transform = CoordinateTransform.from_game_window(GAME_WINDOW, CLICK_OFFSET_X, CLICK_OFFSET_Y)
+
+class CommandCancelled(BaseException):
+    """Raised inside a running command when an emergency stop fires
+    
+    Derives from BaseException so the handlers' `except Exception` blocks
+    don't swallow it on the way up to the executor.
+    """
+
+class EmergencyStop:
+    """Stop switch checked by the input worker between every micro-step
+    
+    A latched stop (hotkey) blocks all input until resumed; an unlatched one
+    (admin emergency_stop from the server) only cancels what is running or
+    queued now.
+    Each command remembers the generation it started in, so it is
+    cancelled by any trigger that happens while it runs.
+    """
+    
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.latched = False
+        self.generation = 0
+        self.hotkey_listener = None
+    
+    def token(self):
+        with self.cond:
+            return self.generation
+    
+    def cancelled(self, token=None):
+        with self.cond:
+            return self.latched or (token is not None and token != self.generation)
+    
+    def check(self, token=None):
+        if self.cancelled(token):
+            raise CommandCancelled()
+    
+    def sleep(self, seconds, token=None):
+        """Sleep that wakes up (and raises) the moment a stop fires"""
+        deadline = time.perf_counter() + seconds
+        with self.cond:
+            while True:
+                if self.latched or (token is not None and token != self.generation):
+                    raise CommandCancelled()
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return
+                self.cond.wait(remaining)
+    
+    def trigger(self, source, latch=True):
+        """Cancel the running command, release held input and flush the queue"""
+        started = time.perf_counter()
+        with self.cond:
+            self.generation += 1
+            self.latched = self.latched or latch
+            self.cond.notify_all()
+        
+        pipeline.reset()
+        try:
+            camera.stop()
+            if input_backend is not None:
+                input_backend.release_all()
+        except Exception as e:
+            log.warning('emergency_stop', f"⚠️ Could not release held input: {e}")
+        flushed = executor.flush()
+        
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        state = 'stopped' if self.latched else 'running'
+        log.warning('emergency_stop', f"🛑 EMERGENCY STOP ({source}) - flushed {flushed} commands in {elapsed_ms:.1f}ms",
+                    source=source, flushed=flushed, stop_ms=elapsed_ms)
+        report_state(state, source=source, flushed=flushed, stopMs=round(elapsed_ms, 2))
+        return flushed
+    
+    def resume(self, source='hotkey'):
+        with self.cond:
+            self.latched = False
+            self.cond.notify_all()
+        log.info('resume', f"▶️  Resumed ({source}) - accepting commands again", source=source)
+        report_state('running', source=source)
+    
+    def toggle(self, source='hotkey'):
+        if self.latched:
+            self.resume(source)
+        else:
+            self.trigger(source, latch=True)
+    
+    def start_hotkey(self, hotkey=EMERGENCY_HOTKEY):
+        """Listen for the global stop hotkey on pynput's own thread"""
+        from pynput import keyboard
+        self.hotkey_listener = keyboard.GlobalHotKeys({hotkey: self.toggle})
+        self.hotkey_listener.daemon = True
+        self.hotkey_listener.start()
+        return self.hotkey_listener
+
+emergency = EmergencyStop()
+
+def checkpoint():
+    """Raise CommandCancelled if a stop fired since the current command started"""
+    emergency.check(getattr(_worker_state, 'stop_token', None))
+
+def pause(seconds):
+    """time.sleep replacement for input code - cut short by an emergency stop"""
+    emergency.sleep(seconds, getattr(_worker_state, 'stop_token', None))
+
+def report_state(state, **details):
+    """Tell the server whether this PC is running or emergency-stopped"""
+    try:
+        if sio.connected:
+            sio.emit('client_state', {'state': state, 'timestamp': time.time(), **details})
+    except Exception:
+        pass  # Re-sent on the next state change
+
+class MotionEngine:
+    """Precomputed human-like cursor paths played back on a tight timer
+    
+    Paths are eased cubic Bezier curves with a little perpendicular jitter,
+    generated in a unit frame (start (0, 0), end (1, 0)) and cached per
+    distance bucket, so a move is just a rotate/scale of a cached array.
+    """
+    
+    def __init__(self, points=MOTION_POINTS, jitter=MOTION_JITTER_PX, bucket_px=MOTION_BUCKET_PX,
+                 variants=MOTION_VARIANTS, seed=None):
+        self.points = max(2, int(points))
+        self.jitter = jitter
+        self.bucket_px = bucket_px
+        self.variants = variants
+        self.rng = np.random.default_rng(seed)
+        self.cache = {}  # distance bucket -> list of (points, 2) unit paths
+        self.lock = threading.Lock()
+    
+    def _unit_path(self, bucket):
+        distance = (bucket + 0.5) * self.bucket_px
+        t = np.linspace(0.0, 1.0, self.points)
+        # Smootherstep easing: slow start, fast middle, slow landing
+        s = t * t * t * (t * (t * 6 - 15) + 10)
+        # Control points bow the path to one side, less so for long moves
+        bow = min(0.25, 40.0 / distance)
+        c1 = np.array([0.3, self.rng.normal(0, bow)])
+        c2 = np.array([0.7, self.rng.normal(0, bow)])
+        u = 1 - s
+        path = (np.outer(u ** 3, [0.0, 0.0]) + np.outer(3 * u * u * s, c1)
+                + np.outer(3 * u * s * s, c2) + np.outer(s ** 3, [1.0, 0.0]))
+        if self.jitter:
+            # Hand tremor, zero at both ends so the landing spot is exact
+            tremor = self.rng.normal(0, self.jitter / distance, self.points) * np.sin(np.pi * t)
+            path[:, 1] += tremor
+        return path
+    
+    def path(self, start, end):
+        """(points, 2) float array of screen positions from start to end"""
+        start = np.asarray(start, dtype=np.float64)
+        delta = np.asarray(end, dtype=np.float64) - start
+        distance = float(np.hypot(*delta))
+        bucket = int(distance // self.bucket_px)
+        with self.lock:
+            variants = self.cache.get(bucket)
+            if variants is None or len(variants) < self.variants:
+                variants = self.cache.setdefault(bucket, [])
+                variants.append(self._unit_path(bucket))
+            unit = variants[int(self.rng.integers(len(variants)))]
+        # Rotate and scale the unit frame onto the real start -> end vector
+        basis = np.array([[delta[0], -delta[1]], [delta[1], delta[0]]])
+        return start + unit @ basis.T
+    
+    def warm(self, max_distance):
+        """Fill the path cache for every distance bucket up to max_distance"""
+        with self.lock:
+            for bucket in range(int(max_distance // self.bucket_px) + 1):
+                variants = self.cache.setdefault(bucket, [])
+                while len(variants) < self.variants:
+                    variants.append(self._unit_path(bucket))
+    
+    def play(self, backend, end, duration):
+        """Move `backend`'s cursor to `end` along a cached path over `duration` seconds"""
+        start = backend.position()
+        path = np.rint(self.path(start, end)).astype(np.int64)
+        # Drop the start point and steps that don't change pixel - fewer syscalls, same motion
+        keep = np.any(np.diff(path, axis=0) != 0, axis=1)
+        path = path[1:][keep]
+        if not len(path):
+            return 0
+        schedule = np.linspace(0.0, duration, len(path) + 1)[1:]
+        
+        began = time.perf_counter()
+        for (x, y), due in zip(path.tolist(), schedule.tolist()):
+            checkpoint()
+            remaining = began + due - time.perf_counter()
+            if remaining > 0.002:
+                # Sleep most of the gap (stop-aware), spin the last bit for accuracy
+                pause(remaining - 0.0015)
+            while time.perf_counter() < began + due:
+                pass
+            step_start = time.perf_counter()
+            backend._timed('motion_step', backend._move, x, y)
+            backend.latency.record('motion_step_lag', step_start - (began + due))
+        return len(path)
+
+motion = MotionEngine()
+
+class LatencyStats:
+    """Rolling per-operation latency samples for an input backend"""
+    
+    def __init__(self, window=1000):
+        self.window = window
+        self.samples = {}
+        self.lock = threading.Lock()
+    
+    def record(self, op, seconds):
+        with self.lock:
+            samples = self.samples.get(op)
+            if samples is None:
+                samples = self.samples[op] = deque(maxlen=self.window)
+            samples.append(seconds)
+    
+    def report(self):
+        """{op: {count, mean_us, p50_us, p95_us, max_us}} over the rolling window"""
+        with self.lock:
+            snapshot = {op: np.array(samples) for op, samples in self.samples.items() if samples}
+        report = {}
+        for op, values in snapshot.items():
+            micros = values * 1e6
+            report[op] = {
+                'count': int(len(micros)),
+                'mean_us': float(micros.mean()),
+                'p50_us': float(np.percentile(micros, 50)),
+                'p95_us': float(np.percentile(micros, 95)),
+                'max_us': float(micros.max()),
+            }
+        return report
+
+class InputBackend:
+    """Interface every input backend implements
+    
+    Subclasses provide the _primitive methods; the public methods time each
+    call so every backend reports the same per-operation latency numbers.
+    Coordinates are absolute screen pixels, buttons are 'left', 'right' or
+    'middle' and keys use pyautogui-style names ('up', 'shift', 'a', ...).
+    """
+    
+    name = 'base'
+    
+    def __init__(self):
+        self.latency = LatencyStats()
+        self.held_buttons = set()
+        self.held_keys = set()
+        # Camera key releases come from a timer thread, keep primitives serialized
+        self.lock = threading.RLock()
+    
+    def _timed(self, op, fn, *args):
+        with self.lock:
+            start = time.perf_counter()
+            result = fn(*args)
+            self.latency.record(op, time.perf_counter() - start)
+        return result
+    
+    # Primitives - override these
+    def _position(self):
+        raise NotImplementedError
+    
+    def _move(self, x, y):
+        raise NotImplementedError
+    
+    def _mouse_down(self, button):
+        raise NotImplementedError
+    
+    def _mouse_up(self, button):
+        raise NotImplementedError
+    
+    def _key_down(self, key):
+        raise NotImplementedError
+    
+    def _key_up(self, key):
+        raise NotImplementedError
+    
+    # Public API
+    def position(self):
+        return self._timed('position', self._position)
+    
+    def move(self, x, y):
+        """Jump the cursor to (x, y) without any tweening"""
+        self._timed('move', self._move, int(round(x)), int(round(y)))
+    
+    def glide(self, x, y, duration=0.0):
+        """Move to (x, y) over `duration` seconds along a human-like path"""
+        if duration <= 0:
+            self.move(x, y)
+            return
+        motion.play(self, (x, y), duration)
+    
+    def mouse_down(self, button='left'):
+        self._timed('mouse_down', self._mouse_down, button)
+        self.held_buttons.add(button)
+    
+    def mouse_up(self, button='left'):
+        self._timed('mouse_up', self._mouse_up, button)
+        self.held_buttons.discard(button)
+    
+    def click(self, x=None, y=None, button='left'):
+        """Click at (x, y), or at the current position if no coordinates given"""
+        with self.lock:
+            start = time.perf_counter()
+            if x is not None and y is not None:
+                self._move(int(round(x)), int(round(y)))
+            self._mouse_down(button)
+            self._mouse_up(button)
+            self.latency.record('click', time.perf_counter() - start)
+    
+    def right_click(self, x=None, y=None):
+        self.click(x, y, button='right')
+    
+    def drag(self, dx, dy, duration=0.0, button='left'):
+        """Drag relative to the current position with `button` held"""
+        start_x, start_y = self.position()
+        self.mouse_down(button)
+        try:
+            self.glide(start_x + dx, start_y + dy, duration)
+        finally:
+            self.mouse_up(button)
+    
+    def key_down(self, key):
+        self._timed('key_down', self._key_down, key)
+        self.held_keys.add(key)
+    
+    def key_up(self, key):
+        self._timed('key_up', self._key_up, key)
+        self.held_keys.discard(key)
+    
+    def hold_key(self, key, seconds):
+        """Hold a key for `seconds` (blocking)"""
+        self.key_down(key)
+        try:
+            pause(seconds)
+        finally:
+            self.key_up(key)
+    
+    def release_all(self):
+        """Release every button and key this backend still holds down"""
+        for button in list(self.held_buttons):
+            self.mouse_up(button)
+        for key in list(self.held_keys):
+            self.key_up(key)
+    
+    def latency_report(self):
+        return self.latency.report()
+    
+    def close(self):
+        """Let go of whatever device or display connection the backend holds"""
+        self.release_all()
+
+class PyAutoGUIBackend(InputBackend):
+    """pyautogui with its global PAUSE disabled - delays are ours to choose"""
+    
+    name = 'pyautogui'
+    
+    def __init__(self):
+        super().__init__()
+        import pyautogui
+        self.gui = pyautogui
+        pyautogui.PAUSE = 0  # Handlers sleep explicitly where OSRS needs it
+        pyautogui.FAILSAFE = True  # Move mouse to top-left corner to stop
+    
+    def _position(self):
+        x, y = self.gui.position()
+        return x, y
+    
+    def _move(self, x, y):
+        self.gui.moveTo(x, y, _pause=False)
+    
+    def _mouse_down(self, button):
+        self.gui.mouseDown(button=button, _pause=False)
+    
+    def _mouse_up(self, button):
+        self.gui.mouseUp(button=button, _pause=False)
+    
+    def _key_down(self, key):
+        self.gui.keyDown(key, _pause=False)
+    
+    def _key_up(self, key):
+        self.gui.keyUp(key, _pause=False)
+
+class PynputBackend(InputBackend):
+    """pynput mouse/keyboard Controllers - no tweening, no global pause"""
+    
+    name = 'pynput'
+    
+    def __init__(self):
+        super().__init__()
+        from pynput import mouse, keyboard
+        self.mouse = mouse.Controller()
+        self.keyboard = keyboard.Controller()
+        self.buttons = {
+            'left': mouse.Button.left,
+            'right': mouse.Button.right,
+            'middle': mouse.Button.middle,
+        }
+        self.special_keys = keyboard.Key
+    
+    def _key(self, key):
+        if len(key) == 1:
+            return key
+        return getattr(self.special_keys, PYNPUT_KEY_NAMES.get(key, key))
+    
+    def _position(self):
+        x, y = self.mouse.position
+        return int(x), int(y)
+    
+    def _move(self, x, y):
+        self.mouse.position = (x, y)
+    
+    def _mouse_down(self, button):
+        self.mouse.press(self.buttons[button])
+    
+    def _mouse_up(self, button):
+        self.mouse.release(self.buttons[button])
+    
+    def _key_down(self, key):
+        self.keyboard.press(self._key(key))
+    
+    def _key_up(self, key):
+        self.keyboard.release(self._key(key))
+
+class XTestBackend(InputBackend):
+    """Linux/X11 XTest extension through python-xlib"""
+    
+    name = 'xtest'
+    buttons = {'left': 1, 'middle': 2, 'right': 3}
+    
+    def __init__(self):
+        super().__init__()
+        from Xlib import X, XK, display
+        from Xlib.ext import xtest
+        self.X = X
+        self.XK = XK
+        self.xtest = xtest
+        self.display = display.Display()
+        if not self.display.has_extension('XTEST'):
+            raise RuntimeError("X server has no XTEST extension")
+        self.root = self.display.screen().root
+        self.keycodes = {}
+    
+    def _keycode(self, key):
+        code = self.keycodes.get(key)
+        if code is None:
+            keysym = self.XK.string_to_keysym(xtest_keysym_name(key))
+            code = self.display.keysym_to_keycode(keysym) if keysym else 0
+            if not code:
+                raise ValueError(f"No X keycode for key '{key}'")
+            self.keycodes[key] = code
+        return code
+    
+    def _fake(self, event, detail=0, **kwargs):
+        self.xtest.fake_input(self.display, event, detail, **kwargs)
+        self.display.sync()
+    
+    def _position(self):
+        pointer = self.root.query_pointer()
+        return pointer.root_x, pointer.root_y
+    
+    def _move(self, x, y):
+        self._fake(self.X.MotionNotify, x=x, y=y)
+    
+    def _mouse_down(self, button):
+        self._fake(self.X.ButtonPress, self.buttons[button])
+    
+    def _mouse_up(self, button):
+        self._fake(self.X.ButtonRelease, self.buttons[button])
+    
+    def _key_down(self, key):
+        self._fake(self.X.KeyPress, self._keycode(key))
+    
+    def _key_up(self, key):
+        self._fake(self.X.KeyRelease, self._keycode(key))
+    
+    def close(self):
+        super().close()
+        self.display.close()
+
+def detect_screen_size():
+    """(width, height) of the whole desktop, which is what uinput's axes span"""
+    if SCREEN_SIZE:
+        size = SCREEN_SIZE.lower().split('x') if isinstance(SCREEN_SIZE, str) else SCREEN_SIZE
+        width, height = size
+        return int(width), int(height)
+    try:
+        import mss
+        with mss.mss() as screen:
+            desktop = screen.monitors[0]  # Bounding box of every monitor
+            return desktop['width'], desktop['height']
+    except Exception:
+        pass
+    try:
+        from Xlib import display
+        x_display = display.Display()
+        try:
+            screen = x_display.screen()
+            return screen.width_in_pixels, screen.height_in_pixels
+        finally:
+            x_display.close()
+    except Exception:
+        pass
+    raise RuntimeError("Can't detect the screen size, set screen_size to [width, height]")
+
+class UInputBackend(InputBackend):
+    """Linux kernel uinput virtual device through python-evdev (needs /dev/uinput access)
+    
+    Works under X11 and Wayland alike. The device can't be queried, so the
+    cursor position is tracked from what we sent.
+    """
+    
+    name = 'uinput'
+    
+    def __init__(self, screen_size=None):
+        super().__init__()
+        from evdev import UInput, AbsInfo, ecodes
+        self.ecodes = ecodes
+        # libinput stretches the axis range over the whole desktop
+        width, height = screen_size or detect_screen_size()
+        self.buttons = {
+            'left': ecodes.BTN_LEFT,
+            'right': ecodes.BTN_RIGHT,
+            'middle': ecodes.BTN_MIDDLE,
+        }
+        key_codes = [code for name, code in ecodes.ecodes.items() if name.startswith('KEY_')]
+        self.device = UInput({
+            ecodes.EV_KEY: list(self.buttons.values()) + key_codes,
+            ecodes.EV_ABS: [
+                (ecodes.ABS_X, AbsInfo(0, 0, width - 1, 0, 0, 0)),
+                (ecodes.ABS_Y, AbsInfo(0, 0, height - 1, 0, 0, 0)),
+            ],
+        }, name='osrs-controller')
+        self.cursor = (width // 2, height // 2)
+    
+    def _keycode(self, key):
+        return self.ecodes.ecodes['KEY_' + UINPUT_KEY_NAMES.get(key, key).upper()]
+    
+    def _write(self, event_type, code, value):
+        self.device.write(event_type, code, value)
+        self.device.syn()
+    
+    def _position(self):
+        return self.cursor
+    
+    def _move(self, x, y):
+        self.device.write(self.ecodes.EV_ABS, self.ecodes.ABS_X, x)
+        self.device.write(self.ecodes.EV_ABS, self.ecodes.ABS_Y, y)
+        self.device.syn()
+        self.cursor = (x, y)
+    
+    def _mouse_down(self, button):
+        self._write(self.ecodes.EV_KEY, self.buttons[button], 1)
+    
+    def _mouse_up(self, button):
+        self._write(self.ecodes.EV_KEY, self.buttons[button], 0)
+    
+    def _key_down(self, key):
+        self._write(self.ecodes.EV_KEY, self._keycode(key), 1)
+    
+    def _key_up(self, key):
+        self._write(self.ecodes.EV_KEY, self._keycode(key), 0)
+    
+    def close(self):
+        super().close()
+        self.device.close()
+
+class NullBackend(InputBackend):
+    """Does nothing - for headless runs and benchmarks"""
+    
+    name = 'null'
+    
+    def __init__(self):
+        super().__init__()
+        self.cursor = (0, 0)
+    
+    def _position(self):
+        return self.cursor
+    
+    def _move(self, x, y):
+        self.cursor = (x, y)
+    
+    def _mouse_down(self, button):
+        pass
+    
+    def _mouse_up(self, button):
+        pass
+    
+    def _key_down(self, key):
+        pass
+    
+    def _key_up(self, key):
+        pass
+    
+    def glide(self, x, y, duration=0.0):
+        # Nothing to look at, skip the tween
+        self.move(x, y)
+
+class RecordingBackend(NullBackend):
+    """Null backend that keeps (time, op, args) for every primitive - for tests"""
+    
+    name = 'recording'
+    
+    def __init__(self, max_events=100000):
+        super().__init__()
+        self.events = deque(maxlen=max_events)
+    
+    def _record(self, op, *args):
+        self.events.append((time.perf_counter(), op, args))
+    
+    def _move(self, x, y):
+        super()._move(x, y)
+        self._record('move', x, y)
+    
+    def _mouse_down(self, button):
+        self._record('mouse_down', button)
+    
+    def _mouse_up(self, button):
+        self._record('mouse_up', button)
+    
+    def _key_down(self, key):
+        self._record('key_down', key)
+    
+    def _key_up(self, key):
+        self._record('key_up', key)
+
+# Key name translations from our pyautogui-style names
+PYNPUT_KEY_NAMES = {'escape': 'esc', 'return': 'enter', 'pageup': 'page_up', 'pagedown': 'page_down'}
+XTEST_KEY_NAMES = {
+    'up': 'Up', 'down': 'Down', 'left': 'Left', 'right': 'Right',
+    'shift': 'Shift_L', 'ctrl': 'Control_L', 'alt': 'Alt_L',
+    'esc': 'Escape', 'escape': 'Escape', 'enter': 'Return', 'return': 'Return',
+    'space': 'space', 'tab': 'Tab', 'backspace': 'BackSpace',
+}
+
+def xtest_keysym_name(key):
+    """X keysym name for a pyautogui-style key name ('f7' -> 'F7', 'a' -> 'a')"""
+    name = XTEST_KEY_NAMES.get(key)
+    if name is not None:
+        return name
+    if len(key) > 1 and key[0] == 'f' and key[1:].isdigit():
+        return key.upper()
+    return key
+UINPUT_KEY_NAMES = {
+    'shift': 'leftshift', 'ctrl': 'leftctrl', 'alt': 'leftalt',
+    'escape': 'esc', 'return': 'enter',
+}
+
+INPUT_BACKENDS = {
+    'pyautogui': PyAutoGUIBackend,
+    'pynput': PynputBackend,
+    'xtest': XTestBackend,
+    'uinput': UInputBackend,
+    'null': NullBackend,
+    'recording': RecordingBackend,
+}
+
+# Backends that actually reach the game, fastest-first tie-break order for 'auto'
+REAL_INPUT_BACKENDS = ('xtest', 'uinput', 'pynput', 'pyautogui')
+
+input_backend = None
+
+def create_input_backend(name):
+    """Instantiate a backend by name, raises if its library or device is unavailable"""
+    try:
+        backend_class = INPUT_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown input backend '{name}' (choose from {', '.join(INPUT_BACKENDS)})")
+    return backend_class()
+
+def measure_backend(backend, samples=200):
+    """Time cursor moves (back and forth by one pixel) and position reads"""
+    x, y = backend.position()
+    for i in range(samples):
+        backend.move(x + (i % 2), y)
+    backend.move(x, y)
+    for _ in range(samples):
+        backend.position()
+    return backend.latency_report()
+
+def close_backend(backend):
+    """Close a backend we are not going to use, ignoring errors from its device"""
+    try:
+        backend.close()
+    except Exception:
+        pass
+
+def select_fastest_backend():
+    """Probe every real backend the host supports and keep the one with the fastest moves"""
+    best = None
+    best_move = None
+    for name in REAL_INPUT_BACKENDS:
+        try:
+            candidate = create_input_backend(name)
+        except Exception:
+            continue
+        try:
+            move_us = measure_backend(candidate, samples=50)['move']['p50_us']
+        except Exception:
+            close_backend(candidate)
+            continue
+        if best is None or move_us < best_move:
+            if best is not None:
+                close_backend(best)
+            best, best_move = candidate, move_us
+        else:
+            close_backend(candidate)
+    if best is None:
+        raise RuntimeError("No usable input backend on this host")
+    return best
+
+def use_input_backend(name=None):
+    """Select the input backend for this process ('auto' picks the fastest)"""
+    global input_backend
+    name = name or INPUT_BACKEND
+    if name == 'auto':
+        input_backend = select_fastest_backend()
+    else:
+        input_backend = create_input_backend(name)
+    return input_backend
+
+def get_input_backend():
+    """The active input backend, created from INPUT_BACKEND on first use"""
+    if input_backend is None:
+        use_input_backend()
+    return input_backend
+
+class TimingProfiles:
+    """Named sets of input delays, per action, loaded from TIMING_FILE
+    
+    Built-in 'safe' (the old hard-coded values) and 'fast' profiles can be
+    overridden, and 'calibrated' is whatever the tune mode measured.
+    Lookups fall back to 'safe' for anything a profile leaves out.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.profiles = json.loads(json.dumps(TIMING_PROFILES))
+        self.active = TIMING_PROFILE
+    
+    def get(self, action, name):
+        with self.lock:
+            value = self.profiles.get(self.active, {}).get(action, {}).get(name)
+            if value is None:
+                value = self.profiles['safe'][action][name]
+            return value
+    
+    def set(self, profile, action, name, seconds):
+        with self.lock:
+            self.profiles.setdefault(profile, {}).setdefault(action, {})[name] = round(float(seconds), 4)
+    
+    def discard(self, profile, name):
+        """Drop `name` from every action of a profile, so lookups fall back to 'safe'"""
+        with self.lock:
+            for delays in self.profiles.get(profile, {}).values():
+                delays.pop(name, None)
+    
+    def use(self, name):
+        with self.lock:
+            if name not in self.profiles:
+                raise ValueError(f"Unknown timing profile '{name}' (have {', '.join(self.profiles)})")
+            self.active = name
+    
+    def load(self, path=None):
+        """Merge profiles from the timing file, returns False if there is none"""
+        path = path or TIMING_FILE
+        if not os.path.exists(path):
+            return False
+        with open(path) as f:
+            config = json.load(f)
+        with self.lock:
+            for name, actions in config.get('profiles', {}).items():
+                profile = self.profiles.setdefault(name, {})
+                for action, delays in actions.items():
+                    profile.setdefault(action, {}).update(delays)
+            if 'profile' in config and not setting_is_set('timing_profile'):
+                self.active = config['profile']
+        self.use(self.active)
+        return True
+    
+    def save(self, path=None):
+        """Write the non-built-in profiles and the active choice to the timing file"""
+        path = path or TIMING_FILE
+        with self.lock:
+            config = {'profile': self.active, 'profiles': self.profiles}
+        with open(path, 'w') as f:
+            json.dump(config, f, indent=2)
+        return path
+
+timings = TimingProfiles()
+
+def delay(action, name):
+    """Seconds to wait for `name` in `action` under the active timing profile"""
+    return timings.get(action, name)
+
+class MSSFrameSource:
+    """Screen grabs through mss (XShmGetImage on Linux, BitBlt on Windows)
+    
+    mss handles are not shareable between threads, so each thread gets its own.
+    """
+    
+    name = 'mss'
+    
+    def __init__(self):
+        import mss
+        self.mss = mss
+        self.local = threading.local()
+        self.grab_into(0, 0, np.zeros((1, 1, 3), dtype=np.uint8))  # Fail now, not mid-click
+    
+    def grab_into(self, left, top, out):
+        """Copy the screen region at (left, top) with out's shape into `out` (BGR)"""
+        screen = getattr(self.local, 'screen', None)
+        if screen is None:
+            screen = self.local.screen = self.mss.mss()
+        height, width = out.shape[:2]
+        shot = screen.grab({'left': int(left), 'top': int(top), 'width': width, 'height': height})
+        # View straight onto mss's BGRA bytes, only the copy into `out` touches pixels
+        np.copyto(out, np.frombuffer(shot.raw, dtype=np.uint8).reshape(height, width, 4)[:, :, :3])
+    
+    def screen_box(self):
+        """(left, top, width, height) of the primary monitor"""
+        screen = getattr(self.local, 'screen', None)
+        if screen is None:
+            screen = self.local.screen = self.mss.mss()
+        monitor = screen.monitors[1]
+        return monitor['left'], monitor['top'], monitor['width'], monitor['height']
+
+class SyntheticFrameSource:
+    """In-memory 'screen' for tests and benchmarks - paint on it, grab from it"""
+    
+    name = 'synthetic'
+    
+    def __init__(self, width=1920, height=1080):
+        self.canvas = np.zeros((height, width, 3), dtype=np.uint8)
+    
+    def grab_into(self, left, top, out):
+        height, width = out.shape[:2]
+        left, top = int(left), int(top)
+        out[:] = 0
+        region = self.canvas[max(0, top):top + height, max(0, left):left + width]
+        out[max(0, -top):max(0, -top) + region.shape[0], max(0, -left):max(0, -left) + region.shape[1]] = region
+    
+    def screen_box(self):
+        return 0, 0, self.canvas.shape[1], self.canvas.shape[0]
+    
+    def paint_cross(self, x, y, color=(0, 0, 255), size=6):
+        """Draw an OSRS-style click cross (BGR color, red by default)"""
+        x, y = int(x), int(y)
+        for d in range(-size, size + 1):
+            for px, py in ((x + d, y + d), (x + d, y - d)):
+                if 0 <= py < self.canvas.shape[0] and 0 <= px < self.canvas.shape[1]:
+                    self.canvas[py, px] = color
+
+class RegionCapture:
+    """Grabs small regions of interest into reusable preallocated buffers
+    
+    Buffers (and the scratch masks used to compare them) are allocated once
+    per region size and reused for every grab, so verifying a click costs
+    two small screen copies and a few in-place NumPy passes.
+    """
+    
+    def __init__(self, source):
+        self.source = source
+        self.lock = threading.Lock()
+        self.pools = {}  # (height, width) -> dict of named buffers
+    
+    def _pool(self, height, width):
+        pool = self.pools.get((height, width))
+        if pool is None:
+            pool = self.pools[(height, width)] = {
+                'before': np.zeros((height, width, 3), dtype=np.uint8),
+                'after': np.zeros((height, width, 3), dtype=np.uint8),
+                'delta': np.zeros((height, width, 3), dtype=np.uint8),
+                'low': np.zeros((height, width, 3), dtype=np.uint8),
+                'level': np.zeros((height, width), dtype=np.uint8),
+                'changed': np.zeros((height, width), dtype=bool),
+                'mask': np.zeros((height, width), dtype=bool),
+                'scratch': np.zeros((height, width), dtype=bool),
+            }
+        return pool
+    
+    def grab(self, box, slot):
+        """Grab box (left, top, width, height) into the 'before' or 'after' buffer"""
+        left, top, width, height = (int(round(v)) for v in box)
+        pool = self._pool(height, width)
+        self.source.grab_into(left, top, pool[slot])
+        return pool[slot]
+    
+    def compare(self, box):
+        """(changed fraction, new red-cross fraction, new yellow-cross fraction) between grabs"""
+        _, _, width, height = (int(round(v)) for v in box)
+        pool = self._pool(height, width)
+        before, after = pool['before'], pool['after']
+        delta, low, level = pool['delta'], pool['low'], pool['level']
+        changed, mask, scratch = pool['changed'], pool['mask'], pool['scratch']
+        pixels = changed.size
+        
+        # |after - before| per channel without leaving uint8
+        np.subtract(np.maximum(after, before, out=delta), np.minimum(after, before, out=low), out=delta)
+        np.max(delta, axis=2, out=level)
+        np.greater(level, CAPTURE_DIFF_LEVEL, out=changed)
+        changed_fraction = float(np.count_nonzero(changed)) / pixels
+        
+        blue, green, red = after[:, :, 0], after[:, :, 1], after[:, :, 2]
+        # Red click cross (walk/attack/interact): strong red, weak green and blue
+        np.greater(red, 170, out=mask)
+        np.less(green, 90, out=scratch)
+        mask &= scratch
+        np.less(blue, 90, out=scratch)
+        mask &= scratch
+        mask &= changed
+        red_fraction = float(np.count_nonzero(mask)) / pixels
+        # Yellow click cross (walk here): strong red and green, weak blue
+        np.greater(red, 170, out=mask)
+        np.greater(green, 170, out=scratch)
+        mask &= scratch
+        np.less(blue, 90, out=scratch)
+        mask &= scratch
+        mask &= changed
+        yellow_fraction = float(np.count_nonzero(mask)) / pixels
+        return changed_fraction, red_fraction, yellow_fraction
+
+capture = None
+capture_failed = False
+
+def get_capture():
+    """The shared RegionCapture, or None if screen capture isn't available here"""
+    global capture, capture_failed
+    if capture is None and not capture_failed:
+        try:
+            source = SyntheticFrameSource() if CAPTURE_SOURCE == 'synthetic' else MSSFrameSource()
+            capture = RegionCapture(source)
+        except Exception as e:
+            capture_failed = True
+            log.warning('capture', f"⚠️ Screen capture unavailable, clicks won't be verified: {e}")
+    return capture
+
+def match_template_ncc(image, template):
+    """Normalized cross-correlation of template over image via FFT ('valid' positions only)"""
+    ih, iw = image.shape
+    th, tw = template.shape
+    t = template - template.mean()
+    t_norm = float(np.sqrt((t * t).sum())) or 1.0
+    
+    # Circular correlation; the valid region never wraps around
+    spectrum = np.fft.rfft2(image) * np.conj(np.fft.rfft2(t, s=image.shape))
+    corr = np.fft.irfft2(spectrum, s=image.shape)[:ih - th + 1, :iw - tw + 1]
+    
+    # Windowed sums of the image and its square through integral images
+    def window_sums(values):
+        integral = np.zeros((ih + 1, iw + 1))
+        np.cumsum(np.cumsum(values, axis=0), axis=1, out=integral[1:, 1:])
+        return integral[th:, tw:] - integral[:-th, tw:] - integral[th:, :-tw] + integral[:-th, :-tw]
+    
+    n = th * tw
+    s1 = window_sums(image)
+    s2 = window_sums(image * image)
+    variance = np.maximum(s2 - s1 * s1 / n, 1e-6)
+    return corr / (np.sqrt(variance) * t_norm)
+
+def downscale(gray, factor):
+    """Block-mean downscale of a 2D array by an integer factor"""
+    h, w = gray.shape[0] // factor * factor, gray.shape[1] // factor * factor
+    return gray[:h, :w].reshape(h // factor, factor, w // factor, factor).mean(axis=(1, 3))
+
+class AnchorLocator:
+    """Finds fixed OSRS UI elements on screen and derives the game geometry from them
+    
+    Each anchor is a grayscale template plus where its top-left corner sits in
+    relative stream coordinates. A full search (FFT NCC over a downscaled
+    frame, then refined at full resolution) only runs when the cheap
+    signature of a cached anchor region no longer matches.
+    """
+    
+    def __init__(self, source, directory=ANCHOR_DIR):
+        self.source = source
+        self.directory = directory
+        self.anchors = {}
+        self.cached = {}  # name -> (left, top, signature)
+        self.frame = None
+        self.load()
+    
+    def load(self):
+        with open(os.path.join(self.directory, 'anchors.json')) as f:
+            config = json.load(f)
+        for name, anchor in config.items():
+            template = np.load(os.path.join(self.directory, anchor['file'])).astype(np.float32)
+            self.anchors[name] = {
+                'rel': tuple(anchor['rel']),
+                'template': template,
+                'small': downscale(template, ANCHOR_DOWNSCALE),
+            }
+        if len(self.anchors) < 2:
+            raise ValueError("Need at least 2 anchors to derive the game window")
+    
+    def _grab_gray(self, left, top, width, height):
+        buffer = np.zeros((height, width, 3), dtype=np.uint8)
+        self.source.grab_into(left, top, buffer)
+        return buffer.mean(axis=2, dtype=np.float32)
+    
+    def _screen_gray(self):
+        left, top, width, height = self.source.screen_box()
+        if self.frame is None or self.frame.shape[:2] != (height, width):
+            self.frame = np.zeros((height, width, 3), dtype=np.uint8)
+        self.source.grab_into(left, top, self.frame)
+        return left, top, self.frame.mean(axis=2, dtype=np.float32)
+    
+    def signature(self, gray):
+        """Cheap fingerprint of an anchor region: 8x8 block means"""
+        factor = max(1, min(gray.shape) // 8)
+        return downscale(gray, factor)
+    
+    def locate(self):
+        """Full search, returns {name: (left, top, score)} for anchors found on screen"""
+        screen_left, screen_top, gray = self._screen_gray()
+        small = downscale(gray, ANCHOR_DOWNSCALE)
+        found = {}
+        for name, anchor in self.anchors.items():
+            scores = match_template_ncc(small, anchor['small'])
+            y, x = np.unravel_index(int(np.argmax(scores)), scores.shape)
+            if scores[y, x] < ANCHOR_MIN_SCORE:
+                continue
+            
+            # Refine around the coarse hit at full resolution
+            template = anchor['template']
+            th, tw = template.shape
+            pad = ANCHOR_DOWNSCALE * 2
+            top = max(0, y * ANCHOR_DOWNSCALE - pad)
+            left = max(0, x * ANCHOR_DOWNSCALE - pad)
+            window = gray[top:top + th + 2 * pad, left:left + tw + 2 * pad]
+            if window.shape[0] < th or window.shape[1] < tw:
+                continue
+            fine = match_template_ncc(window, template)
+            fy, fx = np.unravel_index(int(np.argmax(fine)), fine.shape)
+            found[name] = (int(screen_left + left + fx), int(screen_top + top + fy), float(fine[fy, fx]))
+        return found
+    
+    def fit(self, found):
+        """Transform from the anchors' relative positions to where they were found
+        
+        None if two anchors don't span both axes, since the scale along the
+        missing axis can't be known.
+        """
+        names = sorted(found)
+        rel = np.array([self.anchors[name]['rel'] for name in names], dtype=np.float64)
+        screen = np.array([found[name][:2] for name in names], dtype=np.float64)
+        if len(names) >= 3:
+            return CoordinateTransform.fit(rel, screen, kind='affine', names=names)
+        # Two anchors: independent scale + offset per axis
+        span = rel[1] - rel[0]
+        if np.any(np.abs(span) < ANCHOR_MIN_SPAN):
+            return None
+        scale = (screen[1] - screen[0]) / span
+        offset = screen[0] - scale * rel[0]
+        matrix = [[scale[0], 0, offset[0]], [0, scale[1], offset[1]], [0, 0, 1]]
+        return CoordinateTransform(matrix, kind='affine')
+    
+    def unchanged(self):
+        """True if every cached anchor region still looks the same"""
+        if not self.cached:
+            return False
+        for name, (left, top, signature) in self.cached.items():
+            th, tw = self.anchors[name]['template'].shape
+            current = self.signature(self._grab_gray(left, top, tw, th))
+            if np.abs(current - signature).mean() > ANCHOR_SIGNATURE_TOLERANCE:
+                return False
+        return True
+    
+    def check(self):
+        """Re-derive the geometry if the anchors moved, returns a new transform or None"""
+        if self.unchanged():
+            return None
+        found = self.locate()
+        if len(found) < 2:
+            self.cached = {}
+            return None
+        self.cached = {}
+        for name, (left, top, _) in found.items():
+            th, tw = self.anchors[name]['template'].shape
+            self.cached[name] = (left, top, self.signature(self._grab_gray(left, top, tw, th)))
+        return self.fit(found)
+
+def start_anchor_tracking(interval=ANCHOR_CHECK_INTERVAL):
+    """Keep the coordinate transform in sync with the on-screen UI anchors"""
+    if get_capture() is None:
+        return None
+    locator = AnchorLocator(capture.source)
+    
+    def track_loop():
+        global transform
+        while True:
+            try:
+                updated = locator.check()
+            except Exception as e:
+                log.warning('anchors', f"⚠️ Anchor check failed: {e}")
+                updated = None
+            if updated is not None:
+                window = updated.game_window
+                if window != transform.game_window:
+                    log.info('anchors', f"📐 Game window re-derived from UI anchors: ({window['x']}, {window['y']}) "
+                             f"{window['width']}x{window['height']}", window=window)
+                transform = updated
+                GAME_WINDOW.update(window)
+            time.sleep(interval)
+    
+    threading.Thread(target=track_loop, name='anchor-tracker', daemon=True).start()
+    return locator
+
+def record_anchor_templates(boxes=None):
+    """Cut anchor templates out of the current screen using the current calibration"""
+    boxes = boxes or DEFAULT_ANCHOR_BOXES
+    if get_capture() is None:
+        print("❌ Screen capture unavailable")
+        return None
+    os.makedirs(ANCHOR_DIR, exist_ok=True)
+    config = {}
+    for name, (x0, y0, x1, y1) in boxes.items():
+        (left, top), (right, bottom) = transform.map_points([(x0, y0), (x1, y1)]).tolist()
+        width, height = int(round(right - left)), int(round(bottom - top))
+        buffer = np.zeros((height, width, 3), dtype=np.uint8)
+        capture.source.grab_into(left, top, buffer)
+        np.save(os.path.join(ANCHOR_DIR, f'{name}.npy'), buffer.mean(axis=2).astype(np.float32))
+        config[name] = {'rel': [x0, y0], 'file': f'{name}.npy'}
+        print(f"✅ {name}: {width}x{height} at ({left:.0f}, {top:.0f})")
+    with open(os.path.join(ANCHOR_DIR, 'anchors.json'), 'w') as f:
+        json.dump(config, f, indent=2)
+    print(f"💾 Saved {len(config)} anchors to {ANCHOR_DIR}")
+    return config
+
+class ClickVerifier:
+    """Before/after diff of the region around a click target
+    
+    'verified' means a red or yellow click cross (or, for right-clicks, a
+    context menu) showed up around the target; 'missed' means nothing did.
+    """
+    
+    def __init__(self):
+        self.box = None
+    
+    def before(self, x, y):
+        """Grab the region around (x, y) right before clicking"""
+        self.box = None
+        if not VERIFY_CLICKS or get_capture() is None:
+            return
+        half = CAPTURE_ROI_PX // 2
+        self.box = (x - half, y - half, CAPTURE_ROI_PX, CAPTURE_ROI_PX)
+        try:
+            capture.grab(self.box, 'before')
+        except Exception:
+            self.box = None
+    
+    def after(self, action):
+        """Grab again after the click and classify, returns None if nothing to verify"""
+        if self.box is None:
+            return None
+        box, self.box = self.box, None
+        try:
+            pause(VERIFY_DELAY)
+            capture.grab(box, 'after')
+            changed, red, yellow = capture.compare(box)
+        except CommandCancelled:
+            raise
+        except Exception:
+            return None
+        if red + yellow >= VERIFY_CROSS_FRACTION:
+            return 'verified'
+        if action == 'right_click' and changed >= VERIFY_MENU_FRACTION:
+            return 'verified'
+        return 'missed'
+
+verifier = ClickVerifier()
+
+class ClickPipeline:
+    """Overlaps the settle delay after a click with travel toward the next one
+    
+    A handler hands its post-click settle to settle() instead of sleeping.
+    If the next command may safely overlap it, its cursor travel starts once
+    the cursor has dwelt PIPELINE_MIN_DWELL on the target; its click still
+    waits for the full settle, so OSRS gets the same time between clicks.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = None  # (action, clicked_at, settle_until) in perf_counter time
+    
+    def settle(self, action, seconds):
+        """Record the settle owed after a click (or just pause if pipelining is off)"""
+        if not PIPELINE_ENABLED:
+            pause(seconds)
+            return
+        now = time.perf_counter()
+        with self.lock:
+            self.pending = (action, now, now + seconds)
+    
+    def _wait_until(self, deadline):
+        remaining = deadline - time.perf_counter()
+        if remaining > 0:
+            pause(remaining)
+    
+    def before_move(self, action):
+        """Called before the next command touches the mouse"""
+        with self.lock:
+            pending = self.pending
+        if pending is None:
+            return
+        previous, clicked_at, settle_until = pending
+        if action in PIPELINE_OVERLAPS.get(previous, ()):
+            self._wait_until(clicked_at + PIPELINE_MIN_DWELL.get(previous, 0.0))
+        else:
+            self.finish()
+    
+    def before_click(self):
+        """Called right before a click - the previous settle must be over"""
+        self.finish()
+    
+    def finish(self):
+        """Wait out whatever settle is still owed"""
+        with self.lock:
+            pending = self.pending
+        if pending is not None:
+            self._wait_until(pending[2])
+            with self.lock:
+                if self.pending is pending:
+                    self.pending = None
+    
+    def reset(self):
+        with self.lock:
+            self.pending = None
+
+pipeline = ClickPipeline()
 
 def execute_arrow_key(direction):
     """Execute arrow key press for camera movement - FIXED FOR OSRS"""
+    if direction not in CAMERA_VECTORS:
+        log.error('camera', f"❌ Unknown direction: {direction}")
+        return False
+    dx, dy = CAMERA_VECTORS[direction]
+    return execute_camera_move(dx, dy)
+
+def execute_camera_move(dx, dy):
+    """Rotate the camera by one middle-button drag of (dx, dy) pixels"""
     try:
-        # Ensure OSRS window is focused first
+        # Ensure OSRS window is focused first (no-op if it already is)
         focus_osrs_window()
+        mark_phase('focus')
         
-        # OSRS uses different keys for camera rotation!
-        # Arrow keys don't work in OSRS - need to use mouse for camera
-        # Let's simulate mouse drag for camera movement instead
-        
-        if direction == 'up':
-            # Mouse drag up for camera pitch
-            start_x = GAME_WINDOW['x'] + GAME_WINDOW['width'] // 2
-            start_y = GAME_WINDOW['y'] + GAME_WINDOW['height'] // 2
-            pyautogui.drag(0, -50, duration=0.3, button='middle')
-        elif direction == 'down':
-            pyautogui.drag(0, 50, duration=0.3, button='middle')
-        elif direction == 'left':
-            # Mouse drag left for camera yaw
-            pyautogui.drag(-50, 0, duration=0.3, button='middle')
-        elif direction == 'right':
-            pyautogui.drag(50, 0, duration=0.3, button='middle')
-        else:
-            print(f"❌ Unknown direction: {direction}")
-            return False
+        if CAMERA_MODE == 'keys':
+            # Held arrow keys rotate the camera without a drag
+            camera.hold_vector(dx, dy)
+        elif dx or dy:
+            # Middle-button drag: vertical drag = pitch, horizontal drag = yaw
+            get_input_backend().drag(dx, dy, duration=delay('camera', 'drag'), button='middle')
             
-        print(f"✅ Camera moved: {direction}")
+        mark_phase('move')
+        log.info('camera', f"✅ Camera moved: ({dx:+d}, {dy:+d})", dx=dx, dy=dy)
         return True
             
     except Exception as e:
-        print(f"❌ Error with camera movement {direction}: {e}")
+        log.error('camera', f"❌ Error with camera movement ({dx:+d}, {dy:+d}): {e}")
         return False
 
+class CameraController:
+    """Continuous camera control with held arrow keys
+    
+    OSRS rotates the camera for as long as an arrow key is down, so a
+    start/stop pair (or a timed hold) replaces a whole drag. Every held key
+    carries a release deadline, which a timer thread enforces, so a lost
+    camera_stop can never leave the camera spinning.
+    """
+    
+    opposite = {'up': 'down', 'down': 'up', 'left': 'right', 'right': 'left'}
+    
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.release_at = {}  # direction -> time.time() deadline
+        self.thread = None
+    
+    def _ensure_timer(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._release_loop, name='camera-timer', daemon=True)
+            self.thread.start()
+    
+    def _release_loop(self):
+        with self.cond:
+            while True:
+                if not self.release_at:
+                    self.cond.wait()
+                    continue
+                direction, deadline = min(self.release_at.items(), key=lambda item: item[1])
+                remaining = deadline - time.time()
+                if remaining > 0:
+                    self.cond.wait(remaining)
+                    continue
+                self._release(direction)
+    
+    def _release(self, direction):
+        # Caller holds self.cond
+        self.release_at.pop(direction, None)
+        get_input_backend().key_up(direction)
+    
+    def start(self, directions, duration=CAMERA_MAX_HOLD):
+        """Hold `directions` down until stop() or until `duration` runs out"""
+        mouse = get_input_backend()
+        with self.cond:
+            self._ensure_timer()
+            for direction in directions:
+                # Holding both opposites would just cancel out, the newest wins
+                if self.opposite[direction] in self.release_at:
+                    self._release(self.opposite[direction])
+                if direction not in self.release_at:
+                    mouse.key_down(direction)
+                self.release_at[direction] = time.time() + min(duration, CAMERA_MAX_HOLD)
+            self.cond.notify()
+    
+    def stop(self, directions=None):
+        """Release the given directions (all of them if None)"""
+        with self.cond:
+            for direction in list(directions or self.release_at):
+                if direction in self.release_at:
+                    self._release(direction)
+            self.cond.notify()
+    
+    def hold_vector(self, dx, dy):
+        """Turn a net drag vector into per-axis timed holds (diagonals hold two keys)"""
+        holds = {}
+        if dx:
+            holds['right' if dx > 0 else 'left'] = abs(dx) / CAMERA_STEP_PIXELS * CAMERA_KEY_SECONDS_PER_STEP
+        if dy:
+            holds['down' if dy > 0 else 'up'] = abs(dy) / CAMERA_STEP_PIXELS * CAMERA_KEY_SECONDS_PER_STEP
+        for direction, seconds in holds.items():
+            self.start([direction], seconds)
+        return holds
+    
+    def held(self):
+        with self.cond:
+            return sorted(self.release_at)
+
+camera = CameraController()
+
+def camera_directions(data):
+    """Directions from a camera command's 'direction' or 'directions' field"""
+    directions = data.get('directions')
+    if directions is None:
+        direction = data.get('direction')
+        directions = [direction] if direction else []
+    if not all(d in CAMERA_VECTORS for d in directions):
+        return None
+    return directions
+
 def execute_click(click_type, x=None, y=None):
     """Execute mouse click"""
     try:
+        mouse = get_input_backend()
         if click_type == "left-click":
             if x is not None and y is not None:
-                pyautogui.click(x, y)
-                print(f"✅ Left click at ({x}, {y})")
+                mouse.click(x, y)
+                log.info('click', f"✅ Left click at ({x}, {y})", x=x, y=y)
             else:
-                pyautogui.click()
-                print("✅ Left click at current position")
+                mouse.click()
+                log.info('click', "✅ Left click at current position")
                 
         elif click_type == "right-click":
             if x is not None and y is not None:
-                pyautogui.rightClick(x, y)
-                print(f"✅ Right click at ({x}, {y})")
+                mouse.right_click(x, y)
+                log.info('click', f"✅ Right click at ({x}, {y})", x=x, y=y)
             else:
-                pyautogui.rightClick()
-                print("✅ Right click at current position")
+                mouse.right_click()
+                log.info('click', "✅ Right click at current position")
         else:
-            print(f"❌ Unknown click type: {click_type}")
+            log.error('click', f"❌ Unknown click type: {click_type}")
             return False
             
-        time.sleep(0.1)  # Prevent spam
+        mark_phase('click')
+        pause(delay('click', 'settle'))  # Prevent spam
+        mark_phase('settle')
         return True
         
     except Exception as e:
-        print(f"❌ Error with click {click_type}: {e}")
+        log.error('click', f"❌ Error with click {click_type}: {e}")
         return False
 
 def execute_right_click(rel_x, rel_y):
     """Execute right click for context menus"""
     try:
-        abs_x = GAME_WINDOW['x'] + (rel_x * GAME_WINDOW['width']) + CLICK_OFFSET_X
-        abs_y = GAME_WINDOW['y'] + (rel_y * GAME_WINDOW['height']) + CLICK_OFFSET_Y
+        abs_x, abs_y = transform.map_point(rel_x, rel_y)
+        mouse = get_input_backend()
+        
+        if focus_osrs_window():
+            pause(delay('focus', 'settle'))
+        mark_phase('focus')
+        
+        # Move mouse first, then right click
+        mouse.glide(abs_x, abs_y, duration=delay('right_click', 'travel'))
+        pause(delay('right_click', 'hover'))
+        mark_phase('move')
+        
+        pipeline.before_click()
+        verifier.before(abs_x, abs_y)
+        mouse.right_click(abs_x, abs_y)
+        mark_phase('click')
+        log.info('right_click', f"✅ Right click at ({abs_x:.0f}, {abs_y:.0f}) - rel: {rel_x:.3f}, {rel_y:.3f}",
+                 x=abs_x, y=abs_y)
+        
+        started = time.perf_counter()
+        set_job_result(verification=verifier.after('right_click'))
+        pipeline.settle('right_click', delay('right_click', 'settle') - (time.perf_counter() - started))
+        mark_phase('settle')
+        return True
+        
+    except Exception as e:
+        log.error('right_click', f"❌ Error with right click: {e}")
+        return False
+
+def execute_direct_click(rel_x, rel_y):
+    """Execute direct click on game window at exact coordinates"""
+    try:
+        # Convert relative coordinates (0-1) to absolute screen coordinates
+        abs_x, abs_y = transform.map_point(rel_x, rel_y)
+        mouse = get_input_backend()
+        
+        # CRITICAL: Ensure OSRS window is focused and active
+        if focus_osrs_window():
+            pause(delay('focus', 'settle'))  # Give focus time to take effect
+        mark_phase('focus')
+        
+        # Move mouse to position first (helps with object detection)
+        mouse.glide(abs_x, abs_y, duration=delay('direct_click', 'travel'))
+        pause(delay('direct_click', 'hover'))  # Brief pause for OSRS to detect mouse hover
+        mark_phase('move')
+        
+        # Execute the click with proper timing for object interaction
+        pipeline.before_click()
+        verifier.before(abs_x, abs_y)
+        mouse.click(abs_x, abs_y)
+        mark_phase('click')
+        log.info('direct_click', f"✅ Direct click at ({abs_x:.0f}, {abs_y:.0f}) - rel: {rel_x:.3f}, {rel_y:.3f}",
+                 x=abs_x, y=abs_y)
+        
+        # Look for the click cross inside the settle window, it costs no extra time
+        started = time.perf_counter()
+        set_job_result(verification=verifier.after('direct_click'))
+        
+        # Longer delay for OSRS object recognition - overlaps the next move when pipelined
+        pipeline.settle('direct_click', delay('direct_click', 'settle') - (time.perf_counter() - started))
+        mark_phase('settle')
+        return True
+        
+    except Exception as e:
+        log.error('direct_click', f"❌ Error with direct click: {e}")
+        return False
+
+def validate_batch_points(points):
+    """Batch click points as (x, y) floats, raises ValueError if they are invalid"""
+    if not isinstance(points, list) or not points:
+        raise ValueError("Batch click needs a non-empty point list")
+    if len(points) > BATCH_CLICK_MAX_POINTS:
+        raise ValueError(f"Batch click has {len(points)} points, limit is {BATCH_CLICK_MAX_POINTS}")
+    valid = []
+    for point in points:
+        if not (isinstance(point, (list, tuple)) and len(point) == 2
+                and all(isinstance(v, (int, float)) and 0 <= v <= 1 for v in point)):
+            raise ValueError(f"Invalid batch click point: {point!r}")
+        valid.append((float(point[0]), float(point[1])))
+    return valid
+
+def execute_batch_click(points):
+    """Click a list of relative points back to back, mapped in one step"""
+    try:
+        screen_points = transform.map_points(points)
+        mouse = get_input_backend()
+        
+        if focus_osrs_window():
+            pause(delay('focus', 'settle'))
+        mark_phase('focus')
+        
+        for abs_x, abs_y in screen_points.tolist():
+            mouse.glide(abs_x, abs_y, duration=delay('direct_click', 'travel'))
+            pause(delay('direct_click', 'hover'))
+            pipeline.before_click()  # The first glide may have overlapped the last settle
+            mouse.click(abs_x, abs_y)
+            pause(delay('direct_click', 'settle'))
+        mark_phase('settle')
+        
+        log.info('batch_click', f"✅ Batch click of {len(screen_points)} points", points=len(screen_points))
+        return True
+        
+    except Exception as e:
+        log.error('batch_click', f"❌ Error with batch click: {e}")
+        return False
+
+class Macro:
+    """A validated step list with every click point already mapped to screen pixels"""
+    
+    def __init__(self, macro_id, name, steps):
+        self.id = macro_id
+        self.name = name
+        self.steps = steps
+        self.transform = None
+        self.screen_points = None
+        self.map()
+    
+    def map(self):
+        """(Re)map all click points in one pass with the current transform"""
+        points = [(step['x'], step['y']) for step in self.steps if 'x' in step]
+        self.screen_points = transform.map_points(points).tolist() if points else []
+        self.transform = transform
+
+def validate_macro_step(step):
+    """Normalized copy of one macro step, raises ValueError if it is invalid"""
+    if not isinstance(step, dict):
+        raise ValueError(f"Macro step must be an object: {step!r}")
+    kind = step.get('type')
+    if kind in ('click', 'right_click'):
+        x, y = step.get('x'), step.get('y')
+        if not all(isinstance(v, (int, float)) and 0 <= v <= 1 for v in (x, y)):
+            raise ValueError(f"Invalid {kind} coordinates: {step}")
+        return {'type': kind, 'x': float(x), 'y': float(y)}
+    if kind in ('key', 'key_down', 'key_up'):
+        key = step.get('key')
+        if key not in MACRO_KEYS:
+            raise ValueError(f"Key not allowed in macros: {key}")
+        return {'type': kind, 'key': key}
+    if kind == 'wait':
+        seconds = step.get('seconds')
+        if not isinstance(seconds, (int, float)) or not 0 <= seconds <= MACRO_MAX_WAIT:
+            raise ValueError(f"Invalid wait: {seconds}")
+        return {'type': 'wait', 'seconds': float(seconds)}
+    if kind == 'camera':
+        direction = step.get('direction')
+        if direction not in CAMERA_VECTORS:
+            raise ValueError(f"Invalid camera direction: {direction}")
+        return {'type': 'camera', 'direction': direction}
+    raise ValueError(f"Unknown macro step type: {kind}")
+
+class MacroCache:
+    """LRU of compiled macros keyed by a hash of their steps
+    
+    Defining the same steps twice yields the same id, so clients can
+    define once and keep sending run_macro with that id.
+    """
+    
+    def __init__(self, size=MACRO_CACHE_SIZE):
+        self.size = size
+        self.macros = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def define(self, data):
+        """Validate and cache a macro definition, returns the Macro"""
+        steps = data.get('steps')
+        if not isinstance(steps, list) or not steps:
+            raise ValueError("Macro needs a non-empty step list")
+        if len(steps) > MACRO_MAX_STEPS:
+            raise ValueError(f"Macro has {len(steps)} steps, limit is {MACRO_MAX_STEPS}")
+        steps = [validate_macro_step(step) for step in steps]
+        if sum(step.get('seconds', 0) for step in steps) > MACRO_MAX_WAIT:
+            raise ValueError(f"Macro waits longer than {MACRO_MAX_WAIT}s in total")
+        
+        digest = hashlib.sha1(json.dumps(steps, sort_keys=True, separators=(',', ':')).encode())
+        macro_id = digest.hexdigest()[:16]
+        with self.lock:
+            macro = self.macros.get(macro_id)
+            if macro is None:
+                macro = self.macros[macro_id] = Macro(macro_id, data.get('name') or macro_id, steps)
+            self.macros.move_to_end(macro_id)
+            while len(self.macros) > self.size:
+                self.macros.popitem(last=False)
+        return macro
+    
+    def get(self, macro_id):
+        with self.lock:
+            macro = self.macros.get(macro_id)
+            if macro is not None:
+                self.macros.move_to_end(macro_id)
+            return macro
+
+macros = MacroCache()
+
+def execute_macro(macro):
+    """Run a cached macro back to back: one focus check, no per-step round trips"""
+    mouse = get_input_backend()
+    if macro.transform is not transform:
+        macro.map()  # Calibration changed since it was defined
+    
+    if focus_osrs_window():
+        pause(delay('focus', 'settle'))
+    mark_phase('focus')
+    
+    held = []
+    points = iter(macro.screen_points)
+    try:
+        for step in macro.steps:
+            kind = step['type']
+            if kind in ('click', 'right_click'):
+                abs_x, abs_y = next(points)
+                mouse.glide(abs_x, abs_y, duration=delay('direct_click', 'travel'))
+                pause(delay('direct_click', 'hover'))
+                if kind == 'click':
+                    mouse.click(abs_x, abs_y)
+                else:
+                    mouse.right_click(abs_x, abs_y)
+                pause(delay('direct_click', 'settle'))
+            elif kind == 'key':
+                mouse.hold_key(step['key'], MACRO_KEY_TAP)
+            elif kind == 'key_down':
+                mouse.key_down(step['key'])
+                held.append(step['key'])
+            elif kind == 'key_up':
+                mouse.key_up(step['key'])
+                if step['key'] in held:
+                    held.remove(step['key'])
+            elif kind == 'wait':
+                pause(step['seconds'])
+            elif kind == 'camera':
+                dx, dy = CAMERA_VECTORS[step['direction']]
+                mouse.drag(dx, dy, duration=delay('camera', 'drag'), button='middle')
+    finally:
+        # Never leave shift (or anything else) held after a macro
+        for key in held:
+            mouse.key_up(key)
+    mark_phase('settle')
+    
+    set_job_result(macroId=macro.id, steps=len(macro.steps))
+    log.info('macro', f"✅ Macro '{macro.name}' ran {len(macro.steps)} steps", macro=macro.id)
+    return True
+
+def consensus_point(points, cell=CLICK_CLUSTER_CELL):
+    """Densest cluster of relative click points, returns (centroid, member mask)
+    
+    Points are binned on a grid; each occupied cell scores the clicks in
+    its 3x3 neighbourhood and the best cell's neighbourhood is the cluster.
+    Ties go to the cell holding the earliest click.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    cells = np.floor(points / cell).astype(np.int64)
+    occupied, first_index, inverse, counts = np.unique(
+        cells, axis=0, return_index=True, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    
+    # Neighbourhood density of every occupied cell against every other
+    near = np.all(np.abs(occupied[:, None, :] - occupied[None, :, :]) <= 1, axis=2)
+    density = near @ counts
+    best = max(range(len(occupied)), key=lambda i: (density[i], -first_index[i]))
+    
+    members = near[best][inverse]
+    return points[members].mean(axis=0), members
+
+@sio.event
+def connect():
+    """Called when connected to server"""
+    log.info('connect', "🎮 Connected to cow714 OSRS controller!")
+    log.info('connect', f"📡 Server: {sio.connection_url}")
+    
+    connection.on_connect()
+    
+    # Register as PC client, telling the server which commands we already have
+    in_flight, completed = dedup.resume_ids()
+    sio.emit('register_pc', {
+        'instance': CLIENT_INSTANCE,
+        'credits': flow.register(),
+        'resume': {'inFlight': in_flight, 'completed': completed},
+        **acks.offer(),
+    })
+
+@sio.event  
+def disconnect():
+    """Called when disconnected from server"""
+    log.warning('disconnect', "❌ Disconnected from server - input keeps running, acks are held")
+
+@sio.on('pc_registered')
+def on_registered(data):
+    """Called when PC registration is confirmed"""
+    log.info('registered', f"✅ PC client registered successfully! (acks: {acks.negotiate(data)}"
+                           f"{', batched' if acks.batch else ''})")
+    log.info('registered', "🎯 Ready to receive commands from viewers...")
+    report_state('stopped' if emergency.latched else 'running')
+
+@sio.on('set_log_level')
+def on_set_log_level(data):
+    """Server-side verbosity switch, e.g. {'level': 'debug'}"""
+    level = (data or {}).get('level')
+    if level in LOG_LEVELS:
+        log.set_level(level)
+        log.warning('log_level', f"🔊 Log level set to {level}", level=level)
+
+@sio.on('define_macro')
+def on_define_macro(data):
+    """Server-only macro definition, answered with macro_defined"""
+    data = data or {}
+    try:
+        macro = macros.define(data)
+    except ValueError as e:
+        log.warning('macro', f"📜 Rejected macro '{data.get('name')}': {e}")
+        sio.emit('macro_defined', {'status': 'error', 'name': data.get('name'), 'error': str(e)})
+        return
+    log.info('macro', f"📜 Macro '{macro.name}' defined: {len(macro.steps)} steps, id {macro.id}")
+    sio.emit('macro_defined', {'status': 'success', 'name': macro.name, 'macroId': macro.id,
+                               'steps': len(macro.steps)})
+
+def dispatch_command(command_data):
+    """Run the input work for a single command, returns (success, error_msg)"""
+    action = command_data.get('action')
+    data = command_data.get('data', {})
+    
+    success = False
+    error_msg = None
+    
+    if action == 'key_press':
+        # Handle arrow key presses
+        key = data.get('key')
+        if key in ['up', 'down', 'left', 'right']:
+            success = execute_arrow_key(key)
+        else:
+            error_msg = f"Unknown key: {key}"
+            
+    elif action == 'action':
+        # Handle click actions
+        action_type = data.get('type')
+        if action_type in ['left-click', 'right-click']:
+            success = execute_click(action_type)
+        else:
+            error_msg = f"Unknown action type: {action_type}"
+            
+    elif action == 'right_click':
+        # Handle right clicks for context menus
+        x = data.get('x')
+        y = data.get('y')
+        if x is not None and y is not None:
+            success = execute_right_click(x, y)
+        else:
+            error_msg = "Invalid right click coordinates"
+            
+    elif action == 'direct_click':
+        # Handle direct clicks on the stream (exact coordinates)
+        x = data.get('x')
+        y = data.get('y')
+        if x is not None and y is not None:
+            success = execute_direct_click(x, y)
+        else:
+            error_msg = "Invalid direct click coordinates"
+            
+    elif action == 'stream_click':
+        # Handle clicks on stream overlay (legacy support)
+        zone = data.get('zone')
+        x = data.get('x')
+        y = data.get('y')
+        if zone and x is not None and y is not None:
+            success = execute_direct_click(x, y)  # Use same function now
+        else:
+            error_msg = "Invalid stream click data"
+            
+    elif action in ('camera_start', 'camera_stop', 'camera_hold'):
+        # Continuous camera: arrow keys held down until stopped or timed out
+        directions = camera_directions(data)
+        if directions is None:
+            error_msg = f"Invalid camera directions: {data}"
+        elif action == 'camera_start':
+            # Held keys go to whatever has focus, make sure that is the game
+            if focus_osrs_window():
+                pause(delay('focus', 'settle'))
+            mark_phase('focus')
+            camera.start(directions)
+            success = True
+        elif action == 'camera_stop':
+            camera.stop(directions or None)
+            success = True
+        else:
+            duration = data.get('duration')
+            if isinstance(duration, (int, float)) and 0 < duration <= CAMERA_MAX_HOLD:
+                if focus_osrs_window():
+                    pause(delay('focus', 'settle'))
+                mark_phase('focus')
+                camera.start(directions, duration)
+                success = True
+            else:
+                error_msg = f"Invalid camera hold duration: {duration}"
+            
+    elif action == 'emergency_stop':
+        # Already handled on receipt (flush, cancel, release) - just ack it
+        success = True
+            
+    elif action == 'run_macro':
+        # Multi-step sequence the server defined earlier (define_macro event)
+        macro = macros.get(data.get('id'))
+        if macro is not None:
+            success = execute_macro(macro)
+        else:
+            error_msg = f"Unknown macro: {data.get('id')} (define it first)"
+            
+    elif action == 'batch_click':
+        # Several stream points in one command, e.g. dropping a row of items
+        try:
+            success = execute_batch_click(validate_batch_points(data.get('points')))
+        except ValueError as e:
+            error_msg = str(e)
+            
+    else:
+        error_msg = f"Unknown command action: {action}"
+    
+    if not success and error_msg is None:
+        error_msg = f"{action} failed"
+    return success, error_msg
+
+class ClockSync:
+    """Estimates the server clock offset from ping/pong round trips
+    
+    Uses the sample with the smallest round trip out of the recent ones,
+    since that is the one least distorted by queueing on the link.
+    """
+    
+    def __init__(self, samples=16):
+        self.lock = threading.Lock()
+        self.samples = deque(maxlen=samples)  # (rtt, offset) in seconds
+        self.ping_sent = None
+        self.last_pong = None
+        self.confirmed_until = 0.0  # Everything we sent before this reached the server
+        self.thread = None
+    
+    def send_ping(self):
+        with self.lock:
+            # Keep the oldest unanswered ping, so a lost pong doesn't hide a dead link
+            self.ping_sent = self.ping_sent or time.time()
+        sio.emit('ping')
+    
+    def reset(self):
+        """Forget pending pings (new connection)"""
+        with self.lock:
+            self.ping_sent = None
+            self.last_pong = time.time()
+    
+    def silent_for(self):
+        """Seconds an unanswered ping has been waiting (0 if none)"""
+        with self.lock:
+            return time.time() - self.ping_sent if self.ping_sent else 0.0
+    
+    def on_pong(self, server_ms):
+        now = time.time()
+        with self.lock:
+            self.last_pong = now
+            sent, self.ping_sent = self.ping_sent, None
+            if sent is None:
+                return
+            self.confirmed_until = sent
+            rtt = now - sent
+            self.samples.append((rtt, server_ms / 1000.0 - (sent + now) / 2))
+    
+    def offset(self):
+        """Seconds to add to local time to get server time (0 until measured)"""
+        with self.lock:
+            if not self.samples:
+                return 0.0
+            return min(self.samples)[1]
+    
+    def synced(self):
+        """True once at least one round trip has measured the offset"""
+        with self.lock:
+            return bool(self.samples)
+    
+    def rtt(self):
+        """Most recent round trip in seconds, or None"""
+        with self.lock:
+            return self.samples[-1][0] if self.samples else None
+    
+    def to_local(self, server_seconds):
+        """Convert a server timestamp (seconds) to the local clock"""
+        return server_seconds - self.offset()
+    
+    def start(self, interval=CLOCK_SYNC_INTERVAL):
+        """Ping the server every `interval` seconds while connected"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        
+        def ping_loop():
+            while True:
+                if sio.connected:
+                    try:
+                        self.send_ping()
+                    except Exception:
+                        pass  # Reconnect will sort it out
+                time.sleep(interval)
+        
+        self.thread = threading.Thread(target=ping_loop, name='clock-sync', daemon=True)
+        self.thread.start()
+
+clock = ClockSync()
+
+@sio.on('pong')
+def on_pong(data):
+    """Server's reply to our ping, carries its Date.now()"""
+    server_ms = (data or {}).get('timestamp')
+    if isinstance(server_ms, (int, float)):
+        clock.on_pong(server_ms)
+
+# Phases a command goes through, in order; 'enqueue' is the server's timestamp
+COMMAND_PHASES = ('enqueue', 'receive', 'dequeue', 'focus', 'move', 'click', 'settle', 'ack')
+
+class CommandJob:
+    """A command from the server plus the wall-clock time of each phase it reached"""
+    
+    def __init__(self, command_data):
+        self.command = command_data
+        self.id = command_data.get('id')  # Assigned by server.js, used for dedup
+        self.action = command_data.get('action') or 'unknown'
+        self.lane = ACTION_LANES.get(self.action, 'other')
+        self.result = {}  # Extra fields for the completion ack
+        self.deadline = ACTION_DEADLINES.get(self.action)
+        self.group = None        # Lead job when this one was merged/voted into another
+        self.credited = command_data.get('credit') is not False  # Click burst followers ride on the lead's credit
+        self.journal_row = None  # Row in the journal once it has one
+        self.marks = {}
+        server_ts = command_data.get('timestamp')
+        if isinstance(server_ts, (int, float)) and clock.synced():
+            # server.js uses Date.now(), shift it onto our clock; until a pong
+            # has measured the skew the age counts from receipt instead
+            enqueued = clock.to_local(server_ts / 1000.0)
+        else:
+            enqueued = None
+        self.mark('receive')
+        if enqueued is not None:
+            # Offset estimation error must not date it after we received it
+            self.marks['enqueue'] = min(enqueued, self.marks['receive'])
+    
+    def mark(self, phase):
+        self.marks[phase] = time.time()
+    
+    def age(self):
+        """Seconds since the server queued this command (since receipt if unknown)"""
+        return time.time() - self.marks.get('enqueue', self.marks['receive'])
+    
+    def expired(self):
+        return self.deadline is not None and self.age() > self.deadline
+    
+    def durations(self):
+        """Seconds spent reaching each phase from the previous phase that happened"""
+        durations = {}
+        previous = None
+        for phase in COMMAND_PHASES:
+            at = self.marks.get(phase)
+            if at is None:
+                continue
+            if previous is not None:
+                durations[phase] = at - previous
+            previous = at
+        
+        ack = self.marks.get('ack')
+        if ack is not None:
+            durations['client_total'] = ack - self.marks['receive']
+            if 'enqueue' in self.marks:
+                durations['end_to_end'] = ack - self.marks['enqueue']
+        return durations
+
+_worker_state = threading.local()
+
+def set_job_result(**fields):
+    """Attach extra fields to the current command's ack (None values are skipped)"""
+    job = getattr(_worker_state, 'job', None)
+    if job is not None:
+        job.result.update({key: value for key, value in fields.items() if value is not None})
+
+def mark_phase(phase):
+    """Timestamp a phase on the command the current thread is executing (if any)"""
+    job = getattr(_worker_state, 'job', None)
+    if job is not None:
+        job.mark(phase)
+
+class MetricsRegistry:
+    """Rolling per-action, per-phase latency windows plus status counters"""
+    
+    quantiles = (50, 95, 99)
+    
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.phases = {}    # (action, phase) -> deque of seconds
+        self.counters = {}  # (action, status) -> count
+        self.gauges = {}    # name -> zero-arg callable
+    
+    def observe(self, job):
+        """Fold a finished job's phase durations into the rolling windows"""
+        durations = job.durations()
+        with self.lock:
+            for phase, seconds in durations.items():
+                samples = self.phases.get((job.action, phase))
+                if samples is None:
+                    samples = self.phases[(job.action, phase)] = deque(maxlen=self.window)
+                samples.append(seconds)
+    
+    def count(self, action, status):
+        with self.lock:
+            key = (action or 'unknown', status)
+            self.counters[key] = self.counters.get(key, 0) + 1
+    
+    def add_gauge(self, name, read):
+        self.gauges[name] = read
+    
+    def _snapshot(self):
+        with self.lock:
+            phases = {key: np.array(samples) for key, samples in self.phases.items() if samples}
+            counters = dict(self.counters)
+        return phases, counters
+    
+    def _gauge_values(self):
+        values = {}
+        for name, read in self.gauges.items():
+            try:
+                values[name] = float(read())
+            except Exception:
+                continue
+        return values
+    
+    def summary(self):
+        """JSON-friendly summary: p50/p95/p99 in milliseconds per action and phase"""
+        phases, counters = self._snapshot()
+        actions = {}
+        for (action, phase), values in phases.items():
+            p50, p95, p99 = np.percentile(values, self.quantiles) * 1000.0
+            actions.setdefault(action, {})[phase] = {
+                'count': int(len(values)),
+                'p50_ms': round(float(p50), 2),
+                'p95_ms': round(float(p95), 2),
+                'p99_ms': round(float(p99), 2),
+            }
+        
+        statuses = {}
+        for (action, status), value in counters.items():
+            statuses.setdefault(action, {})[status] = value
+        
+        summary = {
+            'timestamp': time.time(),
+            'actions': actions,
+            'statuses': statuses,
+            'gauges': self._gauge_values(),
+        }
+        if input_backend is not None:
+            summary['input_backend'] = {'name': input_backend.name, 'latency': input_backend.latency_report()}
+        return summary
+    
+    def prometheus(self):
+        """Prometheus text exposition of the same data"""
+        phases, counters = self._snapshot()
+        lines = [
+            '# HELP osrs_command_phase_seconds Time spent reaching each command phase',
+            '# TYPE osrs_command_phase_seconds summary',
+        ]
+        for (action, phase), values in sorted(phases.items()):
+            labels = f'action="{action}",phase="{phase}"'
+            for q, value in zip(self.quantiles, np.percentile(values, self.quantiles)):
+                lines.append(f'osrs_command_phase_seconds{{{labels},quantile="{q / 100}"}} {value:.6f}')
+            lines.append(f'osrs_command_phase_seconds_sum{{{labels}}} {values.sum():.6f}')
+            lines.append(f'osrs_command_phase_seconds_count{{{labels}}} {len(values)}')
+        
+        lines.append('# HELP osrs_commands_total Commands by action and final status')
+        lines.append('# TYPE osrs_commands_total counter')
+        for (action, status), value in sorted(counters.items()):
+            lines.append(f'osrs_commands_total{{action="{action}",status="{status}"}} {value}')
+        
+        for name, value in sorted(self._gauge_values().items()):
+            lines.append(f'# TYPE osrs_{name} gauge')
+            lines.append(f'osrs_{name} {value}')
+        
+        if input_backend is not None:
+            lines.append('# TYPE osrs_input_op_p50_seconds gauge')
+            for op, stats in sorted(input_backend.latency_report().items()):
+                lines.append(f'osrs_input_op_p50_seconds{{backend="{input_backend.name}",op="{op}"}} '
+                             f'{stats["p50_us"] / 1e6:.9f}')
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves /metrics in Prometheus text format"""
+    
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = metrics.prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass  # Keep scrapes out of the console
+
+def start_metrics_server(port=METRICS_PORT):
+    """Serve Prometheus metrics on localhost, returns the server (or None if disabled)"""
+    if not port:
+        return None
+    server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+def start_metrics_reporter(interval=METRICS_INTERVAL):
+    """Periodically push the metrics summary to the server as client_metrics"""
+    def report_loop():
+        while True:
+            time.sleep(interval)
+            if not sio.connected:
+                continue
+            try:
+                sio.emit('client_metrics', metrics.summary())
+            except Exception:
+                pass  # Next tick will try again
+    
+    thread = threading.Thread(target=report_loop, name='metrics-reporter', daemon=True)
+    thread.start()
+    return thread
+
+class CommandDedup:
+    """Bounded LRU of recently seen command ids and their final acks
+    
+    A command id seen again within the window is not executed twice: if
+    it already finished its cached command_completed payload is replayed,
+    otherwise it is still in flight and only acknowledged.
+    """
+    
+    PENDING = object()
+    
+    def __init__(self, size=DEDUP_CACHE_SIZE, window=DEDUP_WINDOW):
+        self.size = size
+        self.window = window
+        self.entries = OrderedDict()  # id -> (first seen, payload or PENDING)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def _evict(self, now):
+        while self.entries:
+            command_id, (seen, _) = next(iter(self.entries.items()))
+            if len(self.entries) <= self.size and now - seen <= self.window:
+                break
+            del self.entries[command_id]
+    
+    def check(self, command_id):
+        """None for a new id (now marked pending), else PENDING or the cached payload"""
+        now = time.time()
+        with self.lock:
+            self._evict(now)
+            entry = self.entries.get(command_id)
+            if entry is None:
+                self.misses += 1
+                self.entries[command_id] = (now, self.PENDING)
+                self._evict(now)  # Stay within size counting the new id
+                return None
+            self.hits += 1
+            self.entries.move_to_end(command_id)
+            return entry[1]
+    
+    def resume_ids(self, completed_limit=RESUME_COMPLETED_IDS):
+        """(in-flight ids, recently completed ids) to offer the server on re-register"""
+        with self.lock:
+            in_flight = [command_id for command_id, (_, payload) in self.entries.items()
+                         if payload is self.PENDING]
+            completed = [command_id for command_id, (_, payload) in self.entries.items()
+                         if payload is not self.PENDING]
+        return in_flight, completed[-completed_limit:]
+    
+    def complete(self, command_id, payload):
+        """Remember the final ack for a command id"""
+        with self.lock:
+            seen = self.entries.get(command_id, (time.time(), None))[0]
+            self.entries[command_id] = (seen, payload)
+    
+    def __len__(self):
+        return len(self.entries)
+
+dedup = CommandDedup()
+metrics.add_gauge('dedup_hits', lambda: dedup.hits)
+metrics.add_gauge('dedup_misses', lambda: dedup.misses)
+metrics.add_gauge('dedup_entries', lambda: len(dedup))
+
+class CreditFlow:
+    """Execution credits that let the server dispatch as fast as we can work
+    
+    The server only sends a command while it holds a credit. We keep the
+    credits it holds plus the commands we are working on at about
+    CREDIT_BACKLOG_SECONDS of work, sized from the measured execution time,
+    and hand credits back with each command_completed. Commands the server
+    sent without spending a credit (credit: false) are not counted.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.exec_time = CREDIT_INITIAL_EXEC_TIME  # EWMA, seconds per command
+        self.granted = 0    # Credits given to the server since registering
+        self.received = 0   # Commands the server sent since registering
+        self.outstanding = 0  # Received commands not acked yet
+    
+    def budget(self):
+        """Credits + in-flight commands worth CREDIT_BACKLOG_SECONDS of work"""
+        wanted = int(np.ceil(CREDIT_BACKLOG_SECONDS / max(self.exec_time, 1e-3)))
+        return max(CREDIT_MIN, min(CREDIT_MAX, wanted))
+    
+    def _grant(self):
+        held = self.granted - self.received
+        grant = max(0, self.budget() - held - self.outstanding)
+        self.granted += grant
+        return grant
+    
+    def register(self):
+        """Start a fresh credit account with the server, returns the initial credits"""
+        with self.lock:
+            self.granted = self.received = 0
+            return self._grant()
+    
+    def on_receive(self, job=None):
+        if job is not None and not job.credited:
+            return
+        with self.lock:
+            self.received += 1
+            self.outstanding += 1
+    
+    def on_finish(self, job=None):
+        """A received command was answered, returns the credits to hand back"""
+        with self.lock:
+            if job is None or job.credited:
+                self.outstanding = max(0, self.outstanding - 1)
+            if job is not None and job.credited and 'dequeue' in job.marks and 'ack' in job.marks:
+                sample = job.marks['ack'] - job.marks['dequeue']
+                self.exec_time += CREDIT_EWMA_ALPHA * (sample - self.exec_time)
+            return self._grant()
+    
+    def held(self):
+        return self.granted - self.received
+
+flow = CreditFlow()
+metrics.add_gauge('credit_budget', flow.budget)
+metrics.add_gauge('credits_held_by_server', flow.held)
+
+JOURNAL_MAGIC = b'OSRSJNL2'
+JOURNAL_NONE = 0xFFFFFFFF  # String id for "no string"
+JOURNAL_RECORD = np.dtype([
+    ('received', '<f8'),   # Wall-clock receipt time
+    ('id', '<u4'),         # Everything below marked u4 is a string table id
+    ('user', '<u4'),
+    ('action', '<u4'),
+    ('status', '<u4'),
+    ('error', '<u4'),
+    ('data', '<u4'),       # JSON of the command data without x/y
+    ('x', '<f4'),          # NaN when the command has no point
+    ('y', '<f4'),
+    ('server_ts', '<f8'),  # server.js Date.now() (ms), NaN if absent
+    ('phases', '<f4', (len(COMMAND_PHASES),)),  # Seconds after receipt, NaN if not reached
+    ('group', '<u4'),      # Row of the command it was merged/voted into, or JOURNAL_NONE
+    ('result', '<u4'),     # JSON of the extra ack fields (netMove, consensus, ...)
+])
+
+class Journal:
+    """Append-only binary log of every command, its phase timings and result
+    
+    `<path>` holds fixed-size JOURNAL_RECORD rows after an 8-byte magic;
+    `<path>.str` is the interned string table, one JSON string per line
+    (line number = id). A command gets its row with status 'received' as
+    soon as it arrives, and the row is rewritten in place with the result,
+    so whatever was running when the client died is still on disk. The hot
+    path only drops a tuple on a queue; a background thread does the
+    packing and writing.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.pending = queue.SimpleQueue()
+        self.strings = {}
+        self.written = 0
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Reopening an existing journal picks up its string table
+        if os.path.exists(path + '.str'):
+            with open(path + '.str') as f:
+                for line in f:
+                    self.strings[json.loads(line)] = len(self.strings)
+        self.records = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+        if self.records.read(len(JOURNAL_MAGIC)) not in (b'', JOURNAL_MAGIC):
+            raise ValueError(f"{path} is not a command journal of this version")
+        size = self.records.seek(0, os.SEEK_END)
+        if size == 0:
+            self.records.write(JOURNAL_MAGIC)
+            size = len(JOURNAL_MAGIC)
+        self.rows = (size - len(JOURNAL_MAGIC)) // JOURNAL_RECORD.itemsize  # A torn last row is overwritten
+        self.string_file = open(path + '.str', 'a')
+        self.thread = threading.Thread(target=self._run, name='journal-writer', daemon=True)
+        self.thread.start()
+    
+    def _queue(self, job, status, error=None, result=None):
+        with self.lock:
+            # Rows are handed out and queued under one lock, so they hit the file in order
+            if job.journal_row is None:
+                job.journal_row = self.rows
+                self.rows += 1
+            group = job.group.journal_row if job.group is not None else None
+            self.pending.put((job.journal_row, job.command, dict(job.marks), status, error, group, result))
+    
+    def received(self, job):
+        """Queue a command's row as soon as it arrives"""
+        self._queue(job, 'received')
+    
+    def record(self, job, status, error=None, result=None):
+        """Queue the final state of a command's row (cheap, called on the hot path)"""
+        self._queue(job, status, error, result)
+    
+    def _intern(self, text):
+        if text is None:
+            return JOURNAL_NONE
+        string_id = self.strings.get(text)
+        if string_id is None:
+            string_id = self.strings[text] = len(self.strings)
+            self.string_file.write(json.dumps(text) + '\n')
+        return string_id
+    
+    def _pack(self, command, marks, status, error, group, result):
+        data = dict(command.get('data') or {})
+        x, y = data.pop('x', None), data.pop('y', None)
+        received = marks['receive']
+        server_ts = command.get('timestamp')
+        row = np.zeros((), dtype=JOURNAL_RECORD)
+        row['received'] = received
+        row['id'] = self._intern(command.get('id'))
+        row['user'] = self._intern(command.get('userId'))
+        row['action'] = self._intern(command.get('action'))
+        row['status'] = self._intern(status)
+        row['error'] = self._intern(error)
+        row['data'] = self._intern(json.dumps(data, sort_keys=True, separators=(',', ':')))
+        row['x'] = x if isinstance(x, (int, float)) else np.nan
+        row['y'] = y if isinstance(y, (int, float)) else np.nan
+        row['server_ts'] = server_ts if isinstance(server_ts, (int, float)) else np.nan
+        row['phases'] = [marks[phase] - received if phase in marks else np.nan for phase in COMMAND_PHASES]
+        row['group'] = JOURNAL_NONE if group is None else group
+        row['result'] = self._intern(json.dumps(result, sort_keys=True, separators=(',', ':'), default=str)
+                                     if result else None)
+        return row.tobytes()
+    
+    def _run(self):
+        while True:
+            batch = [self.pending.get()]
+            while len(batch) < 256:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                rows = [(entry[0], self._pack(*entry[1:])) for entry in batch]
+                # Strings first, so a record never refers to an id that isn't on disk
+                self.string_file.flush()
+                for index, row in rows:
+                    self.records.seek(len(JOURNAL_MAGIC) + index * JOURNAL_RECORD.itemsize)
+                    self.records.write(row)
+                self.records.flush()
+                self.written += len(batch)
+            except Exception as e:
+                log.warning('journal', f"⚠️ Journal write failed: {e}")
+
+def read_journal(path):
+    """Memory-map a journal, returns (records array, string list)"""
+    import mmap
+    with open(path + '.str') as f:
+        strings = [json.loads(line) for line in f]
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < len(JOURNAL_MAGIC):
+            return np.zeros(0, dtype=JOURNAL_RECORD), strings
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[:len(JOURNAL_MAGIC)] != JOURNAL_MAGIC:
+        raise ValueError(f"{path} is not a command journal")
+    count = (size - len(JOURNAL_MAGIC)) // JOURNAL_RECORD.itemsize  # Ignore a torn last record
+    records = np.frombuffer(mapped, dtype=JOURNAL_RECORD, count=count, offset=len(JOURNAL_MAGIC))
+    return records, strings
+
+def journal_command(row, strings):
+    """Rebuild the command dict a journal record was written from"""
+    def text(string_id):
+        return None if string_id == JOURNAL_NONE else strings[string_id]
+    
+    data = json.loads(text(row['data']) or '{}')
+    if not np.isnan(row['x']):
+        data['x'] = float(row['x'])
+        data['y'] = float(row['y'])
+    command = {'action': text(row['action']), 'data': data, 'userId': text(row['user'])}
+    if row['id'] != JOURNAL_NONE:
+        command['id'] = text(row['id'])
+    return command
+
+journal = None
+
+def start_journal(path=None):
+    """Start journaling every command to `path` (a new session file by default)"""
+    global journal
+    path = path or os.path.join(JOURNAL_DIR, time.strftime('session-%Y%m%d-%H%M%S.jnl'))
+    journal = Journal(path)
+    return journal
+
+class AckChannel:
+    """How command acks travel back to the server
+    
+    Negotiated at registration: a server that answers pc_registered with
+    batchAcks gets compact acks (the command id instead of the whole
+    command) batched every ACK_FLUSH_INTERVAL on 'commands_completed'
+    (accepted acks ride in the same packet), msgpack-encoded when both
+    sides have msgpack. Older servers keep getting one JSON
+    command_accepted and command_completed per command.
+    """
+    
+    def __init__(self):
+        self._msgpack = False  # Not imported yet
+        self.encoding = 'json'
+        self.batch = False
+        self.pending = []
+        self.accepted = []
+        self.offline = deque(maxlen=ACK_BUFFER_MAX)  # Acks produced while disconnected
+        self.sent = deque(maxlen=ACK_BUFFER_MAX)  # (time, payload) not yet confirmed by a pong
+        self.lock = threading.Lock()
+        self.thread = None
+    
+    @property
+    def msgpack(self):
+        """The msgpack module, imported on first use (None when not installed)"""
+        if self._msgpack is False:
+            try:
+                import msgpack
+            except ImportError:
+                msgpack = None
+            self._msgpack = msgpack
+        return self._msgpack
+    
+    def offer(self):
+        """Encodings and features we advertise in register_pc"""
+        return {'encodings': (['msgpack'] if self.msgpack else []) + ['json'], 'batchAcks': True}
+    
+    def negotiate(self, reply):
+        """Adopt what the server picked in pc_registered (nothing = legacy JSON)"""
+        reply = reply or {}
+        self.encoding = 'msgpack' if reply.get('encoding') == 'msgpack' and self.msgpack else 'json'
+        self.batch = bool(reply.get('batchAcks'))
+        if self.batch and (self.thread is None or not self.thread.is_alive()):
+            self.thread = threading.Thread(target=self._run, name='ack-flusher', daemon=True)
+            self.thread.start()
+        self.resend()
+        return self.encoding
+    
+    def resend(self):
+        """Deliver the acks that piled up while we were disconnected"""
+        backlog = []
+        while self.offline:
+            backlog.append(self.offline.popleft())
+        if backlog:
+            log.info('resume', f"📨 Sending {len(backlog)} acks held during the disconnect", acks=len(backlog))
+        for payload in backlog:
+            # Credits from before the disconnect died with the old registration
+            self.send(dict(payload, credits=0))
+    
+    def requeue_unconfirmed(self, since):
+        """Acks sent after `since` may have been lost with the link, send them again"""
+        unconfirmed = [payload for sent_at, payload in self.sent if sent_at > since]
+        self.sent.clear()
+        self.offline.extendleft(reversed(unconfirmed))
+        return len(unconfirmed)
+    
+    def _sent(self, payloads):
+        now = time.time()
+        confirmed = clock.confirmed_until
+        while self.sent and self.sent[0][0] <= confirmed:
+            self.sent.popleft()
+        self.sent.extend((now, payload) for payload in payloads)
+    
+    def compact(self, payload):
+        """Refer to the command by id instead of echoing it back"""
+        command = payload.get('command') or {}
+        if not self.batch or command.get('id') is None:
+            return payload
+        compact = {key: value for key, value in payload.items() if key != 'command'}
+        compact['id'] = command['id']
+        return compact
+    
+    def send(self, payload):
+        """Send (or queue for the next batch) one command_completed payload"""
+        if not sio.connected:
+            self.offline.append(payload)
+            return
+        if not self.batch:
+            try:
+                sio.emit('command_completed', payload)
+                self._sent([payload])
+            except Exception:
+                self.offline.append(payload)  # Dropped mid-send, goes out after reconnect
+            return
+        with self.lock:
+            self.pending.append(self.compact(payload))
+            full = len(self.pending) >= ACK_BATCH_MAX
+        if full:
+            self.flush()
+    
+    def accept(self, payload):
+        """Send (or queue for the next batch) one command_accepted payload
+        
+        Accepted acks are only progress reports, so unlike completions they
+        are not held across a disconnect.
+        """
+        if not sio.connected:
+            return
+        if not self.batch:
+            try:
+                sio.emit('command_accepted', payload)
+            except Exception:
+                pass
+            return
+        with self.lock:
+            self.accepted.append(self.compact(payload))
+            full = len(self.pending) + len(self.accepted) >= ACK_BATCH_MAX
+        if full:
+            self.flush()
+    
+    def encode(self, body):
+        if self.encoding == 'msgpack':
+            return self.msgpack.packb(body, use_bin_type=True,
+                                      default=lambda o: o.item() if hasattr(o, 'item') else str(o))
+        return body
+    
+    def decode(self, blob):
+        return self.msgpack.unpackb(blob, raw=False)
+    
+    def flush(self):
+        with self.lock:
+            batch, self.pending = self.pending, []
+            accepted, self.accepted = self.accepted, []
+        if not batch and not accepted:
+            return
+        body = {'acks': batch}
+        if accepted:
+            body['accepted'] = accepted
+        try:
+            sio.emit('commands_completed', self.encode(body))
+            self._sent(batch)
+        except Exception as e:
+            log.warning('ack', f"⚠️ Could not report {len(batch)} command statuses, holding them: {e}")
+            self.offline.extend(batch)
+    
+    def _run(self):
+        while True:
+            time.sleep(ACK_FLUSH_INTERVAL)
+            self.flush()
+
+acks = AckChannel()
+
+def report_command(job, status, error=None, **extra):
+    """Send a command status back to the server, `extra` fields ride along"""
+    job.mark('ack')
+    payload = {
+        'command': job.command,
+        'status': status,
+        'timestamp': time.time()
+    }
+    if error is not None:
+        payload['error'] = error
+    payload.update(extra)
+    if job.id is not None:
+        dedup.complete(job.id, dict(payload))
+    payload['credits'] = flow.on_finish(job)
+    if journal is not None:
+        journal.record(job, status, error, extra)
+    
+    try:
+        acks.send(payload)
+    except Exception as e:
+        # Lost the connection mid-command, nothing to report to
+        log.warning('ack', f"⚠️ Could not report command status: {e}")
+    
+    metrics.count(job.action, status)
+    metrics.observe(job)
+
+class LaneQueue:
+    """Bounded multi-lane queue - get() serves the most urgent non-empty lane first
+    
+    The emergency lane is never refused, even when the queue is full.
+    """
+    
+    def __init__(self, maxsize, lanes=COMMAND_LANES):
+        self.maxsize = maxsize
+        self.lanes = {lane: deque() for lane in lanes}
+        self.order = list(lanes)
+        self.cond = threading.Condition()
+        self.size = 0
+    
+    def put_nowait(self, job):
+        """Add a job to its lane, returns False if the queue is full"""
+        with self.cond:
+            if self.size >= self.maxsize and job.lane != 'emergency':
+                return False
+            self.lanes[job.lane].append(job)
+            self.size += 1
+            self.cond.notify()
+            return True
+    
+    def get(self):
+        """Block until a job is available and return the most urgent one"""
+        with self.cond:
+            while not self.size:
+                self.cond.wait()
+            for lane in self.order:
+                if self.lanes[lane]:
+                    self.size -= 1
+                    return self.lanes[lane].popleft()
+    
+    def remove_if(self, predicate):
+        """Pull every queued job matching predicate out of the queue"""
+        removed = []
+        with self.cond:
+            for lane in self.order:
+                kept = deque()
+                for job in self.lanes[lane]:
+                    (removed if predicate(job) else kept).append(job)
+                self.lanes[lane] = kept
+            self.size -= len(removed)
+        return removed
+    
+    def drain(self):
+        """Empty the queue, returns what was in it"""
+        return self.remove_if(lambda job: True)
+    
+    def qsize(self):
+        with self.cond:
+            return self.size
+    
+    def lane_sizes(self):
+        with self.cond:
+            return {lane: len(jobs) for lane, jobs in self.lanes.items()}
+
+class CommandExecutor:
+    """Bounded, prioritized work queue drained by a single input-worker thread
+    
+    The Socket.IO handler only enqueues, so the event thread keeps
+    answering pings while the worker does the slow mouse/keyboard work.
+    Commands older than their action's deadline are dropped with an
+    'expired' status instead of being replayed late.
+    """
+    
+    def __init__(self, max_pending=COMMAND_QUEUE_SIZE):
+        self.queue = LaneQueue(max_pending)
+        self.thread = None
+    
+    def start(self):
+        """Start the input worker if it is not already running"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._run, name='input-worker', daemon=True)
+        self.thread.start()
+    
+    def submit(self, job):
+        """Queue a job without blocking, returns False when the queue is full"""
+        if self.queue.put_nowait(job):
+            return True
+        # Make room by dropping whatever has gone stale, then try once more
+        self.expire_stale()
+        return self.queue.put_nowait(job)
+    
+    def expire_stale(self):
+        """Drop queued commands that are past their deadline"""
+        for job in self.queue.remove_if(lambda job: job.expired()):
+            self._expire(job)
+    
+    def flush(self, status='cancelled', reason='Flushed by emergency stop'):
+        """Drop everything still queued, reporting each with `status`"""
+        flushed = self.queue.drain()
+        for job in flushed:
+            report_command(job, status, reason)
+        return len(flushed)
+    
+    def pending(self):
+        """Number of commands waiting for the worker"""
+        return self.queue.qsize()
+    
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job.expired():
+                self._expire(job)
+                continue
+            if job.action == 'key_press':
+                self._execute_camera(job)
+            elif CLICK_CONSENSUS and job.action in CONSENSUS_ACTIONS:
+                self._execute_consensus(job)
+            else:
+                self._execute(job)
+    
+    def _expire(self, job):
+        log.warning('expired', f"⌛ Dropping stale {job.action} ({job.age():.1f}s old)", action=job.action)
+        report_command(job, 'expired', f"Command expired after {job.age():.1f}s")
+    
+    def _execute(self, job):
+        job.mark('dequeue')
+        _worker_state.job = job
+        _worker_state.stop_token = emergency.token()
+        try:
+            pipeline.before_move(job.action)
+            success, error_msg = dispatch_command(job.command)
+        except CommandCancelled:
+            log.warning('cancelled', f"🛑 Cancelled {job.action} mid-flight", action=job.action)
+            report_command(job, 'cancelled', 'Cancelled by emergency stop')
+            return
+        except Exception as e:
+            success, error_msg = False, str(e)
+        finally:
+            _worker_state.job = None
+            _worker_state.stop_token = None
+        
+        if success:
+            focus.note_input()
+            report_command(job, 'success', **job.result)
+        else:
+            log.error('command_failed', f"❌ {error_msg}", action=job.action)
+            report_command(job, 'error', error_msg, **job.result)
+    
+    def _execute_camera(self, first):
+        """Merge every pending camera press into one net drag"""
+        _worker_state.stop_token = emergency.token()
+        try:
+            # Give a burst of presses a moment to land, then take all of them
+            pause(CAMERA_COALESCE_WINDOW)
+        except CommandCancelled:
+            report_command(first, 'cancelled', 'Cancelled by emergency stop')
+            return
+        jobs = [first]
+        for job in self.queue.remove_if(lambda job: job.action == 'key_press'):
+            if job.expired():
+                self._expire(job)
+            else:
+                jobs.append(job)
         
-        focus_osrs_window()
-        time.sleep(0.1)
+        merged, invalid = [], []
+        dx = dy = 0
+        for job in jobs:
+            job.mark('dequeue')
+            vector = CAMERA_VECTORS.get(job.command.get('data', {}).get('key'))
+            if vector is None:
+                invalid.append(job)
+                continue
+            job.group = merged[0] if merged else job  # One drag, led by the first press
+            merged.append(job)
+            dx += vector[0]
+            dy += vector[1]
         
-        # Move mouse first, then right click
-        pyautogui.moveTo(abs_x, abs_y, duration=0.1)
-        time.sleep(0.05)
+        for job in invalid:
+            report_command(job, 'error', f"Unknown key: {job.command.get('data', {}).get('key')}")
+        if not merged:
+            return
         
-        pyautogui.rightClick(abs_x, abs_y)
-        print(f"✅ Right click at ({abs_x:.0f}, {abs_y:.0f}) - rel: {rel_x:.3f}, {rel_y:.3f}")
+        # Opposite presses cancel out; keep the drag on screen
+        dx = max(-CAMERA_MAX_DRAG, min(CAMERA_MAX_DRAG, dx))
+        dy = max(-CAMERA_MAX_DRAG, min(CAMERA_MAX_DRAG, dy))
+        if len(merged) > 1:
+            log.info('camera_merged', f"🎥 Merged {len(merged)} camera presses into ({dx:+d}, {dy:+d})",
+                     merged=len(merged))
         
-        time.sleep(0.2)
-        return True
+        _worker_state.job = merged[0]
+        try:
+            pipeline.before_move(first.action)
+            success = execute_camera_move(dx, dy)
+        except CommandCancelled:
+            for job in merged:
+                report_command(job, 'cancelled', 'Cancelled by emergency stop')
+            return
+        except Exception:
+            success = False
+        finally:
+            _worker_state.job = None
+            _worker_state.stop_token = None
         
-    except Exception as e:
-        print(f"❌ Error with right click: {e}")
-        return False
+        status = 'success' if success else 'error'
+        error_msg = None if success else 'Camera movement failed'
+        if success:
+            focus.note_input()
+        for job in merged:
+            report_command(job, status, error_msg, merged=len(merged), netMove=[dx, dy])
 
-def execute_direct_click(rel_x, rel_y):
-    """Execute direct click on game window at exact coordinates"""
-    try:
-        # Convert relative coordinates (0-1) to absolute screen coordinates
-        abs_x = GAME_WINDOW['x'] + (rel_x * GAME_WINDOW['width']) + CLICK_OFFSET_X
-        abs_y = GAME_WINDOW['y'] + (rel_y * GAME_WINDOW['height']) + CLICK_OFFSET_Y
+    def _execute_consensus(self, first):
+        """Cluster a burst of viewer clicks and click only the winning spot"""
+        _worker_state.stop_token = emergency.token()
+        # The burst is whatever arrived within the window of the first click;
+        # clicks that merely queued up behind slow work are not part of it
+        window_end = first.marks['receive'] + CLICK_CONSENSUS_WINDOW
+        try:
+            if window_end > time.time():
+                pause(window_end - time.time())
+        except CommandCancelled:
+            report_command(first, 'cancelled', 'Cancelled by emergency stop')
+            return
         
-        # CRITICAL: Ensure OSRS window is focused and active
-        focus_osrs_window()
-        time.sleep(0.1)  # Give focus time to take effect
+        def in_burst(job):
+            return job.action in CONSENSUS_ACTIONS and job.marks['receive'] <= window_end
         
-        # Move mouse to position first (helps with object detection)
-        pyautogui.moveTo(abs_x, abs_y, duration=0.1)
-        time.sleep(0.05)  # Brief pause for OSRS to detect mouse hover
+        jobs = [first]
+        for job in self.queue.remove_if(in_burst):
+            if job.expired():
+                self._expire(job)
+            else:
+                jobs.append(job)
         
-        # Execute the click with proper timing for object interaction
-        pyautogui.click(abs_x, abs_y, duration=0.05)
-        print(f"✅ Direct click at ({abs_x:.0f}, {abs_y:.0f}) - rel: {rel_x:.3f}, {rel_y:.3f}")
+        valid, points = [], []
+        for job in jobs:
+            data = job.command.get('data', {})
+            x, y = data.get('x'), data.get('y')
+            if isinstance(x, (int, float)) and isinstance(y, (int, float)):
+                valid.append(job)
+                points.append((x, y))
+            else:
+                job.mark('dequeue')
+                report_command(job, 'error', 'Invalid click coordinates')
+        if not valid:
+            _worker_state.stop_token = None
+            return
+        if len(valid) == 1:
+            self._execute(valid[0])
+            return
         
-        time.sleep(0.2)  # Longer delay for OSRS object recognition
-        return True
+        (x, y), members = consensus_point(points)
+        winners = [job for job, member in zip(valid, members) if member]
+        losers = [job for job, member in zip(valid, members) if not member]
+        if len(winners) == 1:
+            # Nobody agrees with anybody, so there is no vote to lose: run them all
+            token, _worker_state.stop_token = _worker_state.stop_token, None
+            for job in valid:
+                if emergency.cancelled(token):
+                    report_command(job, 'cancelled', 'Cancelled by emergency stop')
+                else:
+                    self._execute(job)
+            return
+        log.info('consensus', f"👥 {len(valid)} clicks -> consensus ({x:.3f}, {y:.3f}) from a cluster of {len(winners)}",
+                 clicks=len(valid), cluster=len(winners))
         
-    except Exception as e:
-        print(f"❌ Error with direct click: {e}")
-        return False
-
-@sio.event
-def connect():
-    """Called when connected to server"""
-    print("🎮 Connected to cow714 OSRS controller!")
-    print(f"📡 Server: {SERVER_URL}")
-    
-    # Register as PC client
-    sio.emit('register_pc')
-
-@sio.event  
-def disconnect():
-    """Called when disconnected from server"""
-    print("❌ Disconnected from server")
+        # Run the winning click as the earliest member, with the centroid as its target
+        lead = winners[0]
+        command = dict(lead.command, data=dict(lead.command.get('data', {}), x=float(x), y=float(y)))
+        consensus = {'consensus': [float(x), float(y)], 'clusterSize': len(winners), 'clicks': len(valid)}
+        for job in winners + losers:
+            job.mark('dequeue')
+            job.group = lead  # Lets replay run the vote's outcome once
+        _worker_state.job = lead
+        try:
+            pipeline.before_move(lead.action)
+            success, error_msg = dispatch_command(command)
+        except CommandCancelled:
+            for job in valid:
+                report_command(job, 'cancelled', 'Cancelled by emergency stop')
+            return
+        except Exception as e:
+            success, error_msg = False, str(e)
+        finally:
+            _worker_state.job = None
+            _worker_state.stop_token = None
+        
+        if success:
+            focus.note_input()
+        for job in winners:
+            if success:
+                report_command(job, 'success', **consensus, **lead.result)
+            else:
+                report_command(job, 'error', error_msg, **consensus)
+        for job in losers:
+            report_command(job, 'outvoted', 'A larger cluster of clicks won', **consensus)
 
-@sio.on('pc_registered')
-def on_registered(data):
-    """Called when PC registration is confirmed"""
-    print("✅ PC client registered successfully!")
-    print("🎯 Ready to receive commands from viewers...")
+executor = CommandExecutor()
+metrics.add_gauge('queue_depth', executor.pending)
+metrics.add_gauge('clock_offset_seconds', clock.offset)
 
 @sio.on('execute_command')
 def on_command(command_data):
-    """Handle commands from web interface"""
+    """Handle commands from web interface - queue them for the input worker"""
+    job = CommandJob(command_data)
     try:
-        action = command_data.get('action')
-        data = command_data.get('data', {})
         user_id = command_data.get('userId', 'unknown')
         
-        print(f"🎯 Command from {user_id[:8]}...: {action}")
+        log.info('command', f"🎯 Command from {user_id[:8]}...: {job.action}", action=job.action, id=job.id)
+        flow.on_receive(job)
         
-        success = False
-        error_msg = None
+        if job.id is not None:
+            cached = dedup.check(job.id)
+            if cached is CommandDedup.PENDING:
+                log.info('duplicate', f"♻️ Duplicate {job.action} {job.id} still in flight, not running it again")
+                acks.accept({
+                    'command': command_data,
+                    'status': 'duplicate',
+                    'queueLength': executor.pending(),
+                    'credits': flow.on_finish(job),
+                    'timestamp': time.time()
+                })
+                return
+            if cached is not None:
+                log.info('duplicate', f"♻️ Duplicate {job.action} {job.id}, replaying its result")
+                acks.send(dict(cached, duplicate=True, credits=flow.on_finish(job)))
+                return
         
-        if action == 'key_press':
-            # Handle arrow key presses
-            key = data.get('key')
-            if key in ['up', 'down', 'left', 'right']:
-                success = execute_arrow_key(key)
-            else:
-                error_msg = f"Unknown key: {key}"
-                
-        elif action == 'action':
-            # Handle click actions
-            action_type = data.get('type')
-            if action_type in ['left-click', 'right-click']:
-                success = execute_click(action_type)
-            else:
-                error_msg = f"Unknown action type: {action_type}"
-                
-        elif action == 'right_click':
-            # Handle right clicks for context menus
-            x = data.get('x')
-            y = data.get('y')
-            if x is not None and y is not None:
-                success = execute_right_click(x, y)
-            else:
-                error_msg = "Invalid right click coordinates"
-                
-        elif action == 'direct_click':
-            # Handle direct clicks on the stream (exact coordinates)
-            x = data.get('x')
-            y = data.get('y')
-            if x is not None and y is not None:
-                success = execute_direct_click(x, y)
-            else:
-                error_msg = "Invalid direct click coordinates"
-                
-        elif action == 'stream_click':
-            # Handle clicks on stream overlay (legacy support)
-            zone = data.get('zone')
-            x = data.get('x')
-            y = data.get('y')
-            if zone and x is not None and y is not None:
-                success = execute_direct_click(x, y)  # Use same function now
-            else:
-                error_msg = "Invalid stream click data"
-                
-        else:
-            error_msg = f"Unknown command action: {action}"
+        if journal is not None:
+            journal.received(job)
         
-        # Send completion status back to server
-        if success:
-            sio.emit('command_completed', {
-                'command': command_data,
-                'status': 'success',
-                'timestamp': time.time()
-            })
-        else:
-            print(f"❌ {error_msg}")
-            sio.emit('command_completed', {
-                'command': command_data,
-                'status': 'error',
-                'error': error_msg,
-                'timestamp': time.time()
-            })
-            
-    except Exception as e:
-        print(f"❌ Error processing command: {e}")
-        sio.emit('command_completed', {
+        if job.action == 'emergency_stop':
+            if command_data.get('source') != 'admin':
+                # It flushes every viewer's commands, so viewers don't get to send it
+                report_command(job, 'rejected', 'Emergency stop is admin-only')
+                return
+            # Don't make a stop wait behind the backlog it is meant to clear;
+            # the admin can cancel and flush but only the local hotkey latches
+            emergency.trigger('admin', latch=False)
+        elif emergency.latched:
+            report_command(job, 'rejected', 'PC is emergency-stopped')
+            return
+        elif job.action == 'define_macro':
+            # Macros can type and press hotkeys, only the server may define them
+            report_command(job, 'rejected', 'Macros are defined by the server, not by viewers')
+            return
+        
+        if not executor.submit(job):
+            log.warning('rejected', f"⚠️ Input queue full, rejecting {job.action}", action=job.action)
+            report_command(job, 'rejected', 'PC input queue is full')
+            return
+        
+        # Ack right away, command_completed follows when the worker is done
+        metrics.count(job.action, 'accepted')
+        acks.accept({
             'command': command_data,
-            'status': 'error',
-            'error': str(e),
+            'status': 'accepted',
+            'queueLength': executor.pending(),
             'timestamp': time.time()
         })
+            
+    except Exception as e:
+        log.error('command', f"❌ Error processing command: {e}")
+        report_command(job, 'error', str(e))
 
-def focus_osrs_window():
-    """Ensure OSRS window is focused for proper object interaction"""
-    try:
+@sio.on('execute_command_packed')
+def on_command_packed(blob):
+    """msgpack-encoded execute_command, sent once msgpack was negotiated"""
+    on_command(acks.decode(blob))
+
+class ConnectionManager:
+    """Keeps the PC connected to the server
+    
+    Connects over websocket only, retries with jittered exponential backoff
+    (starting at RECONNECT_BASE_DELAY, so a restarted dyno is picked up
+    within a fraction of a second) and drops a link that stops answering
+    pings. The input worker keeps running through a gap; acks are held and
+    re-registration tells the server which commands are in flight or done.
+    """
+    
+    def __init__(self):
+        self.attempt = 0
+        self.reconnects = 0
+        self.disconnected_at = None
+        self.last_downtime = 0.0
+        self.stopping = False
+    
+    def backoff(self):
+        """Next retry delay: exponential, with 'equal jitter' so PCs don't retry in lockstep"""
+        ceiling = min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** self.attempt)
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+    
+    def on_connect(self):
+        self.attempt = 0
+        clock.reset()
+        if self.disconnected_at is not None:
+            self.reconnects += 1
+            self.last_downtime = time.time() - self.disconnected_at
+            self.disconnected_at = None
+            log.info('reconnect', f"🔌 Reconnected after {self.last_downtime * 1000:.0f}ms",
+                     downtime=self.last_downtime, reconnects=self.reconnects)
+    
+    def on_disconnect(self):
+        if self.disconnected_at is None:
+            self.disconnected_at = time.time()
+            held = acks.requeue_unconfirmed(clock.confirmed_until)
+            if held:
+                log.info('disconnect', f"📨 Holding {held} acks the server may not have seen", acks=held)
+    
+    def run(self, url):
+        """Connect and stay connected until interrupted"""
+        while not self.stopping:
+            try:
+                sio.connect(url, transports=CONNECT_TRANSPORTS, wait_timeout=CONNECT_TIMEOUT)
+            except Exception as e:
+                self.on_disconnect()
+                delay = self.backoff()
+                self.attempt += 1
+                log.warning('reconnect', f"🔌 Connection failed ({e}), retry {self.attempt} in {delay:.2f}s",
+                            attempt=self.attempt)
+                time.sleep(delay)
+                continue
+            # Stay here while the link is up and answering pings
+            while sio.connected and clock.silent_for() <= PONG_TIMEOUT:
+                time.sleep(CONNECTION_POLL_INTERVAL)
+            if sio.connected:
+                log.warning('disconnect', f"💤 No pong for {clock.silent_for():.1f}s, dropping the connection")
+            self.on_disconnect()
+            sio.reset()
+
+connection = ConnectionManager()
+metrics.add_gauge('reconnects', lambda: connection.reconnects)
+metrics.add_gauge('last_downtime_seconds', lambda: connection.last_downtime)
+metrics.add_gauge('rtt_seconds', lambda: clock.rtt() or 0.0)
+
+class FocusManager:
+    """Tracks whether the OSRS window already has focus
+    
+    Reads the foreground window where the platform allows it (Win32, X11)
+    and otherwise trusts the last successful input for a while, so the
+    center-screen focus click only happens when focus was really lost.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.game_handle = None     # Foreground handle last seen on the OSRS window
+        self.last_input = 0.0       # time.time() of the last input that went through
+        self.refocus_count = 0
+        self._reader = None
+    
+    def _foreground_reader(self):
+        """Pick a way to read the foreground window, or None if there is none"""
+        if self._reader is None:
+            self._reader = False
+            try:
+                if sys.platform == 'win32':
+                    import ctypes
+                    user32 = ctypes.windll.user32
+                    
+                    def read_win32():
+                        handle = user32.GetForegroundWindow()
+                        length = user32.GetWindowTextLengthW(handle)
+                        buf = ctypes.create_unicode_buffer(length + 1)
+                        user32.GetWindowTextW(handle, buf, length + 1)
+                        return handle, buf.value
+                    
+                    self._reader = read_win32
+                else:
+                    from Xlib import X, display as xdisplay
+                    disp = xdisplay.Display()
+                    root = disp.screen().root
+                    active_atom = disp.intern_atom('_NET_ACTIVE_WINDOW')
+                    
+                    def read_x11():
+                        prop = root.get_full_property(active_atom, X.AnyPropertyType)
+                        if not prop or not prop.value:
+                            return None
+                        handle = prop.value[0]
+                        title = disp.create_resource_object('window', handle).get_wm_name()
+                        return handle, title or ''
+                    
+                    self._reader = read_x11
+            except Exception:
+                # No way to ask the OS, fall back to trusting recent input
+                self._reader = False
+        return self._reader or None
+    
+    def has_focus(self):
+        """True if the OSRS window is (very likely) the foreground window"""
+        reader = self._foreground_reader()
+        if reader is not None:
+            try:
+                foreground = reader()
+            except Exception:
+                foreground = None
+            if foreground is not None:
+                handle, title = foreground
+                with self.lock:
+                    if handle == self.game_handle:
+                        return True
+                    if any(name in title for name in OSRS_WINDOW_TITLES):
+                        self.game_handle = handle
+                        return True
+                return False
+        
+        with self.lock:
+            return time.time() - self.last_input < FOCUS_TRUST_SECONDS
+    
+    def note_input(self):
+        """Record that input just reached the game"""
+        with self.lock:
+            self.last_input = time.time()
+    
+    def invalidate(self):
+        """Forget the cached focus state so the next command re-asserts it"""
+        with self.lock:
+            self.last_input = 0.0
+    
+    def ensure_focus(self):
+        """Re-assert focus only if it was lost, returns True if it had to"""
+        if self.has_focus():
+            return False
+        
         # For fullscreen OSRS, just click in a safe area to ensure focus
         # Click on the center of the screen briefly
         center_x = GAME_WINDOW['x'] + (GAME_WINDOW['width'] // 2)
         center_y = GAME_WINDOW['y'] + (GAME_WINDOW['height'] // 2)
         
         # Quick focus click in game area (won't interfere with gameplay)
-        current_pos = pyautogui.position()
-        pyautogui.click(center_x, center_y)
-        time.sleep(0.02)  # Very brief pause
+        mouse = get_input_backend()
+        current_pos = mouse.position()
+        mouse.click(center_x, center_y)
+        pause(delay('focus', 'click'))  # Very brief pause
         
         # Move mouse back to original position
-        pyautogui.moveTo(current_pos[0], current_pos[1], duration=0.05)
+        mouse.glide(current_pos[0], current_pos[1], duration=delay('focus', 'return'))
         
+        self.refocus_count += 1
+        self.note_input()
+        return True
+
+focus = FocusManager()
+
+def focus_osrs_window():
+    """Ensure OSRS window is focused, returns True if a focus click was needed"""
+    try:
+        return focus.ensure_focus()
     except Exception as e:
-        print(f"⚠️ Could not focus OSRS window: {e}")
+        log.warning('focus', f"⚠️ Could not focus OSRS window: {e}")
+        focus.invalidate()
+        return False
 
-def calibrate_coordinates():
-    """Interactive calibration system to map stream coordinates to game coordinates"""
-    print("🎯 COORDINATE CALIBRATION SYSTEM")
-    print("=" * 50)
-    print("This will help map your stream clicks to exact game positions.")
-    print("You'll click 6 reference points on your OSRS window.")
-    print()
+class CalibrationRecorder:
+    """Collects reference clicks and control keys from pynput listeners
     
-    calibration_points = []
+    Left clicks arrive as ('click', x, y), ENTER as ('done',) and ESC as
+    ('cancel',) on a queue, so calibration blocks on events instead of
+    polling the mouse position.
+    """
     
-    # Define the calibration sequence
-    calibration_sequence = [
-        ("TOP-LEFT corner of game area", "Click the very top-left corner of your OSRS game area"),
-        ("TOP-RIGHT corner of game area", "Click the very top-right corner of your OSRS game area"),
-        ("BOTTOM-LEFT corner of game area", "Click the very bottom-left corner of your OSRS game area"),
-        ("BOTTOM-RIGHT corner of game area", "Click the very bottom-right corner of your OSRS game area"),
-        ("FIRST INVENTORY SLOT", "Click the first inventory slot (top-left of inventory)"),
-        ("A SPECIFIC ITEM", "Click on any item in your inventory that you can see clearly")
-    ]
+    def __init__(self):
+        from pynput import keyboard, mouse
+        self.events = queue.Queue()
+        self.mouse_listener = mouse.Listener(on_click=self._on_click)
+        self.keyboard_listener = keyboard.Listener(on_press=self._on_press)
+        self.left_button = mouse.Button.left
+        self.keys = {keyboard.Key.enter: 'done', keyboard.Key.esc: 'cancel'}
+    
+    def _on_click(self, x, y, button, pressed):
+        if pressed and button == self.left_button:
+            self.events.put(('click', int(x), int(y)))
+    
+    def _on_press(self, key):
+        if key in self.keys:
+            self.events.put((self.keys[key],))
     
+    def __enter__(self):
+        self.mouse_listener.start()
+        self.keyboard_listener.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self.mouse_listener.stop()
+        self.keyboard_listener.stop()
+    
+    def next_event(self):
+        return self.events.get()
+
+def calibrate_coordinates(points=None):
+    """Interactive calibration: click reference points, fit the transform by least squares"""
+    points = points or CALIBRATION_POINTS
+    print("🎯 COORDINATE CALIBRATION SYSTEM")
+    print("=" * 50)
+    print("This maps your stream clicks to exact game positions.")
+    print(f"You'll click up to {len(points)} reference points on your OSRS window.")
+    print()
     print("🖱️  INSTRUCTIONS:")
-    print("- Position your mouse over each point when prompted")
-    print("- Press SPACE when your mouse is exactly on the target")
+    print("- LEFT CLICK exactly on each point when prompted")
+    print(f"- Press ENTER to finish early (after at least {MIN_CALIBRATION_POINTS} points)")
     print("- Press ESC to cancel calibration")
     print()
     
-    for i, (point_name, instruction) in enumerate(calibration_sequence):
-        print(f"📍 STEP {i+1}/6: {point_name}")
-        print(f"   {instruction}")
-        print("   Position mouse and press SPACE when ready...")
-        
-        # Wait for user input
-        while True:
-            try:
-                # Get current mouse position
-                x, y = pyautogui.position()
-                print(f"\r   Mouse: ({x}, {y}) - Press SPACE when positioned correctly...", end="", flush=True)
-                
-                # Check for keyboard input (simplified - just wait for Enter)
-                import msvcrt
-                if msvcrt.kbhit():
-                    key = msvcrt.getch()
-                    if key == b' ':  # Space bar
-                        calibration_points.append((point_name, x, y))
-                        print(f"\n   ✅ Recorded: {point_name} at ({x}, {y})")
-                        break
-                    elif key == b'\x1b':  # Escape
-                        print("\n❌ Calibration cancelled.")
-                        return None
-                
-                time.sleep(0.1)
-                
-            except KeyboardInterrupt:
-                print("\n❌ Calibration cancelled.")
+    names, rel_points, screen_points = [], [], []
+    with CalibrationRecorder() as recorder:
+        for i, (point_name, rel) in enumerate(points):
+            print(f"📍 STEP {i+1}/{len(points)}: {point_name} (relative {rel[0]:.2f}, {rel[1]:.2f})")
+            event = recorder.next_event()
+            while event[0] == 'done' and len(names) < MIN_CALIBRATION_POINTS:
+                print(f"   Need at least {MIN_CALIBRATION_POINTS} points, keep clicking...")
+                event = recorder.next_event()
+            if event[0] == 'cancel':
+                print("❌ Calibration cancelled.")
                 return None
-        
-        print()
+            if event[0] == 'done':
+                break
+            _, x, y = event
+            names.append(point_name)
+            rel_points.append(rel)
+            screen_points.append((x, y))
+            print(f"   ✅ Recorded: {point_name} at ({x}, {y})")
     
-    # Calculate the calibration data
+    print()
     print("🧮 Calculating calibration...")
-    
-    # Extract coordinates
-    top_left = calibration_points[0][1:3]      # x, y
-    top_right = calibration_points[1][1:3]
-    bottom_left = calibration_points[2][1:3]
-    bottom_right = calibration_points[3][1:3]
-    inventory_first = calibration_points[4][1:3]
-    test_item = calibration_points[5][1:3]
-    
-    # Calculate game area bounds
-    game_left = min(top_left[0], bottom_left[0])
-    game_right = max(top_right[0], bottom_right[0])
-    game_top = min(top_left[1], top_right[1])
-    game_bottom = max(bottom_left[1], bottom_right[1])
-    
-    game_width = game_right - game_left
-    game_height = game_bottom - game_top
-    
-    # Calculate where inventory and test item are relative to game area
-    inv_rel_x = (inventory_first[0] - game_left) / game_width
-    inv_rel_y = (inventory_first[1] - game_top) / game_height
-    
-    test_rel_x = (test_item[0] - game_left) / game_width
-    test_rel_y = (test_item[1] - game_top) / game_height
+    fitted = CoordinateTransform.fit(rel_points, screen_points, names=names)
+    residuals = fitted.residuals()
+    window = fitted.game_window
     
     print("✅ Calibration Complete!")
     print("=" * 50)
     print("📊 RESULTS:")
-    print(f"Game Area: ({game_left}, {game_top}) to ({game_right}, {game_bottom})")
-    print(f"Game Size: {game_width} x {game_height}")
-    print(f"First Inventory Slot: {inv_rel_x:.3f}, {inv_rel_y:.3f} (relative)")
-    print(f"Test Item Position: {test_rel_x:.3f}, {test_rel_y:.3f} (relative)")
-    print()
+    print(f"Transform: {fitted.kind} over {len(names)} points")
+    for name, (x, y), error in zip(names, screen_points, residuals):
+        print(f"   {name:<28} ({x}, {y})  error {error:.1f}px")
+    print(f"RMS error: {np.sqrt(np.mean(residuals ** 2)):.2f}px, max {residuals.max():.2f}px")
+    print(f"Game Area: ({window['x']}, {window['y']}) to ({window['x'] + window['width']}, {window['y'] + window['height']})")
+    print(f"Game Size: {window['width']} x {window['height']}")
     
-    # Generate the new GAME_WINDOW configuration
-    print("🔧 UPDATE YOUR pc_client.py WITH THESE VALUES:")
+    global transform
+    transform = fitted
+    GAME_WINDOW.update(window)
+    path = fitted.save()
+    print(f"💾 Saved calibration to {path} - the client loads it on startup")
+    
+    return {
+        'game_window': window,
+        'transform': fitted,
+        'residuals': residuals.tolist(),
+    }
+
+def simple_calibrate():
+    """Two-click calibration: top-left and bottom-right corners of the game area"""
+    print("🎯 SIMPLE CALIBRATION")
     print("=" * 50)
-    print("GAME_WINDOW = {")
-    print(f"    'x': {game_left},")
-    print(f"    'y': {game_top},")
-    print(f"    'width': {game_width},")
-    print(f"    'height': {game_height}")
-    print("}")
+    print("LEFT CLICK the TOP-LEFT corner of the game area, then the BOTTOM-RIGHT corner.")
+    print("Press ESC to cancel.")
     print()
-    print("# No offset needed with proper calibration!")
-    print("CLICK_OFFSET_X = 0")
-    print("CLICK_OFFSET_Y = 0")
-    print()
-    
-    # Test the calibration
-    print("🧪 TESTING CALIBRATION:")
-    print("Testing click on your inventory first slot in 3 seconds...")
-    time.sleep(3)
-    
-    # Update the global GAME_WINDOW temporarily
-    global GAME_WINDOW
-    old_window = GAME_WINDOW.copy()
-    GAME_WINDOW.update({
-        'x': game_left,
-        'y': game_top,
-        'width': game_width,
-        'height': game_height
-    })
-    
-    # Test click on inventory
-    execute_direct_click(inv_rel_x, inv_rel_y)
-    print(f"   Should have clicked first inventory slot!")
-    
-    time.sleep(2)
     
-    # Test click on the item they selected
-    execute_direct_click(test_rel_x, test_rel_y)
-    print(f"   Should have clicked your test item!")
-    
-    # Restore old window settings
-    GAME_WINDOW = old_window
+    corners = []
+    with CalibrationRecorder() as recorder:
+        while len(corners) < 2:
+            event = recorder.next_event()
+            if event[0] == 'cancel':
+                print("❌ Calibration cancelled.")
+                return None
+            if event[0] == 'click':
+                corners.append(event[1:])
+                print(f"   ✅ {'Top-left' if len(corners) == 1 else 'Bottom-right'} at {event[1:]}")
     
-    print()
-    print("✅ If those clicks were accurate, update your GAME_WINDOW values!")
-    print("   If not, run calibration again.")
+    (left, top), (right, bottom) = corners
+    if right <= left or bottom <= top:
+        print("❌ Bottom-right must be below and right of top-left, try again.")
+        return None
+    window = {'x': left, 'y': top, 'width': right - left, 'height': bottom - top}
     
-    return {
-        'game_window': {
-            'x': game_left,
-            'y': game_top, 
-            'width': game_width,
-            'height': game_height
-        },
-        'inventory_first': (inv_rel_x, inv_rel_y),
-        'test_item': (test_rel_x, test_rel_y)
-    }
+    global transform
+    transform = CoordinateTransform.from_game_window(window)
+    GAME_WINDOW.update(window)
+    path = transform.save()
+    print(f"Game Area: ({left}, {top}) to ({right}, {bottom}), {window['width']} x {window['height']}")
+    print(f"💾 Saved calibration to {path} - the client loads it on startup")
+    return window
+
+def debug_click_position():
     """Debug function to see exactly where clicks land"""
     print("🔍 Debug mode: Click test in 3 seconds...")
     print("Watch your inventory area carefully!")
@@ -447,6 +3947,8 @@ def calibrate_coordinates():
         time.sleep(1)
     
     print("🔍 Debug test complete! Check where each click landed.")
+
+def test_coordinate_accuracy():
     """Test function to check if clicks are accurate"""
     print("🧪 Testing coordinate accuracy...")
     print("Click test will happen in 3 seconds - watch your OSRS window!")
@@ -466,29 +3968,9 @@ def calibrate_coordinates():
         time.sleep(1)
     
     print("✅ Coordinate test complete!")
-    print("💡 If clicks are still off, adjust CLICK_OFFSET_X and CLICK_OFFSET_Y")
+    print("💡 If clicks are still off, run 'python pc_client.py calibrate'")
 
 def get_mouse_position():
-    """Test function to check if clicks are accurate"""
-    print("🧪 Testing coordinate accuracy...")
-    print("Click test will happen in 3 seconds - watch your OSRS window!")
-    time.sleep(3)
-    
-    # Test clicks at different positions
-    test_positions = [
-        (0.1, 0.1, "Top-left area"),
-        (0.5, 0.5, "Center"),
-        (0.9, 0.9, "Bottom-right area"),
-        (0.25, 0.75, "Inventory area (if visible)")
-    ]
-    
-    for rel_x, rel_y, description in test_positions:
-        print(f"Testing {description}...")
-        execute_direct_click(rel_x, rel_y)
-        time.sleep(1)
-    
-    print("✅ Coordinate test complete!")
-    print("💡 If clicks are still off, adjust CLICK_OFFSET_X and CLICK_OFFSET_Y")
     """Utility function to help find game window coordinates"""
     print("🖱️  Position your OSRS window, then move mouse to find coordinates:")
     print("   1. Move to TOP-LEFT corner of game area")
@@ -498,7 +3980,7 @@ def get_mouse_position():
     
     try:
         while True:
-            x, y = pyautogui.position()
+            x, y = get_input_backend().position()
             print(f"\rMouse position: ({x}, {y})    ", end="", flush=True)
             time.sleep(0.1)
     except KeyboardInterrupt:
@@ -529,60 +4011,557 @@ def test_commands():
     
     print("✅ Test complete!")
 
-def check_dependencies():
-    """Check if all required packages are installed"""
-    try:
-        import pyautogui
+def hover_text_region():
+    """Screen box of the OSRS mouse-over text (top-left of the game view)"""
+    left, top = transform.map_point(0.0, 0.0)
+    right, bottom = transform.map_point(0.3, 0.035)
+    return left, top, max(1, right - left), max(1, bottom - top)
+
+def verify_hover(target, neutral, seconds):
+    """Has the mouse-over text changed `seconds` after arriving on the target?"""
+    mouse = get_input_backend()
+    box = hover_text_region()
+    if get_capture() is None:
+        raise RuntimeError("screen capture unavailable")
+    mouse.move(*neutral)
+    time.sleep(0.3)
+    capture.grab(box, 'before')
+    mouse.move(*target)
+    time.sleep(seconds)
+    capture.grab(box, 'after')
+    changed, _, _ = capture.compare(box)
+    return changed > TUNE_CHANGE_THRESHOLD
+
+# Which delays the tuner can verify, how, and which actions share the result
+# (hover is the same mouse-over wait for every click). Nothing else has a
+# screen signal to check: a glide always ends on the target, so travel can't
+# be told from a teleport, and settle, focus and camera delays have no
+# reliable on-screen effect, so those keep their profile values
+TUNABLE_DELAYS = {
+    'hover': (verify_hover, ('direct_click', 'right_click')),
+}
+
+def tune_delay(action, name, verify, target, neutral, trials=3, factor=0.8, floor=0.005):
+    """Shrink one delay step by step, keep the smallest value that still always verifies"""
+    best = delay(action, name)
+    candidate = best
+    while candidate > floor:
+        candidate = max(floor, candidate * factor)
+        passed = all(verify(target, neutral, candidate) for _ in range(trials))
+        print(f"   {action}.{name} = {candidate * 1000:6.1f}ms  {'✅' if passed else '❌'}")
+        if not passed:
+            break
+        best = candidate
+    return best
+
+def tune_timings(target_rel, neutral_rel=(0.5, 0.2), margin=1.2):
+    """Self-tune every verifiable delay into the 'calibrated' profile and save it
+    
+    Returns False (and saves nothing) if no delay could be tuned.
+    """
+    print("🎛️  TIMING SELF-TUNE")
+    print("=" * 50)
+    print(f"Target {target_rel} should be over something with mouse-over text (tree, banker, door)")
+    print(f"Neutral {neutral_rel} should be over plain ground")
+    print("Starting in 3 seconds - don't touch the mouse!")
+    time.sleep(3)
+    
+    target = transform.map_point(*target_rel)
+    neutral = transform.map_point(*neutral_rel)
+    # Older tunes drove travel down to a teleport, go back to the safe glide
+    timings.discard('calibrated', 'travel')
+    tuned = 0
+    for name, (verify, actions) in TUNABLE_DELAYS.items():
+        try:
+            best = tune_delay(actions[0], name, verify, target, neutral)
+        except Exception as e:
+            print(f"⚠️ Could not tune {name}: {e}")
+            continue
+        # Keep a safety margin over the smallest passing value
+        for action in actions:
+            print(f"✅ {action}.{name}: {delay(action, name) * 1000:.0f}ms -> {best * margin * 1000:.0f}ms")
+            timings.set('calibrated', action, name, best * margin)
+        tuned += 1
+    
+    if not tuned:
+        print("❌ Nothing could be tuned, timing profiles left unchanged")
+        return False
+    timings.use('calibrated')
+    path = timings.save()
+    print(f"💾 Saved 'calibrated' profile to {path} (now the active profile)")
+    return True
+
+def report_backends():
+    """Measure per-operation latency of every input backend this host supports"""
+    print("⏱️  Measuring input backends (the cursor will twitch by 1px)...")
+    print()
+    for name in INPUT_BACKENDS:
+        try:
+            backend = create_input_backend(name)
+        except Exception as e:
+            print(f"❌ {name:10s} unavailable: {e}")
+            continue
+        report = measure_backend(backend)
+        close_backend(backend)
+        move, position = report['move'], report['position']
+        print(f"✅ {name:10s} move p50 {move['p50_us']:8.1f}us  p95 {move['p95_us']:8.1f}us  "
+              f"position p50 {position['p50_us']:8.1f}us")
+    print()
+    print(f"💡 Pick one with OSRS_INPUT_BACKEND=<name> (currently '{INPUT_BACKEND}', 'auto' picks the fastest)")
+
+# Synthetic viewer commands for the benchmark, keyed by action
+BENCH_COMMANDS = {
+    'direct_click': lambda rng: {'x': rng.random(), 'y': rng.random()},
+    'stream_click': lambda rng: {'zone': 'game', 'x': rng.random(), 'y': rng.random()},
+    'right_click': lambda rng: {'x': rng.random(), 'y': rng.random()},
+    'key_press': lambda rng: {'key': rng.choice(['up', 'down', 'left', 'right'])},
+    'action': lambda rng: {'type': 'left-click'},
+}
+BENCH_CLICK_BURST = 16  # server.js MAX_CLICK_BURST
+
+class BenchServer:
+    """Local stand-in for server.js speaking the PC side of its protocol
+    
+    Handles register_pc, command_accepted, command_completed and ping like
+    the real server, and timestamps every command it queues. Like server.js
+    it gives each command an id, queues commands until the PC has granted
+    a credit, and sends the clicks queued behind a click on the same credit.
+    """
+    
+    def __init__(self, host='127.0.0.1', port=5055):
         import socketio
-        from pynput import keyboard
-        print("✅ All dependencies are installed")
-        return True
-    except ImportError as e:
-        print(f"❌ Missing dependency: {e}")
-        print("Please install with: pip install python-socketio[client] pyautogui pynput")
+        self.url = f'http://{host}:{port}'
+        self.host = host
+        self.port = port
+        self.sio = socketio.Server(async_mode='threading')
+        self.httpd = None
+        self.pc_sid = None
+        self.registered = threading.Event()
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.sent = {}          # benchSeq -> perf_counter when queued
+        self.queue = deque()    # Commands waiting for a credit
+        self.credits = None     # Credits the PC granted us (None = no flow control)
+        self.accept_latency = []
+        self.ack_latency = []
+        self.statuses = {}
+        
+        @self.sio.on('register_pc')
+        def on_register(sid, data=None):
+            credits = (data or {}).get('credits')
+            with self.lock:
+                self.pc_sid = sid
+                self.credits = credits if isinstance(credits, (int, float)) else None
+            self.sio.emit('pc_registered', {'status': 'success'}, to=sid)
+            self.registered.set()
+            self.dispatch()
+        
+        @self.sio.on('command_accepted')
+        def on_accepted(sid, data):
+            self._record(data, self.accept_latency, final=False)
+            self._add_credits(data)
+        
+        @self.sio.on('command_completed')
+        def on_completed(sid, data):
+            self._record(data, self.ack_latency, final=True)
+            self._add_credits(data)
+        
+        @self.sio.on('ping')
+        def on_ping(sid, data=None):
+            self.sio.emit('pong', {'timestamp': time.time() * 1000}, to=sid)
+    
+    def _record(self, data, latencies, final):
+        now = time.perf_counter()
+        seq = (data.get('command') or {}).get('benchSeq')
+        with self.lock:
+            sent_at = self.sent.pop(seq, None) if final else self.sent.get(seq)
+            if sent_at is not None:
+                latencies.append(now - sent_at)
+            if final:
+                status = data.get('status', 'unknown')
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+    
+    def _add_credits(self, data):
+        credits = data.get('credits')
+        if not isinstance(credits, (int, float)):
+            return
+        with self.lock:
+            if self.credits is not None:
+                self.credits += credits
+        self.dispatch()
+    
+    def dispatch(self):
+        """Send queued commands while the PC has credits, same rules as dispatchWithCredits"""
+        while True:
+            with self.lock:
+                if not self.queue or self.pc_sid is None or (self.credits is not None and self.credits <= 0):
+                    return
+                batch = [self.queue.popleft()]
+                if self.credits is not None:
+                    self.credits -= 1
+                    while (batch[0]['action'] in CONSENSUS_ACTIONS and len(batch) < BENCH_CLICK_BURST
+                           and self.queue and self.queue[0]['action'] in CONSENSUS_ACTIONS):
+                        batch.append(dict(self.queue.popleft(), credit=False))
+            for command in batch:
+                self.sio.emit('execute_command', command, to=self.pc_sid)
+    
+    def start(self):
+        from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+        from socketserver import ThreadingMixIn
+        import socketio
+        
+        class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+            daemon_threads = True
+        
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, format, *args):
+                pass
+        
+        self.httpd = make_server(self.host, self.port, socketio.WSGIApp(self.sio),
+                                 server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+        threading.Thread(target=self.httpd.serve_forever, name='bench-server', daemon=True).start()
+    
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+    
+    def send(self, action, data):
+        """Queue one execute_command shaped exactly like server.js does"""
+        with self.lock:
+            self.seq += 1
+            seq = self.seq
+            self.sent[seq] = time.perf_counter()
+            self.queue.append({
+                'id': f'bench-{seq}',
+                'userId': f'bench-{seq % 50:02d}-viewer',
+                'action': action,
+                'data': data,
+                'timestamp': time.time() * 1000,
+                'benchSeq': seq,
+            })
+        self.dispatch()
+    
+    def in_flight(self):
+        with self.lock:
+            return len(self.sent)
+
+def parse_command_mix(mix):
+    """'direct_click:6,key_press:3' -> ([actions], [weights])"""
+    actions, weights = [], []
+    for part in mix.split(','):
+        name, _, weight = part.strip().partition(':')
+        if name not in BENCH_COMMANDS:
+            raise ValueError(f"Unknown bench action '{name}' (choose from {', '.join(BENCH_COMMANDS)})")
+        actions.append(name)
+        weights.append(float(weight or 1))
+    return actions, weights
+
+def format_percentiles(samples):
+    if not samples:
+        return "no samples"
+    p50, p95, p99 = np.percentile(np.array(samples) * 1000.0, [50, 95, 99])
+    return f"p50 {p50:7.1f}ms  p95 {p95:7.1f}ms  p99 {p99:7.1f}ms"
+
+def run_benchmark(rate=10.0, duration=20.0, mix='direct_click:6,key_press:3,right_click:1',
+                  backend='null', port=5055, drain_timeout=30.0, max_p95_ms=None, seed=714):
+    """Replay a synthetic viewer load against this client on a local server, returns the report"""
+    rng = random.Random(seed)
+    actions, weights = parse_command_mix(mix)
+    
+    print(f"🏁 Benchmark: {rate:g} cmd/s for {duration:g}s, mix {mix}, backend {backend}")
+    use_input_backend(backend)
+    server = BenchServer(port=port)
+    server.start()
+    executor.start()
+    clock.start()
+    
+    # wsgiref can't upgrade to websocket, long-polling is enough on localhost
+    sio.connect(server.url, transports=['polling'])
+    if not server.registered.wait(10):
+        raise RuntimeError("Client never sent register_pc")
+    
+    depth_samples = []   # (seconds since start, server in-flight, client queue depth)
+    started = time.perf_counter()
+    next_send = started
+    next_sample = started
+    interval = 1.0 / rate
+    sent = 0
+    
+    while True:
+        now = time.perf_counter()
+        if now - started >= duration:
+            break
+        if now >= next_send:
+            action = rng.choices(actions, weights)[0]
+            server.send(action, BENCH_COMMANDS[action](rng))
+            sent += 1
+            next_send += interval
+        if now >= next_sample:
+            depth_samples.append((now - started, server.in_flight(), executor.pending()))
+            next_sample += 0.25
+        time.sleep(max(0.0, min(next_send, next_sample) - time.perf_counter()))
+    
+    # Let the backlog drain so every command gets an ack
+    drain_started = time.perf_counter()
+    while server.in_flight() and time.perf_counter() - drain_started < drain_timeout:
+        depth_samples.append((time.perf_counter() - started, server.in_flight(), executor.pending()))
+        time.sleep(0.25)
+    elapsed = time.perf_counter() - started
+    
+    sio.disconnect()
+    server.stop()
+    
+    completed = sum(server.statuses.values())
+    report = {
+        'sent': sent,
+        'completed': completed,
+        'lost': server.in_flight(),
+        'elapsed': elapsed,
+        'throughput': completed / elapsed if elapsed else 0.0,
+        'statuses': dict(server.statuses),
+        'accept_latency': list(server.accept_latency),
+        'ack_latency': list(server.ack_latency),
+        'depth': depth_samples,
+    }
+    
+    print("=" * 50)
+    print(f"📤 Sent {sent}, completed {completed}, unanswered {report['lost']} in {elapsed:.1f}s")
+    print(f"⚡ Throughput: {report['throughput']:.2f} commands/sec")
+    print(f"📬 Accept latency:     {format_percentiles(report['accept_latency'])}")
+    print(f"✅ Completion latency: {format_percentiles(report['ack_latency'])}")
+    print(f"📊 Statuses: {report['statuses']}")
+    print("📈 Queue depth over time (in flight / client queue):")
+    for second in range(int(elapsed) + 1):
+        window = [(f, q) for t, f, q in depth_samples if second <= t < second + 1]
+        if window:
+            print(f"   {second:4d}s  {max(f for f, _ in window):4d} / {max(q for _, q in window):4d}")
+    
+    if max_p95_ms is not None and report['ack_latency']:
+        p95 = float(np.percentile(report['ack_latency'], 95)) * 1000.0
+        report['passed'] = p95 <= max_p95_ms
+        verdict = "✅ PASS" if report['passed'] else "❌ FAIL"
+        print(f"{verdict}: completion p95 {p95:.1f}ms (limit {max_p95_ms:g}ms)")
+    return report
+
+def add_bench_arguments(parser):
+    parser.add_argument('--rate', type=float, default=10.0, help='commands per second')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds of load')
+    parser.add_argument('--mix', default='direct_click:6,key_press:3,right_click:1',
+                        help='weighted actions, e.g. direct_click:6,key_press:3')
+    parser.add_argument('--backend', default='null', help='input backend to run against')
+    parser.add_argument('--port', type=int, default=5055, help='local server port')
+    parser.add_argument('--max-p95-ms', type=float, default=None,
+                        help='fail (exit 1) if completion p95 exceeds this')
+
+def bench_main(args):
+    """Run the benchmark for parsed 'bench' arguments, returns a process exit code"""
+    report = run_benchmark(rate=args.rate, duration=args.duration, mix=args.mix,
+                           backend=args.backend, port=args.port, max_p95_ms=args.max_p95_ms)
+    return 0 if report.get('passed', True) else 1
+
+def replay_row(row, strings):
+    """Run one journal row the way it ran live, returns success"""
+    command = journal_command(row, strings)
+    result = json.loads(strings[row['result']]) if row['result'] != JOURNAL_NONE else {}
+    job = CommandJob(dict(command))
+    _worker_state.job = job
+    _worker_state.stop_token = emergency.token()
+    try:
+        if 'netMove' in result:
+            # Coalesced camera presses ran as a single drag
+            return execute_camera_move(*result['netMove'])
+        if 'consensus' in result:
+            # A vote ran one click at the cluster centroid
+            x, y = result['consensus']
+            command['data'] = dict(command['data'], x=x, y=y)
+        return dispatch_command(command)[0]
+    except CommandCancelled:
+        return False
+    finally:
+        _worker_state.job = None
+        _worker_state.stop_token = None
+
+def replay_journal(path, speed=1.0, backend='null'):
+    """Feed a journal back through the dispatcher at `speed`x (0 = as fast as possible)
+    
+    Merged camera presses and click votes run once, as their lead row; a
+    row still 'received' was running (or waiting) when the session died,
+    and is run too.
+    """
+    records, strings = read_journal(path)
+    if not len(records):
+        print(f"❌ No commands in {path}")
+        return None
+    use_input_backend(backend)
+    order = np.argsort(records['received'], kind='stable')
+    start_recorded = records['received'][order[0]]
+    print(f"⏯️  Replaying {len(records)} commands from {path} at "
+          f"{'max' if not speed else f'{speed:g}x'} speed on '{backend}'")
+    
+    outcomes = {'same': 0, 'different': 0, 'merged': 0, 'unfinished': 0, 'skipped': 0}
+    started = time.perf_counter()
+    for index in order:
+        row = records[index]
+        recorded = strings[row['status']]
+        if recorded not in ('success', 'error', 'received'):
+            # Expired, rejected, cancelled, outvoted... never reached the dispatcher live
+            outcomes['skipped'] += 1
+            continue
+        if row['group'] not in (JOURNAL_NONE, index):
+            # Ran as part of its group's lead row
+            outcomes['merged'] += 1
+            continue
+        if speed:
+            wait = (row['received'] - start_recorded) / speed - (time.perf_counter() - started)
+            if wait > 0:
+                time.sleep(wait)
+        success = replay_row(row, strings)
+        if recorded == 'received':
+            outcomes['unfinished'] += 1
+        elif (recorded == 'success') == success:
+            outcomes['same'] += 1
+        else:
+            outcomes['different'] += 1
+    
+    elapsed = time.perf_counter() - started
+    recorded_span = records['received'].max() - start_recorded
+    print(f"✅ Replayed {len(records)} commands in {elapsed:.2f}s (recorded span {recorded_span:.2f}s)")
+    print(f"   Same outcome: {outcomes['same']}, different: {outcomes['different']}, "
+          f"ran with their group: {outcomes['merged']}, unfinished live: {outcomes['unfinished']}, "
+          f"not run live (skipped): {outcomes['skipped']}")
+    return outcomes
+
+def add_replay_arguments(parser):
+    parser.add_argument('log', help='journal file (.jnl)')
+    parser.add_argument('--speed', default='1',
+                        help="playback speed: 1 for real time, N for N times faster, 'max' for no waiting")
+    parser.add_argument('--backend', default='null', help='input backend to replay against')
+
+def replay_main(args):
+    """Replay a journal for parsed 'replay' arguments, returns a process exit code"""
+    speed = 0.0 if args.speed == 'max' else float(args.speed.rstrip('x'))
+    outcomes = replay_journal(args.log, speed=speed, backend=args.backend)
+    return 0 if outcomes is not None else 1
+
+def check_dependencies():
+    """Check that the required packages are installed (without importing them)"""
+    from importlib.util import find_spec
+    missing = [name for name in ('socketio', 'numpy', 'pynput') if find_spec(name) is None]
+    if INPUT_BACKEND == 'pyautogui' and find_spec('pyautogui') is None:
+        missing.append('pyautogui')
+    if missing:
+        print(f"❌ Missing dependency: {', '.join(missing)}")
+        print("Please install with: pip install python-socketio[client] pyautogui pynput numpy")
         return False
+    print("✅ All dependencies are installed")
+    if acks.msgpack is None:
+        print("💡 Optional: pip install msgpack for compact binary acks")
+    return True
+
+class StartupReport:
+    """Measured cost of each startup step, printed once the client is ready"""
+    
+    def __init__(self):
+        self.steps = [('imports', IMPORT_SECONDS), ('numpy import', NUMPY_SECONDS)]
+    
+    def timed(self, name, fn, *args, **kwargs):
+        """Run fn, recording how long it took under `name`"""
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.steps.append((name, time.perf_counter() - started))
+    
+    def report(self):
+        print("⏱️  Startup time:")
+        for name, seconds in self.steps:
+            print(f"   {name:<18} {seconds * 1000:8.1f}ms")
+        print(f"   {'total':<18} {(time.perf_counter() - _STARTED) * 1000:8.1f}ms")
+
+startup = StartupReport()
+
+def warm_start():
+    """Load settings and pay every cold-start cost before the first viewer command does"""
+    startup.timed('calibration', load_calibration)
+    try:
+        startup.timed('timing profiles', timings.load)
+    except Exception as e:
+        print(f"⚠️ Could not read timing profiles: {e}")
+    backend = startup.timed('input backend', use_input_backend)
+    startup.timed('backend warm-up', backend.position)
+    startup.timed('transform', transform.map_points, [(0.0, 0.0), (1.0, 1.0)])
+    diagonal = float(np.hypot(GAME_WINDOW['width'], GAME_WINDOW['height']))
+    startup.timed('motion paths', motion.warm, diagonal)
+    if VERIFY_CLICKS:
+        startup.timed('screen capture', get_capture)
+    startup.timed('socket.io import', sio._get)
+    startup.timed('msgpack import', lambda: acks.msgpack)
+    return backend
 
 def main():
-    """Main function"""
+    """Main function - run the client, returns a process exit code"""
     print("🚀 cow714 OSRS PC Client Starting...")
     print("=" * 50)
     
     # Check dependencies
     if not check_dependencies():
-        input("Press Enter to exit...")
-        return
+        return 1
     
     print(f"📡 Server: {SERVER_URL}")
+    log.configure(LOG_SINK_NAMES)
+    try:
+        backend = warm_start()
+    except Exception as e:
+        print(f"❌ Input backend '{INPUT_BACKEND}' unavailable: {e}")
+        return 1
+    print(f"⏲️  Timing profile: {timings.active}")
+    print(f"🖱️  Input backend: {backend.name}")
     print("⚙️  Game window settings:")
     print(f"   Position: ({GAME_WINDOW['x']}, {GAME_WINDOW['y']})")
     print(f"   Size: {GAME_WINDOW['width']}x{GAME_WINDOW['height']}")
     print()
     
-    # Check if server URL needs to be updated
-    if 'cow714-osrs-controller' not in SERVER_URL:
-        print("⚠️  WARNING: Please update SERVER_URL with your Heroku app name!")
-        print("   Edit this file and change the SERVER_URL to match your Heroku app")
-        response = input("   Continue anyway? (y/n): ")
-        if response.lower() != 'y':
-            return
-    
     print("🎮 Starting connection...")
     print("💡 Tips:")
     print("   - Make sure your OSRS client is positioned correctly")
     print("   - Run 'python pc_client.py mouse' to find coordinates")
     print("   - Run 'python pc_client.py test' to test inputs")
-    print("   - Move mouse to top-left corner to emergency stop")
+    print(f"   - Press {EMERGENCY_HOTKEY} (or move mouse to top-left corner) to emergency stop")
     print()
     
     try:
-        # Connect to server
+        # Input runs on its own thread so the socket never stalls
+        executor.start()
+        clock.start()
+        if os.path.exists(os.path.join(ANCHOR_DIR, 'anchors.json')):
+            try:
+                if start_anchor_tracking():
+                    print("⚓ Tracking the game window from UI anchors")
+            except Exception as e:
+                print(f"⚠️ Anchor tracking unavailable: {e}")
+        try:
+            emergency.start_hotkey()
+            print(f"🛑 Emergency stop hotkey: {EMERGENCY_HOTKEY} (press again to resume)")
+        except Exception as e:
+            print(f"⚠️ Emergency stop hotkey unavailable ({e}) - use the FAILSAFE corner")
+        start_metrics_reporter()
+        try:
+            if start_metrics_server():
+                print(f"📊 Metrics: http://127.0.0.1:{METRICS_PORT}/metrics")
+        except OSError as e:
+            print(f"⚠️ Metrics endpoint unavailable: {e}")
+        if JOURNAL_ENABLED:
+            try:
+                print(f"📼 Journaling commands to {start_journal().path}")
+            except OSError as e:
+                print(f"⚠️ Command journal unavailable: {e}")
+        startup.report()
+        
+        # Connect to server, and keep reconnecting until stopped
         print("🔌 Connecting to Heroku...")
-        sio.connect(SERVER_URL)
-        print("✅ Connected! Waiting for commands from viewers...")
         print("🎯 cow714's OSRS is now community controlled!")
-        
-        # Keep the client running
-        sio.wait()
+        connection.run(SERVER_URL)
         
     except KeyboardInterrupt:
         print("\n🛑 Stopped by user")
@@ -593,41 +4572,106 @@ def main():
         print("2. Check the SERVER_URL is correct")
         print("3. Verify your internet connection")
         print("4. Try: heroku logs --tail")
-        input("\nPress Enter to exit...")
+        return 1
+    return 0
+
+def parse_point(text):
+    """'x,y' relative point for argparse"""
+    try:
+        x, y = (float(v) for v in text.split(','))
+    except ValueError:
+        import argparse
+        raise argparse.ArgumentTypeError(f"expected x,y (e.g. 0.5,0.5), got '{text}'")
+    return x, y
+
+def build_parser():
+    import argparse
+    parser = argparse.ArgumentParser(prog='pc_client.py', description='🎮 cow714 OSRS PC Client')
+    parser.add_argument('--server', help=f'server URL (default {SERVER_URL})')
+    parser.add_argument('--backend', dest='input_backend',
+                        help=f'input backend for this run (default {INPUT_BACKEND})')
+    parser.add_argument('--log-level', choices=list(LOG_LEVELS), help=f'verbosity (default {LOG_LEVEL})')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.add_parser('run', help='Run the client (the default)')
+    commands.add_parser('warmup', help='Load and pre-warm everything, print the startup report')
+    commands.add_parser('test', help='Test commands')
+    commands.add_parser('mouse', help='Get mouse coordinates')
+    commands.add_parser('simple', help='Simple two-click calibration (recommended)')
+    calibrate = commands.add_parser('calibrate', help='Click-to-calibrate (corners + given rel points)')
+    calibrate.add_argument('points', nargs='*', type=parse_point, help='extra relative points x,y')
+    commands.add_parser('debug', help='Debug inventory clicking')
+    commands.add_parser('coords', help='Test coordinate accuracy')
+    commands.add_parser('backends', help='Measure input backend latency')
+    add_bench_arguments(commands.add_parser('bench', help='Offline benchmark against a local stand-in server'))
+    add_replay_arguments(commands.add_parser('replay', help='Replay a command journal'))
+    tune = commands.add_parser('tune', help='Self-tune delays against an object at rel x,y')
+    tune.add_argument('target', nargs='?', type=parse_point, default=(0.5, 0.5))
+    commands.add_parser('anchors', help='Record UI anchors for automatic window tracking')
+    commands.add_parser('help', help='Show this help')
+    return parser
+
+def cli_main(argv=None):
+    """Parse the command line and run the chosen subcommand, returns an exit code"""
+    global SERVER_URL, INPUT_BACKEND
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.server:
+        SERVER_URL = args.server
+    if args.input_backend:
+        INPUT_BACKEND = args.input_backend
+    if args.log_level:
+        log.set_level(args.log_level)
+    
+    command = args.command or 'run'
+    if command == 'run':
+        return main()
+    elif command == 'warmup':
+        print("🔥 Pre-warming...")
+        backend = warm_start()
+        print(f"🖱️  Input backend: {backend.name}")
+        startup.report()
+    elif command == 'test':
+        print("🧪 Testing mode...")
+        test_commands()
+    elif command == 'mouse':
+        print("🖱️  Mouse coordinate finder...")
+        get_mouse_position()
+    elif command == 'simple':
+        print("🎯 Starting simple calibration...")
+        simple_calibrate()
+    elif command == 'calibrate':
+        print("🎯 Starting coordinate calibration...")
+        extra = [(f"Point at {x:g},{y:g}", (x, y)) for x, y in args.points]
+        calibrate_coordinates(CALIBRATION_POINTS[:4] + extra if extra else None)
+    elif command == 'debug':
+        print("🔍 Debug click positions...")
+        load_calibration()
+        debug_click_position()
+    elif command == 'coords':
+        print("🎯 Testing coordinate accuracy...")
+        load_calibration()
+        test_coordinate_accuracy()
+    elif command == 'backends':
+        print("⏱️  Input backend latency...")
+        report_backends()
+    elif command == 'anchors':
+        print("⚓ Recording UI anchor templates...")
+        load_calibration()
+        record_anchor_templates()
+    elif command == 'tune':
+        print("🎛️  Self-tuning input delays...")
+        load_calibration()
+        timings.load()
+        if not tune_timings(args.target):
+            return 1
+    elif command == 'replay':
+        return replay_main(args)
+    elif command == 'bench':
+        print("🏁 Offline benchmark...")
+        return bench_main(args)
+    elif command == 'help':
+        parser.print_help()
+    return 0
 
 if __name__ == '__main__':
-    # Check for command line arguments
-    if len(sys.argv) > 1:
-        if sys.argv[1] == 'test':
-            print("🧪 Testing mode...")
-            test_commands()
-        elif sys.argv[1] == 'mouse':
-            print("🖱️  Mouse coordinate finder...")
-            get_mouse_position()
-        elif sys.argv[1] == 'simple':
-            print("🎯 Starting simple calibration...")
-            simple_calibrate()
-        elif sys.argv[1] == 'calibrate':
-            print("🎯 Starting coordinate calibration...")
-            calibrate_coordinates()
-        elif sys.argv[1] == 'debug':
-            print("🔍 Debug click positions...")
-            debug_click_position()
-        elif sys.argv[1] == 'coords':
-            print("🎯 Testing coordinate accuracy...")
-            test_coordinate_accuracy()
-        elif sys.argv[1] == 'help':
-            print("🎮 cow714 OSRS PC Client")
-            print("Usage:")
-            print("  python pc_client.py        - Run the client")
-            print("  python pc_client.py test   - Test commands")
-            print("  python pc_client.py mouse  - Get mouse coordinates")
-            print("  python pc_client.py simple    - Simple calibration (recommended)")
-            print("  python pc_client.py calibrate - Interactive coordinate calibration")
-            print("  python pc_client.py debug   - Debug inventory clicking")
-            print("  python pc_client.py coords  - Test coordinate accuracy")
-            print("  python pc_client.py help   - Show this help")
-        else:
-            print("❌ Unknown command. Use 'help' for usage.")
-    else:
-        main()
+    sys.exit(cli_main())
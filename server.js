@@ -5,6 +5,14 @@ const socketIo = require('socket.io');
 const cors = require('cors');
 const path = require('path');
 
+// Optional: compact binary commands/acks for PC clients that support msgpack
+let msgpack = null;
+try {
+    msgpack = require('@msgpack/msgpack');
+} catch (error) {
+    console.log('ℹ️  @msgpack/msgpack not installed, PC clients will use JSON');
+}
+
 const app = express();
 const server = http.createServer(app);
 const io = socketIo(server, {
@@ -24,12 +32,40 @@ app.use(express.static('public'));
 const PORT = process.env.PORT || 3000;
 const RATE_LIMIT = 1000; // 1 second between commands per user
 const MAX_QUEUE_SIZE = 10;
+const ADMIN_TOKEN = process.env.ADMIN_TOKEN || null; // Unset = admin endpoints disabled
+// Actions viewers may not send: they come from the server/admin only
+const SERVER_ONLY_ACTIONS = ['define_macro', 'emergency_stop'];
+// Clicks queued back to back go out together for one credit, so the PC can vote on the burst
+const CLICK_ACTIONS = ['direct_click', 'stream_click'];
+const MAX_CLICK_BURST = 16;
 
 // State management
 const connectedUsers = new Map();
 const pcClients = new Set();
 const commandQueue = [];
 let userCommandTimes = new Map();
+let pcMetrics = null; // Latest client_metrics summary from the PC
+const pcCredits = new Map(); // PC socket id -> execution credits (null = no flow control)
+const pcEncodings = new Map(); // PC socket id -> 'msgpack' | 'json'
+const inFlight = new Map(); // Command id -> command, so compact PC acks can be expanded
+const MAX_IN_FLIGHT = 1000;
+const pcPending = new Map(); // PC socket id -> Set of command ids sent but not acked yet
+const orphaned = new Map(); // Command id -> command, unacked when its PC dropped
+const pcInstances = new Map(); // PC process instance id -> socket id currently serving it
+const replacedPcs = new Set(); // Old socket ids a reconnected PC instance took over
+const pcLogs = []; // Recent warning/error records forwarded by PC clients
+const MAX_PC_LOGS = 200;
+const macroDefinitions = new Map(); // Macro name -> steps, re-sent to PCs that (re)register
+const pcMacros = new Map(); // Macro name -> latest macro_defined reply from a PC
+
+// Unique command ids (PC clients drop re-deliveries of an id they have seen)
+const SERVER_INSTANCE = Date.now().toString(36);
+let commandCounter = 0;
+
+function nextCommandId() {
+    commandCounter++;
+    return `${SERVER_INSTANCE}-${commandCounter}`;
+}
 
 // Rate limiting function
 function isRateLimited(userId) {
@@ -44,8 +80,22 @@ function isRateLimited(userId) {
     return false;
 }
 
-// Execute command on PC (send to connected PC clients)
-function executeCommand(command) {
+// Admin endpoints need the X-Admin-Token header to match ADMIN_TOKEN
+function requireAdmin(req, res, next) {
+    if (!ADMIN_TOKEN) {
+        res.status(403).json({ error: 'Set ADMIN_TOKEN to enable admin endpoints' });
+        return;
+    }
+    if (req.get('X-Admin-Token') !== ADMIN_TOKEN) {
+        res.status(401).json({ error: 'Invalid admin token' });
+        return;
+    }
+    next();
+}
+
+// Execute command on PC (send to connected PC clients); uncredited commands
+// are marked credit: false so the PC does not count them against its credits
+function executeCommand(command, targets = pcClients, credited = true) {
     try {
         console.log('Sending command to PC clients:', command);
         
@@ -54,9 +104,25 @@ function executeCommand(command) {
             return;
         }
         
-        // Send command to all connected PC clients
-        pcClients.forEach(pcId => {
-            io.to(pcId).emit('execute_command', command);
+        // Remember it so acks that only carry the id can be matched up
+        if (command.id) {
+            inFlight.set(command.id, command);
+            if (inFlight.size > MAX_IN_FLIGHT) {
+                inFlight.delete(inFlight.keys().next().value);
+            }
+        }
+        
+        // Send command to the target PC clients (all of them by default)
+        const message = credited ? command : { ...command, credit: false };
+        targets.forEach(pcId => {
+            if (command.id && pcPending.has(pcId)) {
+                pcPending.get(pcId).add(command.id);
+            }
+            if (pcEncodings.get(pcId) === 'msgpack') {
+                io.to(pcId).emit('execute_command_packed', Buffer.from(msgpack.encode(message)));
+            } else {
+                io.to(pcId).emit('execute_command', message);
+            }
         });
         
     } catch (error) {
@@ -64,18 +130,134 @@ function executeCommand(command) {
     }
 }
 
+function broadcastExecuted(command) {
+    io.emit('command_executed', {
+        command: command,
+        queueLength: commandQueue.length,
+        timestamp: Date.now()
+    });
+}
+
+// PCs that advertise credits get commands as soon as they have capacity;
+// older PCs without credits stay on the fixed 500ms tick
+function usesCredits() {
+    return Array.from(pcCredits.values()).some(credits => credits !== null);
+}
+
+function addCredits(pcId, credits) {
+    if (typeof credits !== 'number' || !pcCredits.has(pcId)) {
+        return;
+    }
+    pcCredits.set(pcId, (pcCredits.get(pcId) || 0) + credits);
+    dispatchWithCredits();
+}
+
+function dispatchWithCredits() {
+    while (commandQueue.length > 0) {
+        const targets = Array.from(pcClients).filter(pcId => pcCredits.get(pcId) > 0);
+        if (targets.length === 0) {
+            return;
+        }
+        const command = commandQueue.shift();
+        targets.forEach(pcId => pcCredits.set(pcId, pcCredits.get(pcId) - 1));
+        executeCommand(command, targets);
+        broadcastExecuted(command);
+        if (!CLICK_ACTIONS.includes(command.action)) {
+            continue;
+        }
+        // The clicks queued right behind it ride along on the same credit
+        let burst = 1;
+        while (burst < MAX_CLICK_BURST && commandQueue.length > 0 && CLICK_ACTIONS.includes(commandQueue[0].action)) {
+            const click = commandQueue.shift();
+            executeCommand(click, targets, false);
+            broadcastExecuted(click);
+            burst++;
+        }
+    }
+}
+
+// A (re-)registering PC says which commands it is still running and which it
+// finished while disconnected; anything else it was sent never arrived, so
+// it goes back to the front of the queue (no pcId: requeue everything)
+function resumeOrphaned(pcId, resume) {
+    const running = new Set(resume.inFlight || []);
+    const done = new Set(resume.completed || []);
+    const requeue = [];
+    orphaned.forEach((command, id) => {
+        if (pcId && running.has(id)) {
+            pcPending.get(pcId).add(id);
+        } else if (!done.has(id)) {
+            requeue.push(command);
+        }
+    });
+    orphaned.clear();
+    if (requeue.length > 0) {
+        console.log(`🔁 Re-queueing ${requeue.length} commands lost in the disconnect`);
+        commandQueue.unshift(...requeue);
+    }
+}
+
+// Forget a PC socket; whatever it never acked becomes orphaned
+function releasePc(pcId) {
+    pcClients.delete(pcId);
+    pcCredits.delete(pcId);
+    pcEncodings.delete(pcId);
+    (pcPending.get(pcId) || new Set()).forEach(id => {
+        if (inFlight.has(id)) {
+            orphaned.set(id, inFlight.get(id));
+        }
+    });
+    pcPending.delete(pcId);
+    pcInstances.forEach((socketId, instance) => {
+        if (socketId === pcId) {
+            pcInstances.delete(instance);
+        }
+    });
+}
+
+// Orphaned commands with no PC left to claim them go back to the front of the queue
+function requeueOrphaned() {
+    resumeOrphaned(null, {});
+    dispatchWithCredits();
+}
+
+// Compact PC acks carry only the command id, put the command back for viewers
+function expandAck(ack) {
+    if (ack.command || !ack.id) {
+        return ack;
+    }
+    return { ...ack, command: inFlight.get(ack.id) || { id: ack.id } };
+}
+
+function acceptCommand(pcId, ack) {
+    addCredits(pcId, ack.credits);
+    io.emit('command_status', expandAck(ack));
+}
+
+function completeCommand(pcId, ack) {
+    const status = expandAck(ack);
+    if (ack.id) {
+        inFlight.delete(ack.id);
+        orphaned.delete(ack.id);
+        if (pcPending.has(pcId)) {
+            pcPending.get(pcId).delete(ack.id);
+        }
+    }
+    addCredits(pcId, ack.credits);
+    io.emit('command_status', status);
+}
+
 // Process command queue
 function processCommandQueue() {
+    if (usesCredits()) {
+        return; // Credit-driven dispatch handles it
+    }
     if (commandQueue.length > 0) {
         const command = commandQueue.shift();
         executeCommand(command);
         
         // Broadcast command execution to all clients
-        io.emit('command_executed', {
-            command: command,
-            queueLength: commandQueue.length,
-            timestamp: Date.now()
-        });
+        broadcastExecuted(command);
     }
 }
 
@@ -94,20 +276,89 @@ io.on('connection', (socket) => {
     console.log(`User connected: ${userId} (Total: ${connectedUsers.size})`);
     
     // Handle PC client registration
-    socket.on('register_pc', () => {
+    socket.on('register_pc', (data) => {
+        // A PC that noticed a dead link before we did comes back on a new
+        // socket: take over the old socket's unacked commands right away
+        const instance = data && data.instance;
+        const previous = instance ? pcInstances.get(instance) : null;
+        if (previous && previous !== socket.id) {
+            console.log(`🖥️  PC instance ${instance} moved from ${previous} to ${socket.id}`);
+            releasePc(previous);
+            replacedPcs.add(previous);
+            const stale = io.sockets.sockets.get(previous);
+            if (stale) {
+                stale.disconnect(true);
+            }
+        }
+        if (instance) {
+            pcInstances.set(instance, socket.id);
+        }
         pcClients.add(socket.id);
-        console.log(`🖥️  PC client registered: ${socket.id} (Total PC clients: ${pcClients.size})`);
+        const credits = data && typeof data.credits === 'number' ? data.credits : null;
+        pcCredits.set(socket.id, credits);
+        const encodings = (data && data.encodings) || [];
+        const encoding = msgpack && encodings.includes('msgpack') ? 'msgpack' : 'json';
+        pcEncodings.set(socket.id, encoding);
+        pcPending.set(socket.id, new Set());
+        resumeOrphaned(socket.id, (data && data.resume) || {});
+        console.log(`🖥️  PC client registered: ${socket.id} (Total PC clients: ${pcClients.size}, credits: ${credits})`);
         
         // Remove from regular users if it was there
         connectedUsers.delete(socket.id);
         
-        socket.emit('pc_registered', { status: 'success' });
+        socket.emit('pc_registered', {
+            status: 'success',
+            encoding: encoding,
+            batchAcks: Boolean(data && data.batchAcks)
+        });
+        macroDefinitions.forEach(macro => socket.emit('define_macro', macro));
+        dispatchWithCredits();
     });
     
+    // PC acks right away when a command is queued, completion follows later
+    socket.on('command_accepted', (data) => {
+        acceptCommand(socket.id, data);
+    });
+
+    // PC running / emergency-stopped state
+    socket.on('client_state', (data) => {
+        console.log(`🖥️  PC ${socket.id} state: ${data.state}`, data);
+        io.emit('pc_state', { ...data, pcId: socket.id });
+    });
+
+    // Structured log records forwarded by the PC client
+    socket.on('client_log', (data) => {
+        ((data && data.records) || []).forEach(record => {
+            pcLogs.push({ ...record, pcId: socket.id });
+        });
+        pcLogs.splice(0, Math.max(0, pcLogs.length - MAX_PC_LOGS));
+    });
+
+    // Reply to a server-defined macro
+    socket.on('macro_defined', (data) => {
+        console.log(`📜 PC ${socket.id} macro '${data.name}': ${data.status}`, data);
+        if (data && data.name) {
+            pcMacros.set(data.name, { ...data, pcId: socket.id, definedAt: Date.now() });
+        }
+    });
+
+    // Periodic latency summary from the PC client
+    socket.on('client_metrics', (data) => {
+        pcMetrics = { ...data, pcId: socket.id, receivedAt: Date.now() };
+    });
+
     // Handle command completion from PC
     socket.on('command_completed', (data) => {
         console.log('✅ Command completed on PC:', data);
-        io.emit('command_status', data);
+        completeCommand(socket.id, data);
+    });
+    
+    // Batched (optionally msgpack-encoded) acks from PCs that negotiated them
+    socket.on('commands_completed', (payload) => {
+        const batch = Buffer.isBuffer(payload) && msgpack ? msgpack.decode(payload) : payload;
+        // Accepted before completed: a command can be both in one batch
+        ((batch && batch.accepted) || []).forEach(ack => acceptCommand(socket.id, ack));
+        ((batch && batch.acks) || []).forEach(ack => completeCommand(socket.id, ack));
     });
     
     // Send current stats to new user
@@ -137,6 +388,10 @@ io.on('connection', (socket) => {
                 socket.emit('error', { message: 'Invalid command format' });
                 return;
             }
+            if (SERVER_ONLY_ACTIONS.includes(data.action)) {
+                socket.emit('error', { message: `${data.action} is not available to viewers` });
+                return;
+            }
             
             // Check queue size
             if (commandQueue.length >= MAX_QUEUE_SIZE) {
@@ -148,6 +403,7 @@ io.on('connection', (socket) => {
             
             // Add command to queue
             const command = {
+                id: nextCommandId(),
                 userId: userId,
                 action: data.action,
                 data: data.data || {},
@@ -179,6 +435,9 @@ io.on('connection', (socket) => {
                 }
             });
             
+            // Send it straight away if a PC has credits to spare
+            dispatchWithCredits();
+            
         } catch (error) {
             console.error('Error processing command:', error);
             socket.emit('error', { message: 'Failed to process command' });
@@ -188,9 +447,16 @@ io.on('connection', (socket) => {
     // Handle disconnection
     socket.on('disconnect', () => {
         // Check if it was a PC client
-        if (pcClients.has(socket.id)) {
-            pcClients.delete(socket.id);
+        if (replacedPcs.delete(socket.id)) {
+            console.log(`🖥️  Replaced PC socket closed: ${socket.id}`);
+        } else if (pcClients.has(socket.id)) {
+            // Whatever it never acked waits for it to come back...
+            releasePc(socket.id);
             console.log(`🖥️  PC client disconnected: ${socket.id} (Total PC clients: ${pcClients.size})`);
+            // ...unless another PC is here to run it now
+            if (pcClients.size > 0) {
+                requeueOrphaned();
+            }
         } else {
             // Regular user disconnect
             connectedUsers.delete(userId);
@@ -229,6 +495,60 @@ app.get('/api/queue', (req, res) => {
     });
 });
 
+app.get('/api/pc_metrics', (req, res) => {
+    res.json(pcMetrics || { status: 'no metrics reported yet' });
+});
+
+// PC warnings can carry window titles and paths, admins only
+app.get('/api/pc_logs', requireAdmin, (req, res) => {
+    res.json({ records: pcLogs });
+});
+
+// Change PC client log verbosity at runtime: { "level": "debug" }
+app.post('/api/pc_log_level', requireAdmin, (req, res) => {
+    const level = req.body && req.body.level;
+    if (!['debug', 'info', 'warning', 'error'].includes(level)) {
+        res.status(400).json({ error: 'level must be debug, info, warning or error' });
+        return;
+    }
+    pcClients.forEach(pcId => io.to(pcId).emit('set_log_level', { level }));
+    res.json({ status: 'sent', level, pcClients: pcClients.size });
+});
+
+// Macros are defined by the server only: { "name": "bank", "steps": [...] }
+// Viewers run them with { action: 'run_macro', data: { id } }
+app.get('/api/macros', (req, res) => {
+    res.json({ macros: Array.from(pcMacros.values()) });
+});
+
+app.post('/api/macros', requireAdmin, (req, res) => {
+    const macro = req.body || {};
+    if (!macro.name || !Array.isArray(macro.steps)) {
+        res.status(400).json({ error: 'macro needs a name and a steps array' });
+        return;
+    }
+    macroDefinitions.set(macro.name, { name: macro.name, steps: macro.steps });
+    pcClients.forEach(pcId => io.to(pcId).emit('define_macro', macro));
+    res.json({ status: 'sent', name: macro.name, pcClients: pcClients.size });
+});
+
+// Cancel whatever the PCs are running and flush their queues, ahead of the queue
+app.post('/api/emergency_stop', requireAdmin, (req, res) => {
+    const flushed = commandQueue.length;
+    commandQueue.length = 0;
+    // Sent past the credit queue, so it does not cost the PCs a credit either
+    executeCommand({
+        id: nextCommandId(),
+        userId: 'admin',
+        source: 'admin',
+        action: 'emergency_stop',
+        data: {},
+        timestamp: Date.now()
+    }, pcClients, false);
+    console.log(`🛑 Emergency stop sent by admin (flushed ${flushed} queued commands)`);
+    res.json({ status: 'sent', flushed, pcClients: pcClients.size });
+});
+
 // Health check endpoint
 app.get('/health', (req, res) => {
     res.json({ 
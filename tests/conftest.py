@@ -0,0 +1,30 @@
+import os
+import sys
+
+# Headless and isolated from the developer's own config, before pc_client is imported
+os.environ['OSRS_INPUT_BACKEND'] = 'null'
+os.environ['OSRS_CAPTURE_SOURCE'] = 'synthetic'
+os.environ['OSRS_CONFIG'] = os.path.join(os.path.dirname(__file__), 'no-such-config.json')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def recording(monkeypatch):
+    """Route input through a RecordingBackend for the test, returns it"""
+    import pc_client
+    backend = pc_client.RecordingBackend()
+    monkeypatch.setattr(pc_client, 'input_backend', backend)
+    return backend
+
+
+@pytest.fixture
+def reports(monkeypatch):
+    """Collect (command id, status, error, extra) for every report_command call"""
+    import pc_client
+    collected = []
+    monkeypatch.setattr(pc_client, 'report_command', lambda job, status, error=None, **extra:
+                        collected.append((job.id, status, error, extra)))
+    return collected
@@ -0,0 +1,124 @@
+import pytest
+
+import pc_client
+from pc_client import AckChannel
+
+
+class FakeSocket:
+    """Stands in for the Socket.IO client, keeps (event, data) for every emit"""
+    
+    def __init__(self):
+        self.connected = True
+        self.emitted = []
+    
+    def emit(self, event, data=None):
+        if not self.connected:
+            raise ConnectionError('not connected')
+        self.emitted.append((event, data))
+
+
+@pytest.fixture
+def socket(monkeypatch):
+    fake = FakeSocket()
+    monkeypatch.setattr(pc_client, 'sio', fake)
+    return fake
+
+
+def completed(command_id, status='success', **extra):
+    return {'command': {'id': command_id, 'action': 'direct_click'}, 'status': status, **extra}
+
+
+def batched(encoding='json'):
+    channel = AckChannel()
+    channel.batch = True
+    channel.encoding = encoding
+    return channel
+
+
+def test_compact_swaps_the_command_for_its_id():
+    channel = batched()
+    assert channel.compact(completed('c-1', credits=2)) == {'status': 'success', 'credits': 2, 'id': 'c-1'}
+    # No id to refer to, or an old server: the command goes back whole
+    assert channel.compact({'command': {'action': 'key_press'}, 'status': 'success'})['command'] == {'action': 'key_press'}
+    channel.batch = False
+    assert channel.compact(completed('c-1')) == completed('c-1')
+
+
+def test_legacy_server_gets_one_event_per_ack(socket):
+    channel = AckChannel()
+    channel.accept(completed('c-1', 'accepted'))
+    channel.send(completed('c-1'))
+    assert [event for event, _ in socket.emitted] == ['command_accepted', 'command_completed']
+    assert socket.emitted[1][1] == completed('c-1')
+
+
+def test_batched_acks_go_out_together_on_flush(socket):
+    channel = batched()
+    channel.accept(completed('c-1', 'accepted'))
+    channel.send(completed('c-1'))
+    channel.send(completed('c-2', 'error', error='boom'))
+    assert socket.emitted == []
+    
+    channel.flush()
+    assert socket.emitted == [('commands_completed', {
+        'acks': [{'status': 'success', 'id': 'c-1'}, {'status': 'error', 'error': 'boom', 'id': 'c-2'}],
+        'accepted': [{'status': 'accepted', 'id': 'c-1'}],
+    })]
+    channel.flush()  # Nothing left, nothing sent
+    assert len(socket.emitted) == 1
+
+
+def test_a_full_batch_flushes_without_waiting(socket):
+    channel = batched()
+    for n in range(pc_client.ACK_BATCH_MAX):
+        channel.send(completed(f'c-{n}'))
+    assert len(socket.emitted) == 1
+    assert len(socket.emitted[0][1]['acks']) == pc_client.ACK_BATCH_MAX
+
+
+def test_msgpack_batches_round_trip(socket):
+    pytest.importorskip('msgpack')
+    channel = batched('msgpack')
+    channel.send(completed('c-1', netMove=[0, 150]))
+    channel.flush()
+    event, blob = socket.emitted[0]
+    assert event == 'commands_completed' and isinstance(blob, bytes)
+    assert channel.decode(blob) == {'acks': [{'status': 'success', 'netMove': [0, 150], 'id': 'c-1'}]}
+
+
+def test_acks_made_offline_are_resent_without_their_old_credits(socket):
+    channel = AckChannel()
+    socket.connected = False
+    channel.send(completed('c-1', credits=3))
+    channel.accept(completed('c-2', 'accepted'))  # Progress only, not held
+    assert list(channel.offline) == [completed('c-1', credits=3)]
+    
+    socket.connected = True
+    channel.negotiate({'status': 'success'})
+    assert socket.emitted == [('command_completed', completed('c-1', credits=0))]
+    assert not channel.offline
+
+
+def test_acks_lost_mid_send_wait_for_the_reconnect(socket, monkeypatch):
+    channel = AckChannel()
+    monkeypatch.setattr(socket, 'emit', lambda event, data=None: (_ for _ in ()).throw(ConnectionError('reset')))
+    channel.send(completed('c-1'))
+    assert list(channel.offline) == [completed('c-1')]
+
+
+def test_unconfirmed_acks_are_requeued_in_order(socket, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(pc_client.time, 'time', lambda: now[0])
+    monkeypatch.setattr(pc_client.clock, 'confirmed_until', 0.0)
+    channel = AckChannel()
+    for n in range(3):
+        channel.send(completed(f'c-{n}'))
+        now[0] += 1
+    
+    # A pong confirmed everything up to c-0, the link died after that
+    assert channel.requeue_unconfirmed(1000.5) == 2
+    assert [payload['command']['id'] for payload in channel.offline] == ['c-1', 'c-2']
+    assert not channel.sent
+    
+    channel.resend()
+    assert [data['command']['id'] for _, data in socket.emitted] == ['c-0', 'c-1', 'c-2', 'c-1', 'c-2']
@@ -0,0 +1,48 @@
+import numpy as np
+
+from pc_client import AnchorLocator, downscale, match_template_ncc
+
+
+def smooth_image(height, width, seed=0):
+    """Blocky noise - survives downscaling the way real UI art does"""
+    rng = np.random.default_rng(seed)
+    blocks = rng.uniform(0, 255, size=(height // 8 + 1, width // 8 + 1))
+    return np.kron(blocks, np.ones((8, 8)))[:height, :width]
+
+
+def test_ncc_peaks_where_the_template_was_cut():
+    image = smooth_image(120, 200)
+    template = image[40:72, 96:144].copy()
+    scores = match_template_ncc(image, template)
+    assert scores.shape == (120 - 32 + 1, 200 - 48 + 1)
+    assert np.unravel_index(np.argmax(scores), scores.shape) == (40, 96)
+    assert scores.max() > 0.99
+
+
+def test_ncc_ignores_brightness_and_contrast():
+    image = smooth_image(96, 96, seed=1)
+    template = image[16:48, 32:64] * 0.5 + 20
+    scores = match_template_ncc(image, template)
+    assert np.unravel_index(np.argmax(scores), scores.shape) == (16, 32)
+
+
+def test_downscale_block_means():
+    gray = np.arange(16, dtype=np.float64).reshape(4, 4)
+    np.testing.assert_allclose(downscale(gray, 2), [[2.5, 4.5], [10.5, 12.5]])
+
+
+def two_anchor_locator(rel_a, rel_b):
+    locator = AnchorLocator.__new__(AnchorLocator)  # No templates on disk needed for fit()
+    locator.anchors = {'a': {'rel': rel_a}, 'b': {'rel': rel_b}}
+    return locator
+
+
+def test_two_anchor_fit():
+    locator = two_anchor_locator((0.1, 0.2), (0.9, 0.8))
+    fitted = locator.fit({'a': (200, 250, 1.0), 'b': (1800, 850, 1.0)})
+    assert fitted.map_point(0.5, 0.5) == (1000.0, 550.0)
+
+
+def test_two_anchor_fit_refuses_a_missing_axis():
+    locator = two_anchor_locator((0.1, 0.5), (0.9, 0.5))
+    assert locator.fit({'a': (200, 500, 1.0), 'b': (1800, 500, 1.0)}) is None
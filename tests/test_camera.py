@@ -0,0 +1,33 @@
+import pc_client
+from pc_client import CAMERA_STEP_PIXELS, CommandExecutor, CommandJob
+
+
+def press(command_id, key):
+    return CommandJob({'id': command_id, 'action': 'key_press', 'data': {'key': key}})
+
+
+def test_camera_presses_coalesce_into_one_net_drag(monkeypatch, reports):
+    drags = []
+    monkeypatch.setattr(pc_client, 'execute_camera_move', lambda dx, dy: drags.append((dx, dy)) or True)
+    executor = CommandExecutor()
+    for command_id, key in (('b', 'left'), ('c', 'right'), ('d', 'up'), ('e', 'sideways')):
+        executor.queue.put_nowait(press(command_id, key))
+    executor.queue.put_nowait(CommandJob({'id': 'f', 'action': 'direct_click'}))
+    
+    executor._execute_camera(press('a', 'left'))
+    
+    assert drags == [(-CAMERA_STEP_PIXELS, -CAMERA_STEP_PIXELS)]
+    statuses = {command_id: status for command_id, status, _, _ in reports}
+    assert statuses == {'a': 'success', 'b': 'success', 'c': 'success', 'd': 'success', 'e': 'error'}
+    assert all(extra.get('merged') == 4 for command_id, _, _, extra in reports if command_id != 'e')
+    assert executor.pending() == 1  # The click is left alone
+
+
+def test_net_drag_is_capped(monkeypatch, reports):
+    drags = []
+    monkeypatch.setattr(pc_client, 'execute_camera_move', lambda dx, dy: drags.append((dx, dy)) or True)
+    executor = CommandExecutor()
+    for n in range(20):
+        executor.queue.put_nowait(press(f'r{n}', 'right'))
+    executor._execute_camera(press('r', 'right'))
+    assert drags == [(pc_client.CAMERA_MAX_DRAG, 0)]
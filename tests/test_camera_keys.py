@@ -0,0 +1,46 @@
+import time
+
+import pc_client
+from pc_client import CameraController
+
+
+def key_events(backend):
+    return [(op, args[0]) for _, op, args in backend.events if op in ('key_down', 'key_up')]
+
+
+def test_timed_hold_is_released_by_the_timer(recording):
+    camera = CameraController()
+    camera.start(['left'], 0.05)
+    assert camera.held() == ['left']
+    time.sleep(0.3)
+    assert camera.held() == []
+    assert key_events(recording) == [('key_down', 'left'), ('key_up', 'left')]
+
+
+def test_opposite_direction_replaces_the_held_one(recording):
+    camera = CameraController()
+    camera.start(['left'], 1.0)
+    camera.start(['right', 'up'], 1.0)
+    assert camera.held() == ['right', 'up']
+    camera.stop()
+    assert camera.held() == []
+    assert key_events(recording) == [('key_down', 'left'), ('key_up', 'left'), ('key_down', 'right'),
+                                     ('key_down', 'up'), ('key_up', 'right'), ('key_up', 'up')]
+
+
+def test_hold_vector_holds_each_axis_for_its_distance(recording):
+    camera = CameraController()
+    holds = camera.hold_vector(2 * pc_client.CAMERA_STEP_PIXELS, -pc_client.CAMERA_STEP_PIXELS)
+    assert holds == {'right': 2 * pc_client.CAMERA_KEY_SECONDS_PER_STEP,
+                     'up': pc_client.CAMERA_KEY_SECONDS_PER_STEP}
+    camera.stop()
+
+
+def test_camera_start_focuses_the_game_first(recording, monkeypatch):
+    calls = []
+    monkeypatch.setattr(pc_client, 'focus_osrs_window', lambda: calls.append('focus') or False)
+    monkeypatch.setattr(pc_client.camera, 'start', lambda directions, duration=None: calls.append('start'))
+    assert pc_client.dispatch_command({'action': 'camera_start', 'data': {'direction': 'left'}}) == (True, None)
+    assert pc_client.dispatch_command({'action': 'camera_hold',
+                                       'data': {'direction': 'up', 'duration': 0.5}}) == (True, None)
+    assert calls == ['focus', 'start', 'focus', 'start']
@@ -0,0 +1,62 @@
+import tracemalloc
+
+import pytest
+
+import pc_client
+from pc_client import ClickVerifier, RegionCapture, SyntheticFrameSource
+
+
+@pytest.fixture
+def screen(monkeypatch):
+    source = SyntheticFrameSource(640, 480)
+    source.canvas[:] = (60, 110, 70)  # Grass
+    monkeypatch.setattr(pc_client, 'capture', RegionCapture(source))
+    monkeypatch.setattr(pc_client, 'VERIFY_CLICKS', True)
+    return source.canvas
+
+
+def paint_cross(canvas, x, y, bgr):
+    canvas[y - 6:y + 7, x - 1:x + 2] = bgr
+    canvas[y - 1:y + 2, x - 6:x + 7] = bgr
+
+
+@pytest.mark.parametrize('bgr', [(20, 20, 230), (20, 230, 230)], ids=['red', 'yellow'])
+def test_click_cross_verifies(screen, bgr):
+    verifier = ClickVerifier()
+    verifier.before(320, 240)
+    paint_cross(screen, 320, 240, bgr)
+    assert verifier.after('direct_click') == 'verified'
+
+
+def test_nothing_drawn_is_a_miss(screen):
+    verifier = ClickVerifier()
+    verifier.before(320, 240)
+    assert verifier.after('direct_click') == 'missed'
+
+
+def test_context_menu_verifies_a_right_click(screen):
+    verifier = ClickVerifier()
+    verifier.before(320, 240)
+    screen[200:300, 300:400] = (40, 50, 60)  # Menu box over the target
+    assert verifier.after('right_click') == 'verified'
+    verifier.before(320, 240)
+    assert verifier.after('right_click') == 'missed'
+
+
+def test_compare_reuses_its_buffers(screen):
+    region = pc_client.capture
+    box = (300, 220, 48, 48)
+    region.grab(box, 'before')
+    paint_cross(screen, 320, 240, (20, 20, 230))
+    region.grab(box, 'after')
+    region.compare(box)
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        for _ in range(50):
+            changed, red, yellow = region.compare(box)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert red > 0 and yellow == 0
+    assert peak - baseline < 48 * 48  # Never even one region-sized temporary
@@ -0,0 +1,97 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import pc_client
+from pc_client import CommandExecutor, CommandJob, CreditFlow, consensus_point
+
+ids = itertools.count()
+
+
+def test_consensus_point_picks_densest_cluster():
+    points = [(0.1, 0.1), (0.5, 0.5), (0.51, 0.5), (0.52, 0.51), (0.9, 0.1)]
+    (x, y), members = consensus_point(points)
+    assert members.tolist() == [False, True, True, True, False]
+    assert (x, y) == pytest.approx(np.mean(points[1:4], axis=0))
+
+
+def test_consensus_tie_goes_to_earliest_click():
+    (x, y), members = consensus_point([(0.8, 0.8), (0.2, 0.2)])
+    assert members.tolist() == [True, False]
+    assert (x, y) == pytest.approx((0.8, 0.8))
+
+
+@pytest.fixture
+def dispatched(monkeypatch):
+    """Run the consensus path without input, collecting dispatched commands"""
+    commands = []
+    monkeypatch.setattr(pc_client, 'dispatch_command', lambda command: commands.append(command) or (True, None))
+    return commands
+
+
+def click(x, y, received=None, **fields):
+    job = CommandJob({'id': f'consensus-{next(ids)}', 'action': 'direct_click', 'data': {'x': x, 'y': y}, **fields})
+    if received is not None:
+        job.marks['receive'] = received
+    return job
+
+
+def test_consensus_only_takes_the_burst(dispatched, reports):
+    executor = CommandExecutor()
+    now = pc_client.time.time() - 5  # Window long over, no waiting
+    first = click(0.5, 0.5, now)
+    second = click(0.51, 0.5, now + 0.01)
+    executor.queue.put_nowait(second)
+    executor.queue.put_nowait(click(0.9, 0.9, now + 1.0))  # Queued later, not in the vote
+    
+    executor._execute_consensus(first)
+    
+    assert len(dispatched) == 1
+    assert dispatched[0]['data']['x'] == pytest.approx(0.505)
+    assert [(command_id, status) for command_id, status, _, _ in reports] == [(first.id, 'success'), (second.id, 'success')]
+    assert reports[0][3]['clusterSize'] == 2
+    assert executor.pending() == 1
+
+
+def test_consensus_without_agreement_runs_every_click(dispatched, reports):
+    executor = CommandExecutor()
+    now = pc_client.time.time() - 5
+    executor.queue.put_nowait(click(0.9, 0.9, now + 0.01))
+    
+    executor._execute_consensus(click(0.1, 0.1, now))
+    
+    assert [(command['data']['x'], command['data']['y']) for command in dispatched] == [(0.1, 0.1), (0.9, 0.9)]
+    assert [status for _, status, _, _ in reports] == ['success', 'success']
+
+
+def test_a_click_burst_on_one_credit_is_voted_on_and_repays_one_credit(dispatched, monkeypatch):
+    flow = CreditFlow()
+    executor = CommandExecutor()
+    sent = []
+    monkeypatch.setattr(pc_client, 'flow', flow)
+    monkeypatch.setattr(pc_client, 'executor', executor)
+    monkeypatch.setattr(pc_client.acks, 'accept', lambda payload: None)
+    monkeypatch.setattr(pc_client.acks, 'send', sent.append)
+    granted = flow.register()
+    
+    # What server.js sends for one credit: the lead click, then the rest of the burst marked credit: false
+    burst = [(0.5, 0.5), (0.51, 0.5), (0.5, 0.51), (0.49, 0.5), (0.5, 0.49), (0.1, 0.9)]
+    for n, (x, y) in enumerate(burst):
+        command = {'id': f'consensus-{next(ids)}', 'action': 'direct_click', 'data': {'x': x, 'y': y}}
+        if n:
+            command['credit'] = False
+        pc_client.on_command(command)
+    assert len(burst) > flow.budget()  # More clicks than credits alone would let the server send
+    assert flow.held() == granted - 1
+    assert flow.outstanding == 1
+    
+    executor._execute_consensus(executor.queue.get())
+    
+    assert len(dispatched) == 1
+    assert [ack['status'] for ack in sent] == ['success'] * 5 + ['outvoted']
+    assert sent[0]['clusterSize'] == 5
+    # Only the lead's credit comes back, topped up to whatever the new budget is
+    assert [ack['credits'] for ack in sent[1:]] == [0] * 5
+    assert flow.outstanding == 0
+    assert flow.held() == flow.budget()
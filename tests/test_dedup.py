@@ -0,0 +1,51 @@
+import pc_client
+from pc_client import CommandDedup, CommandExecutor
+
+
+def test_dedup_pending_then_cached():
+    dedup = CommandDedup(size=8, window=60)
+    assert dedup.check('s-1') is None
+    assert dedup.check('s-1') is CommandDedup.PENDING
+    dedup.complete('s-1', {'status': 'success'})
+    assert dedup.check('s-1') == {'status': 'success'}
+    assert (dedup.hits, dedup.misses) == (2, 1)
+
+
+def test_dedup_resume_ids_and_eviction():
+    dedup = CommandDedup(size=3, window=60)
+    for command_id in ('a', 'b', 'c'):
+        dedup.check(command_id)
+    dedup.complete('a', {'status': 'success'})
+    assert dedup.resume_ids() == (['b', 'c'], ['a'])
+    dedup.check('d')  # Over size, the oldest id goes
+    assert len(dedup) == 3
+    assert dedup.check('a') is None
+
+
+def test_dedup_window_expires_entries(monkeypatch):
+    dedup = CommandDedup(size=8, window=10)
+    now = [1000.0]
+    monkeypatch.setattr(pc_client.time, 'time', lambda: now[0])
+    dedup.check('s-1')
+    now[0] += 11
+    assert dedup.check('s-1') is None
+
+
+def test_redelivered_command_runs_once(monkeypatch):
+    executor = CommandExecutor()
+    accepted, sent = [], []
+    monkeypatch.setattr(pc_client, 'dedup', CommandDedup())
+    monkeypatch.setattr(pc_client, 'executor', executor)
+    monkeypatch.setattr(pc_client.acks, 'accept', accepted.append)
+    monkeypatch.setattr(pc_client.acks, 'send', sent.append)
+    command = {'id': 'redelivered-1', 'action': 'key_press', 'data': {'key': 'a'}}
+    
+    pc_client.on_command(command)
+    pc_client.on_command(dict(command))  # Still queued
+    assert executor.pending() == 1
+    assert [ack['status'] for ack in accepted] == ['accepted', 'duplicate']
+    
+    pc_client.report_command(executor.queue.get(), 'success')
+    pc_client.on_command(dict(command))  # Finished, the result is replayed
+    assert executor.pending() == 0
+    assert [(ack['status'], ack.get('duplicate')) for ack in sent] == [('success', None), ('success', True)]
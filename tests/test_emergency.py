@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+
+import pc_client
+from pc_client import CommandCancelled, CommandExecutor, CommandJob, EmergencyStop
+
+
+@pytest.fixture
+def stop(monkeypatch):
+    """A fresh stop switch and executor wired in as the module singletons"""
+    switch = EmergencyStop()
+    monkeypatch.setattr(pc_client, 'emergency', switch)
+    monkeypatch.setattr(pc_client, 'executor', CommandExecutor())
+    monkeypatch.setattr(pc_client, 'report_state', lambda state, **details: None)
+    return switch
+
+
+def test_sleep_is_cut_short_by_a_trigger(stop, recording):
+    token = stop.token()
+    threading.Timer(0.05, stop.trigger, args=('test',), kwargs={'latch': False}).start()
+    started = time.perf_counter()
+    with pytest.raises(CommandCancelled):
+        stop.sleep(5, token)
+    assert time.perf_counter() - started < 1
+    assert not stop.latched
+    stop.sleep(0.01, stop.token())  # Later commands run normally
+
+
+def test_stop_cancels_the_running_command_and_flushes_the_queue(stop, recording, reports, monkeypatch):
+    running = threading.Event()
+    
+    def slow_command(command):
+        running.set()
+        pc_client.pause(5)
+        return True, None
+    
+    monkeypatch.setattr(pc_client, 'dispatch_command', slow_command)
+    executor = pc_client.executor
+    executor.start()
+    executor.submit(CommandJob({'id': 'running', 'action': 'right_click'}))
+    assert running.wait(2)
+    executor.submit(CommandJob({'id': 'queued-1', 'action': 'right_click'}))
+    executor.submit(CommandJob({'id': 'queued-2', 'action': 'key_press', 'data': {'key': 'up'}}))
+    recording.key_down('shift')
+    
+    assert stop.trigger('test') == 2
+    deadline = time.time() + 2
+    while len(reports) < 3 and time.time() < deadline:
+        time.sleep(0.01)
+    
+    assert sorted((command_id, status) for command_id, status, _, _ in reports) == [
+        ('queued-1', 'cancelled'), ('queued-2', 'cancelled'), ('running', 'cancelled')]
+    assert recording.held_keys == set()
+    assert stop.latched
+    with pytest.raises(CommandCancelled):
+        stop.check(stop.token())
+    stop.resume('test')
+    stop.check(stop.token())
+
+
+def test_only_admin_stops_are_honoured(stop, reports):
+    pc_client.on_command({'id': 'v', 'action': 'emergency_stop', 'userId': 'viewer'})
+    assert reports[-1][:2] == ('v', 'rejected')
+    assert stop.generation == 0
+    pc_client.on_command({'id': 'a', 'action': 'emergency_stop', 'userId': 'admin', 'source': 'admin'})
+    assert stop.generation == 1
+    assert not stop.latched
@@ -0,0 +1,74 @@
+import pytest
+
+import pc_client
+from pc_client import CommandExecutor, CommandJob, CreditFlow
+
+
+def test_credit_flow_keeps_held_plus_outstanding_at_budget():
+    flow = CreditFlow()
+    budget = flow.budget()
+    assert flow.register() == budget
+    for _ in range(budget):
+        flow.on_receive()
+    assert flow.held() == 0
+    # Every ack hands back exactly the credit its command used
+    assert flow.on_finish() == 1
+    assert flow.held() + flow.outstanding == budget
+    assert flow.register() == budget - flow.outstanding
+
+
+def test_credit_budget_follows_execution_time():
+    flow = CreditFlow()
+    flow.exec_time = 0.5
+    assert flow.budget() == 2
+    fast = CommandJob({'action': 'direct_click'})
+    fast.marks['dequeue'], fast.marks['ack'] = 0.0, 0.01
+    flow.register()
+    flow.on_receive()
+    for _ in range(50):
+        flow.on_finish(fast)
+    assert flow.budget() == pc_client.CREDIT_MAX
+
+
+def test_admin_stop_does_not_touch_the_credit_account(monkeypatch):
+    flow = CreditFlow()
+    sent = []
+    monkeypatch.setattr(pc_client, 'flow', flow)
+    monkeypatch.setattr(pc_client, 'executor', CommandExecutor())
+    monkeypatch.setattr(pc_client, 'emergency', pc_client.EmergencyStop())
+    monkeypatch.setattr(pc_client, 'report_state', lambda state, **details: None)
+    monkeypatch.setattr(pc_client.acks, 'accept', lambda payload: None)
+    monkeypatch.setattr(pc_client.acks, 'send', sent.append)
+    granted = flow.register()
+    
+    # server.js sends the admin stop outside the credit queue, marked credit: false
+    pc_client.on_command({'id': 'flow-stop-1', 'userId': 'admin', 'source': 'admin',
+                          'action': 'emergency_stop', 'data': {}, 'credit': False})
+    pc_client.report_command(pc_client.executor.queue.get(), 'success')
+    
+    assert (flow.received, flow.outstanding) == (0, 0)
+    assert sent[0]['credits'] == 0
+    assert flow.held() == granted
+
+
+def test_bench_server_waits_for_credits_and_numbers_commands(monkeypatch):
+    pytest.importorskip('socketio')
+    server = pc_client.BenchServer()
+    emitted = []
+    monkeypatch.setattr(server.sio, 'emit', lambda event, data, to=None: emitted.append(data))
+    server.send('key_press', {'key': 'up'})  # No PC yet, held back
+    assert emitted == []
+    
+    server.sio.handlers['/']['register_pc']('pc', {'credits': 1})
+    server.send('direct_click', {'x': 0.5, 'y': 0.5})
+    server.send('direct_click', {'x': 0.5, 'y': 0.5})
+    server.send('key_press', {'key': 'down'})
+    commands = [data for data in emitted if 'action' in data]
+    assert [command['id'] for command in commands] == ['bench-1']
+    
+    # One credit back buys the first click and the click queued right behind it
+    server.sio.handlers['/']['command_completed']('pc', {'command': commands[0], 'status': 'success', 'credits': 1})
+    commands = [data for data in emitted if 'action' in data]
+    assert [(command['id'], command.get('credit')) for command in commands[1:]] == [('bench-2', None), ('bench-3', False)]
+    assert server.credits == 0
+    assert server.in_flight() == 3
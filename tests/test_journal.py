@@ -0,0 +1,65 @@
+import time
+
+import numpy as np
+
+from pc_client import JOURNAL_NONE, CommandJob, Journal, journal_command, read_journal
+
+
+def wait_written(journal, count, timeout=5.0):
+    deadline = time.time() + timeout
+    while journal.written < count and time.time() < deadline:
+        time.sleep(0.01)
+    assert journal.written >= count
+
+
+def test_round_trip_and_in_place_result(tmp_path):
+    path = str(tmp_path / 'session.jnl')
+    journal = Journal(path)
+    click = CommandJob({'id': 's-1', 'userId': 'viewer', 'action': 'direct_click',
+                        'data': {'x': 0.25, 'y': 0.75, 'zone': 'game'}, 'timestamp': 1000.0})
+    press = CommandJob({'id': 's-2', 'userId': 'viewer', 'action': 'key_press', 'data': {'key': 'left'}})
+    journal.received(click)
+    journal.received(press)
+    journal.record(click, 'success', result={'verification': 'cross'})
+    wait_written(journal, 3)
+    
+    records, strings = read_journal(path)
+    assert len(records) == 2
+    assert [strings[row['status']] for row in records] == ['success', 'received']
+    assert strings[records[0]['result']] == '{"verification":"cross"}'
+    assert records[1]['result'] == JOURNAL_NONE
+    assert records[0]['server_ts'] == 1000.0
+    assert np.isnan(records[1]['x'])
+    
+    command = journal_command(records[0], strings)
+    assert command == {'id': 's-1', 'userId': 'viewer', 'action': 'direct_click',
+                       'data': {'x': 0.25, 'y': 0.75, 'zone': 'game'}}
+
+
+def test_groups_point_at_their_lead_row(tmp_path):
+    path = str(tmp_path / 'session.jnl')
+    journal = Journal(path)
+    jobs = [CommandJob({'id': f's-{n}', 'action': 'key_press', 'data': {'key': 'up'}}) for n in range(3)]
+    for job in jobs:
+        journal.received(job)
+        job.group = jobs[0]
+    for job in jobs:
+        journal.record(job, 'success', result={'merged': 3, 'netMove': [0, 150]})
+    wait_written(journal, 6)
+    
+    records, _ = read_journal(path)
+    assert records['group'].tolist() == [0, 0, 0]
+
+
+def test_reopening_appends(tmp_path):
+    path = str(tmp_path / 'session.jnl')
+    first = Journal(path)
+    first.record(CommandJob({'id': 'a', 'action': 'direct_click'}), 'success')
+    wait_written(first, 1)
+    second = Journal(path)
+    second.record(CommandJob({'id': 'b', 'action': 'direct_click'}), 'error', 'boom')
+    wait_written(second, 1)
+    
+    records, strings = read_journal(path)
+    assert [strings[row['id']] for row in records] == ['a', 'b']
+    assert strings[records[1]['error']] == 'boom'
@@ -0,0 +1,55 @@
+from pc_client import EventLog
+
+
+class ListSink:
+    def __init__(self):
+        self.records = []
+    
+    def write(self, records):
+        self.records.extend(records)
+
+
+def stalled_log(size):
+    """An EventLog whose drainer never runs, as if the sinks had stalled"""
+    log = EventLog(level='info', size=size)
+    log.thread = object()
+    log.sinks = [ListSink()]
+    return log
+
+
+def test_backpressure_drops_the_oldest_records_and_says_so():
+    log = stalled_log(4)
+    for n in range(10):
+        log.info('tick', f'record {n}', n=n)
+    assert log.dropped == 6
+    
+    log.flush()
+    records = log.sinks[0].records
+    assert [record['n'] for record in records[:4]] == [6, 7, 8, 9]
+    assert records[4]['event'] == 'log_dropped' and records[4]['dropped'] == 6
+    
+    log.flush()  # The drop is only reported once
+    assert len(records) == 5
+
+
+def test_records_below_the_level_are_not_buffered():
+    log = stalled_log(4)
+    log.debug('noise', 'not kept')
+    log.set_level('debug')
+    log.debug('detail', 'kept')
+    log.flush()
+    assert [record['event'] for record in log.sinks[0].records] == ['detail']
+    assert log.dropped == 0
+
+
+def test_a_broken_sink_does_not_starve_the_others():
+    log = stalled_log(4)
+    
+    class BrokenSink:
+        def write(self, records):
+            raise OSError('disk full')
+    
+    log.sinks.insert(0, BrokenSink())
+    log.warning('disk', 'still delivered')
+    log.flush()
+    assert [record['msg'] for record in log.sinks[1].records] == ['still delivered']
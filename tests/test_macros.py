@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+import pc_client
+from pc_client import MACRO_KEYS, MacroCache, execute_macro, validate_macro_step, xtest_keysym_name
+
+
+def test_valid_steps_are_normalized():
+    assert validate_macro_step({'type': 'click', 'x': 1, 'y': 0}) == {'type': 'click', 'x': 1.0, 'y': 0.0}
+    assert validate_macro_step({'type': 'key', 'key': 'f9', 'extra': 1}) == {'type': 'key', 'key': 'f9'}
+    assert validate_macro_step({'type': 'wait', 'seconds': 0}) == {'type': 'wait', 'seconds': 0.0}
+
+
+@pytest.mark.parametrize('step', [
+    {'type': 'click', 'x': 1.5, 'y': 0.5},
+    {'type': 'click', 'x': '0.5', 'y': 0.5},
+    {'type': 'key', 'key': 'delete'},
+    {'type': 'wait', 'seconds': pc_client.MACRO_MAX_WAIT + 1},
+    {'type': 'camera', 'direction': 'sideways'},
+    {'type': 'shell'},
+    'click',
+])
+def test_invalid_steps_are_rejected(step):
+    with pytest.raises(ValueError):
+        validate_macro_step(step)
+
+
+def test_cache_ids_follow_the_steps_and_evict_lru():
+    cache = MacroCache(size=2)
+    first = cache.define({'name': 'one', 'steps': [{'type': 'key', 'key': 'a'}]})
+    assert cache.define({'name': 'renamed', 'steps': [{'type': 'key', 'key': 'a'}]}) is first
+    second = cache.define({'steps': [{'type': 'key', 'key': 'b'}]})
+    cache.get(first.id)
+    cache.define({'steps': [{'type': 'key', 'key': 'c'}]})
+    assert cache.get(first.id) is first
+    assert cache.get(second.id) is None
+    with pytest.raises(ValueError):
+        cache.define({'steps': [{'type': 'wait', 'seconds': 3}, {'type': 'wait', 'seconds': 3}]})
+
+
+def test_held_keys_are_released_when_a_macro_is_cancelled(recording, monkeypatch):
+    monkeypatch.setattr(pc_client, 'emergency', pc_client.EmergencyStop())
+    monkeypatch.setattr(pc_client, 'report_state', lambda state, **details: None)
+    monkeypatch.setattr(pc_client, 'focus_osrs_window', lambda: False)
+    macro = MacroCache().define({'steps': [
+        {'type': 'key_down', 'key': 'shift'},
+        {'type': 'click', 'x': 0.5, 'y': 0.5},
+        {'type': 'wait', 'seconds': 5},
+        {'type': 'key_up', 'key': 'shift'},
+    ]})
+    pc_client._worker_state.stop_token = pc_client.emergency.token()
+    threading.Timer(0.1, pc_client.emergency.trigger, args=('test',), kwargs={'latch': False}).start()
+    try:
+        with pytest.raises(pc_client.CommandCancelled):
+            execute_macro(macro)
+    finally:
+        pc_client._worker_state.stop_token = None
+    ops = [(op, args) for _, op, args in recording.events if op != 'move']
+    assert ops[0] == ('key_down', ('shift',))
+    assert ('mouse_down', ('left',)) in ops
+    assert ('key_up', ('shift',)) in ops
+    assert recording.held_keys == set()
+
+
+def test_every_macro_key_has_an_xtest_name():
+    assert xtest_keysym_name('f12') == 'F12'
+    assert xtest_keysym_name('up') == 'Up'
+    assert xtest_keysym_name('q') == 'q'
+    assert all(xtest_keysym_name(key) not in ('', None) for key in MACRO_KEYS)
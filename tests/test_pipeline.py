@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+import pc_client
+from pc_client import ClickPipeline
+
+
+@pytest.fixture(autouse=True)
+def pipelined(monkeypatch):
+    monkeypatch.setattr(pc_client, 'PIPELINE_ENABLED', True)
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started
+
+
+def test_overlapping_move_only_waits_for_the_dwell():
+    pipeline = ClickPipeline()
+    pipeline.settle('direct_click', 0.3)
+    dwell = pc_client.PIPELINE_MIN_DWELL['direct_click']
+    assert dwell - 0.02 <= timed(pipeline.before_move, 'direct_click') < 0.2
+    # The click itself still waits out the rest of the settle
+    assert timed(pipeline.before_click) > 0.15
+    assert pipeline.pending is None
+
+
+def test_other_actions_wait_out_the_whole_settle():
+    pipeline = ClickPipeline()
+    pipeline.settle('direct_click', 0.2)
+    assert timed(pipeline.before_move, 'key_press') > 0.17
+    assert timed(pipeline.before_click) < 0.02
+
+
+def test_settle_is_a_plain_pause_when_pipelining_is_off(monkeypatch):
+    monkeypatch.setattr(pc_client, 'PIPELINE_ENABLED', False)
+    pipeline = ClickPipeline()
+    assert timed(pipeline.settle, 'direct_click', 0.1) >= 0.09
+    assert pipeline.pending is None
+
+
+def test_batch_click_waits_for_the_previous_settle(recording, monkeypatch):
+    monkeypatch.setattr(pc_client, 'focus_osrs_window', lambda: False)
+    pc_client.pipeline.settle('direct_click', 0.25)
+    pc_client.pipeline.before_move('batch_click')
+    started = time.perf_counter()
+    assert pc_client.execute_batch_click([(0.5, 0.5)])
+    clicks = [at for at, op, _ in recording.events if op == 'mouse_down']
+    assert clicks and clicks[0] - started > 0.1
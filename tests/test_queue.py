@@ -0,0 +1,63 @@
+import time
+
+import pc_client
+from pc_client import CommandExecutor, CommandJob, LaneQueue
+
+
+def job(action, command_id=None):
+    return CommandJob({'id': command_id, 'action': action})
+
+
+def test_lane_queue_serves_most_urgent_lane_first():
+    queue = LaneQueue(8)
+    for action in ('key_press', 'direct_click', 'unknown_action', 'emergency_stop', 'right_click'):
+        assert queue.put_nowait(job(action))
+    assert [queue.get().action for _ in range(5)] == [
+        'emergency_stop', 'direct_click', 'right_click', 'key_press', 'unknown_action']
+    assert queue.qsize() == 0
+
+
+def test_lane_queue_is_bounded_except_for_emergencies():
+    queue = LaneQueue(2)
+    assert queue.put_nowait(job('direct_click'))
+    assert queue.put_nowait(job('key_press'))
+    assert not queue.put_nowait(job('direct_click'))
+    assert queue.put_nowait(job('emergency_stop'))
+    assert queue.qsize() == 3
+
+
+def test_lane_queue_remove_if_keeps_order_and_size():
+    queue = LaneQueue(8)
+    for n, action in enumerate(('direct_click', 'key_press', 'direct_click', 'key_press')):
+        queue.put_nowait(job(action, f's-{n}'))
+    removed = queue.remove_if(lambda queued: queued.action == 'key_press')
+    assert [queued.id for queued in removed] == ['s-1', 's-3']
+    assert queue.lane_sizes() == {'emergency': 0, 'click': 2, 'camera': 0, 'other': 0}
+    assert [queued.id for queued in queue.drain()] == ['s-0', 's-2']
+    assert queue.qsize() == 0
+
+
+def test_age_counts_from_receipt_until_the_clock_is_synced(monkeypatch):
+    monkeypatch.setattr(pc_client.clock, 'samples', pc_client.deque(maxlen=16))
+    stale = CommandJob({'action': 'key_press', 'timestamp': (time.time() - 30) * 1000})
+    assert 'enqueue' not in stale.marks
+    assert not stale.expired()
+    
+    pc_client.clock.samples.append((0.01, 0.0))
+    stale = CommandJob({'action': 'key_press', 'timestamp': (time.time() - 30) * 1000})
+    assert stale.expired()
+    ahead = CommandJob({'action': 'key_press', 'timestamp': (time.time() + 30) * 1000})
+    assert ahead.age() >= 0
+
+
+def test_expire_stale_reports_expired(monkeypatch):
+    reports = []
+    monkeypatch.setattr(pc_client, 'report_command', lambda job, status, error=None, **extra: reports.append(status))
+    executor = CommandExecutor()
+    old = job('key_press')
+    old.marks['receive'] -= 10
+    executor.queue.put_nowait(old)
+    executor.queue.put_nowait(job('direct_click'))
+    executor.expire_stale()
+    assert reports == ['expired']
+    assert executor.pending() == 1
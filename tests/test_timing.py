@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+import pc_client
+from pc_client import TimingProfiles
+
+
+@pytest.fixture
+def profiles(monkeypatch, tmp_path):
+    timings = TimingProfiles()
+    monkeypatch.setattr(pc_client, 'timings', timings)
+    monkeypatch.setattr(pc_client, 'TIMING_FILE', str(tmp_path / 'timing.json'))
+    monkeypatch.setattr(pc_client.time, 'sleep', lambda seconds: None)
+    return timings
+
+
+def test_untunable_run_saves_nothing(profiles, monkeypatch, tmp_path):
+    def no_capture(target, neutral, seconds):
+        raise RuntimeError("screen capture unavailable")
+    monkeypatch.setitem(pc_client.TUNABLE_DELAYS, 'hover', (no_capture, ('direct_click', 'right_click')))
+    assert pc_client.tune_timings((0.5, 0.5)) is False
+    assert profiles.active == 'safe'
+    assert not (tmp_path / 'timing.json').exists()
+
+
+def test_hover_is_tuned_once_for_every_click(profiles, monkeypatch, tmp_path):
+    checks = []
+    
+    def hover_needs_20ms(target, neutral, seconds):
+        checks.append(seconds)
+        return seconds >= 0.02
+    monkeypatch.setitem(pc_client.TUNABLE_DELAYS, 'hover', (hover_needs_20ms, ('direct_click', 'right_click')))
+    assert pc_client.tune_timings((0.5, 0.5), margin=1.0) is True
+    
+    assert profiles.active == 'calibrated'
+    assert 0.02 <= profiles.get('direct_click', 'hover') < 0.025
+    assert profiles.get('right_click', 'hover') == profiles.get('direct_click', 'hover')
+    assert profiles.get('direct_click', 'travel') == pc_client.TIMING_PROFILES['safe']['direct_click']['travel']
+    saved = json.loads((tmp_path / 'timing.json').read_text())
+    assert saved['profile'] == 'calibrated'
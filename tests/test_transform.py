@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from pc_client import BATCH_CLICK_MAX_POINTS, CoordinateTransform, validate_batch_points
+
+REL = [(0.0, 0.0), (1.0, 0.0), (0.0, 1.0), (1.0, 1.0), (0.5, 0.5), (0.25, 0.75)]
+
+
+def test_affine_fit_recovers_matrix():
+    matrix = np.array([[1600.0, 20.0, 40.0], [-10.0, 900.0, 60.0], [0.0, 0.0, 1.0]])
+    screen = [(matrix @ (x, y, 1.0))[:2] for x, y in REL]
+    fitted = CoordinateTransform.fit(REL, screen, kind='affine')
+    assert fitted.kind == 'affine'
+    np.testing.assert_allclose(fitted.matrix, matrix, atol=1e-6)
+    assert fitted.residuals().max() < 1e-6
+
+
+def test_auto_fit_picks_homography_for_perspective():
+    matrix = np.array([[1500.0, 30.0, 100.0], [10.0, 800.0, 50.0], [0.2, 0.1, 1.0]])
+    screen = []
+    for x, y in REL:
+        sx, sy, w = matrix @ (x, y, 1.0)
+        screen.append((sx / w, sy / w))
+    fitted = CoordinateTransform.fit(REL, screen)
+    assert fitted.kind == 'homography'
+    np.testing.assert_allclose(fitted.map_points(REL), screen, atol=1e-4)
+
+
+def test_map_points_matches_map_point_and_inverts():
+    transform = CoordinateTransform.from_game_window({'x': 100, 'y': 50, 'width': 1280, 'height': 720})
+    rel = np.array([(0.1, 0.2), (0.5, 0.5), (0.9, 0.95)])
+    mapped = transform.map_points(rel)
+    for (x, y), (sx, sy) in zip(rel, mapped):
+        assert transform.map_point(x, y) == pytest.approx((sx, sy))
+    np.testing.assert_allclose(transform.inverse_points(mapped), rel, atol=1e-9)
+    assert tuple(mapped[1]) == (740.0, 410.0)
+
+
+def test_fit_needs_three_points():
+    with pytest.raises(ValueError):
+        CoordinateTransform.fit(REL[:2], [(0, 0), (1, 1)])
+
+
+def test_batch_points_are_capped_and_range_checked():
+    assert validate_batch_points([[0.1, 0.2], (1, 0)]) == [(0.1, 0.2), (1.0, 0.0)]
+    for points in ([], None, [[0.1, 1.5]], [[0.1]], [['a', 0.2]],
+                   [[0.5, 0.5]] * (BATCH_CLICK_MAX_POINTS + 1)):
+        with pytest.raises(ValueError):
+            validate_batch_points(points)